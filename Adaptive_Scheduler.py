@@ -0,0 +1,107 @@
+# Adaptive_Scheduler.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code decides when each vessel next needs to be polled, to reduce the API credits used.
+#
+# A vessel which is approaching the Arctic Circle is polled more often as it gets closer:
+# the interval is the estimated time to reach the Circle (at the current speed) divided by
+# samplesToCircle, limited to minInterval ... maxInterval.
+# A vessel which is moored (NAVSTAT 5) or not moving (SPEED < stoppedSpeed) is polled
+# every mooredInterval.
+#
+# The credits used are counted for each vessel: one per AIS entry for terrestrial data,
+# five for satellite data (SRC 'SAT'). When a vessel crosses the Circle, the credits used
+# since its previous crossing are recorded against the crossing.
+
+from Timestamps import parseTimestamp, epochToUTC
+
+class AdaptiveScheduler():
+    def __init__(self):
+        self.setArcticCircleDegMinSec(66., 33., 0.) # Historical value: 66 degrees 33 minutes
+        self.minInterval = 60 # Seconds
+        self.maxInterval = 15 * 60
+        self.mooredInterval = 30 * 60
+        self.samplesToCircle = 20
+        self.stoppedSpeed = 0.5 # Knots
+        self.credits = {'TER': 1, 'SAT': 5}
+        self.vessels = {} # IMO : state
+
+    def setArcticCircleLatitude(self, lat):
+        self.ArcticCircleLatitude = lat
+
+    def setArcticCircleDegMinSec(self, deg, min, sec):
+        self.ArcticCircleLatitude = deg + (min / 60.) + (sec / 3600.)
+
+    def setMinInterval(self, seconds):
+        self.minInterval = seconds
+
+    def setMaxInterval(self, seconds):
+        self.maxInterval = seconds
+
+    def setMooredInterval(self, seconds):
+        self.mooredInterval = seconds
+
+    def setSamplesToCircle(self, samples):
+        self.samplesToCircle = samples
+
+    def setStoppedSpeed(self, knots):
+        self.stoppedSpeed = knots
+
+    def addVessel(self, IMO):
+        if IMO not in self.vessels.keys():
+            self.vessels[IMO] = {
+                'nextPoll': 0.0, # Poll straight away
+                'latitude': None,
+                'credits': 0, # Credits used since the last crossing
+                'totalCredits': 0,
+                'crossings': []
+            }
+
+    def dueVessels(self, now):
+        # Return the IMOs which need to be polled now (now is epoch seconds)
+        # Allow half of minInterval of slack, as the polls are aligned to the clock
+        return [IMO for IMO in self.vessels.keys() if self.vessels[IMO]['nextPoll'] <= now + (self.minInterval / 2.)]
+
+    def interval(self, ais):
+        # Return the number of seconds until the vessel should be polled again
+        if ais.get('NAVSTAT') == 5 or ais.get('SPEED') is None or ais['SPEED'] < self.stoppedSpeed:
+            return self.mooredInterval
+        distanceToCircle = abs(self.ArcticCircleLatitude - ais['LATITUDE']) * 60. # NM, by Latitude alone
+        timeToCircle = 3600. * distanceToCircle / ais['SPEED'] # Seconds
+        return min(self.maxInterval, max(self.minInterval, timeToCircle / self.samplesToCircle))
+
+    def update(self, ais, now):
+        # Update the state of a vessel using the AIS entry from a poll made at now (epoch seconds)
+        IMO = ais['IMO']
+        self.addVessel(IMO)
+        vessel = self.vessels[IMO]
+
+        credits = self.credits.get(ais.get('SRC'), 1)
+        vessel['credits'] += credits
+        vessel['totalCredits'] += credits
+
+        # Check for a crossing (either direction)
+        latitude = ais['LATITUDE']
+        if vessel['latitude'] is not None and \
+            (vessel['latitude'] > self.ArcticCircleLatitude) != (latitude > self.ArcticCircleLatitude):
+            crossing = {
+                'epoch': parseTimestamp(ais['TIMESTAMP']),
+                'northbound': latitude > self.ArcticCircleLatitude,
+                'credits': vessel['credits']
+            }
+            vessel['crossings'].append(crossing)
+            vessel['credits'] = 0
+        vessel['latitude'] = latitude
+
+        vessel['nextPoll'] = now + self.interval(ais)
+
+    def printCredits(self):
+        for IMO in self.vessels.keys():
+            vessel = self.vessels[IMO]
+            print("Vessel {} : {} credits used".format(IMO, vessel['totalCredits']))
+            for crossing in vessel['crossings']:
+                print("  {} crossing at {} (UTC) : {} credits".format("Northbound" if crossing['northbound'] else "Southbound", \
+                      epochToUTC(crossing['epoch']).strftime('%Y-%m-%d %H:%M:%S'), crossing['credits']))
@@ -0,0 +1,181 @@
+# Artifact_Cache.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code caches the artifacts derived from the collated data (voyage tracks, crossings and
+# KML files) on disk, so they are only calculated again when their inputs change.
+#
+# Each artifact is content-addressed: its key is a hash of the kind of artifact, its parameters
+# (e.g. vessel, window, Arctic Circle latitude) and its input records (see recordsHash), so a
+# changed input simply misses the cache and the stale artifact is eventually evicted.
+# The artifacts are pickled, one file per key. The total size of the cache is limited to maxBytes:
+# the least recently used artifacts (by file modification time, which is updated on each hit)
+# are evicted first. A running total of the size is kept, so the directory is only scanned
+# when the cache is full, and then enough artifacts are evicted to leave some room.
+#
+# Files are written atomically, so several processes can share one cache.
+#
+# ExtractData, ExtractCrossings and GenerateKML use a cache with setCache. ExtractData caches the
+# track without CIRCLE_NM, so a different Arctic Circle latitude only recalculates CIRCLE_NM.
+
+import hashlib
+import json
+import os
+import pickle
+import numpy as np # pip install numpy
+
+def recordsHash(store, offsets, keys=None):
+    # Hash the values of the store entries at offsets (in order). keys: the fields to include (default: all)
+    digest = hashlib.blake2b(digest_size=16)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    digest.update(str(len(offsets)).encode())
+    for key in (store.keys if keys is None else keys):
+        values = store.columns[key][offsets] if key != 'EPOCH' else store.epoch[offsets]
+        digest.update(key.encode())
+        if store.kinds.get(key) == 'object':
+            # Hash the values rather than the interned codes, which depend on the order of the entries:
+            # the unique values in the order they first appear, then the position of each entry's value in that list
+            table = store.tables[key]
+            codes, first, inverse = np.unique(np.asarray(values), return_index=True, return_inverse=True)
+            order = np.argsort(first)
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            digest.update(repr([table[code] if code >= 0 else Ellipsis for code in codes[order].tolist()]).encode()) # Ellipsis : missing
+            digest.update(rank[inverse.reshape(-1)].tobytes())
+        else:
+            digest.update(values.dtype.str.encode())
+            digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+class ArtifactCache():
+    def __init__(self, directory='Artifact_Cache', maxBytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.evictFraction = 0.9 # Evict down to this fraction of maxBytes, so the directory is only scanned now and then
+        self.bytes = None # The running total size of the artifacts. None : not counted yet
+        self.hits = 0
+        self.misses = 0
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.evict()
+
+    def key(self, kind, params, inputHash):
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([kind, params, inputHash], sort_keys=True).encode())
+        return kind + '_' + digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        # Return the artifact, or None if it is not in the cache
+        try:
+            with open(self.path(key), 'rb') as f:
+                value = pickle.load(f)
+            os.utime(self.path(key)) # Most recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        tmpPath = self.path(key) + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            pickle.dump(value, f)
+            size = f.tell()
+        try:
+            previousSize = os.path.getsize(self.path(key))
+        except OSError:
+            previousSize = 0
+        os.replace(tmpPath, self.path(key))
+
+        # Keep a running total, so the directory is only scanned the first time and when it is full
+        # The total doesn't include artifacts written by other processes. Each eviction corrects it
+        if self.bytes is None:
+            self.bytes = self.size()
+        else:
+            self.bytes += size - previousSize
+        if self.bytes > self.maxBytes:
+            self.evict()
+
+    def cached(self, kind, params, inputHash, calculate):
+        # Return the artifact from the cache, or calculate and cache it
+        key = self.key(kind, params, inputHash)
+        value = self.get(key)
+        if value is None:
+            value = calculate()
+            self.put(key, value)
+        return value
+
+    def entries(self):
+        # Return (modification time, size, path) for each artifact, least recently used first
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue # Evicted by another process
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for mtime, size, path in self.entries())
+
+    def evict(self):
+        # If the cache is larger than maxBytes, evict the least recently used artifacts
+        # until it is no larger than evictFraction of maxBytes
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        if total > self.maxBytes:
+            for mtime, size, path in entries:
+                if total <= self.maxBytes * self.evictFraction:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+        self.bytes = total
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            os.remove(path)
+        self.bytes = 0
+
+    def printStats(self):
+        print("Artifact cache : {} hits : {} misses : {} artifacts : {:.1f} MB".format(self.hits, self.misses, \
+              len(self.entries()), self.size() / (1024. * 1024.)))
+
+if __name__ == '__main__':
+
+    from Extract_Data import ExtractData
+    from time import perf_counter
+
+    cache = ArtifactCache()
+
+    # Extract the same sailing for three Arctic Circle latitudes. After the first, the track is
+    # loaded from the cache and only CIRCLE_NM is calculated
+    for deg, min, sec in [[66., 31., 57.7], [66., 33., 0.], [66., 33., 50.2]]:
+        extractData = ExtractData()
+        extractData.setCache(cache)
+        extractData.setVessel(9107796) # MS Polarlys
+        extractData.setArcticCircleDegMinSec(deg, min, sec)
+        extractData.setWindow('Europe/Oslo', '2024-11-23 06:05:00', '2024-11-23 10:10:00')
+        extractData.setOutputPickleFilename('Track_Vessel_9107796_Cached.pkl')
+        start = perf_counter()
+        extractData.extractDataForVessel()
+        print("{:.0f}° {:.0f}' {:.1f}\" : {:.3f}s".format(deg, min, sec, perf_counter() - start))
+
+    cache.printStats()
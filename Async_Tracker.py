@@ -0,0 +1,248 @@
+# Async_Tracker.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code runs several Trackers (Track_Vessel.py) and PredictCrossings (Predict_Crossing.py)
+# concurrently in one process using asyncio, instead of each one blocking on urlopen and sleep(60).
+#
+# Each Tracker / PredictCrossing becomes a schedule with its own user key, vessels and windows.
+# Each schedule:
+#   Reuses one HTTP(S) connection between requests (keep-alive)
+#   Times out each connect and read of each request (setTimeout, the socket timeout)
+#     and each whole request (setRequestTimeout), so a server which sends the response
+#     slowly can not hold a worker thread indefinitely
+#   Retries failed requests (setRetries), with an exponential backoff (setBackoff),
+#     but never past the start of the next poll
+#   Polls at whole multiples of the interval on the wall clock (e.g. hh:mm:00 every minute),
+#     so a slow response does not push the later polls back
+#
+# A Tracker can be given an AdaptiveScheduler (see Adaptive_Scheduler.py). Then each poll only
+# requests the vessels which are due, and the credits used per crossing are printed at the end.
+#
+# Use setBaseURL on the Trackers / PredictCrossings and Local_API_Server.py to test
+# without using API credits.
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import http.client
+import asyncio
+import math
+import time
+from Track_Vessel import mergeResults
+
+class KeepAliveClient():
+    # One connection per host, reused between requests. Only one request at a time
+    def __init__(self, timeout, requestTimeout):
+        self.timeout = timeout
+        self.requestTimeout = requestTimeout
+        self.connections = {}
+
+    def socketTimeout(self, deadline):
+        # The socket timeout for the next connect or read: never past the request's deadline
+        remaining = deadline - time.monotonic()
+        if remaining <= 0.0:
+            raise TimeoutError("Request took longer than {} seconds".format(self.requestTimeout))
+        return min(self.timeout, remaining)
+
+    def get(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        connection = self.connections.get(key)
+        if connection is None:
+            if parts.scheme == 'https':
+                connection = http.client.HTTPSConnection(parts.netloc, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+            self.connections[key] = connection
+        path = parts.path
+        if parts.query != '':
+            path += '?' + parts.query
+        deadline = time.monotonic() + self.requestTimeout
+        try:
+            connection.timeout = self.socketTimeout(deadline) # Used if the connection is opened
+            connection.request('GET', path)
+            sock = connection.sock # The response keeps using it, even if the connection is closed
+            sock.settimeout(self.socketTimeout(deadline))
+            response = connection.getresponse()
+            # Read everything so the connection can be reused. The body is read in chunks so the
+            # deadline is checked while a slow server is still sending
+            chunks = []
+            while True:
+                sock.settimeout(self.socketTimeout(deadline))
+                chunk = response.read1(65536)
+                if len(chunk) == 0:
+                    break
+                chunks.append(chunk)
+            chunks.append(response.read()) # Nothing is left. This completes the response
+            body = b''.join(chunks)
+        except:
+            self.closeConnection(key) # The next request starts with a fresh connection
+            raise
+        if response.status != 200:
+            raise http.client.HTTPException("HTTP status {}".format(response.status))
+        return body.decode("utf-8")
+
+    def closeConnection(self, key):
+        connection = self.connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for key in list(self.connections.keys()):
+            self.closeConnection(key)
+
+class AsyncTracker():
+    def __init__(self):
+        self.schedules = []
+        self.interval = 60 # Seconds
+        self.timeout = 20.0 # Seconds
+        self.requestTimeout = 40.0 # Seconds
+        self.retries = 3
+        self.backoff = 2.0 # Seconds. Doubled for each retry
+        self.executor = None
+
+    def setInterval(self, seconds):
+        self.interval = seconds
+
+    def setTimeout(self, seconds):
+        self.timeout = seconds
+
+    def setRequestTimeout(self, seconds):
+        self.requestTimeout = seconds
+
+    def setRetries(self, retries):
+        self.retries = retries
+
+    def setBackoff(self, seconds):
+        self.backoff = seconds
+
+    def addTracker(self, tracker, scheduler=None):
+        # With an AdaptiveScheduler (see Adaptive_Scheduler.py), only the vessels which are due are polled.
+        # The scheduler can also be set with tracker.setScheduler
+        if scheduler is not None:
+            tracker.setScheduler(scheduler)
+
+        def process(result, now):
+            tracker.processResult(result)
+            tracker.updateScheduler(result, now)
+
+        schedule = {
+            'name': 'Tracker ' + ','.join(str(IMO) for IMO in tracker.vessels.values()),
+            'requestURLs': lambda now: tracker.requestURLs(tracker.dueVessels(now)),
+            'status': tracker.windowStatus, # Returns (inWindow, futureWindow)
+            'process': process,
+            'finish': None if tracker.scheduler is None else tracker.scheduler.printCredits
+        }
+        self.schedules.append(schedule)
+
+    def addPredictor(self, predictor):
+        if predictor.arrivalTime is None or not predictor.hasRoute():
+            return
+        predictor.loadInputPickleFile()
+
+        def status():
+            active = not predictor.arrivalExpired()
+            return active, active
+
+        schedule = {
+            'name': 'Predictor ' + str(predictor.vessel),
+            'requestURLs': lambda now: [predictor.requestURL()],
+            'status': status,
+            'process': lambda result, now: predictor.processResult(result),
+            'finish': None
+        }
+        self.schedules.append(schedule)
+
+    def nextPoll(self, now):
+        # The next whole multiple of the interval
+        return (math.floor(now / self.interval) + 1) * self.interval
+
+    async def fetch(self, client, url, deadline):
+        # A worker thread can not be cancelled, so the request is not timed out here: the socket
+        # and request timeouts make client.get raise in the worker thread. Each attempt waits for the thread to
+        # finish, so the client is never used by two threads, or closed while a request is in progress.
+        # client.get closes the connection if the request fails, so the next attempt starts afresh
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            try:
+                return await loop.run_in_executor(self.executor, client.get, url)
+            except Exception as e:
+                print("URL request error! ({}, attempt {} of {})".format(type(e).__name__, attempt + 1, self.retries + 1))
+            delay = self.backoff * (2 ** attempt)
+            if attempt == self.retries or time.time() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+        return None
+
+    async def runSchedule(self, schedule):
+        client = KeepAliveClient(self.timeout, self.requestTimeout)
+        try:
+            while True:
+                inWindow, futureWindow = schedule['status']()
+
+                if not futureWindow:
+                    print(schedule['name'] + " : all time windows have expired")
+                    break
+
+                now = time.time()
+                deadline = self.nextPoll(now)
+
+                if inWindow:
+                    results = []
+                    for request in schedule['requestURLs'](now):
+                        print("Request : " + request)
+                        results.append(await self.fetch(client, request, deadline))
+                    schedule['process'](mergeResults(results), now)
+
+                # Sleep until the next poll, aligned to the wall clock
+                await asyncio.sleep(max(0.0, self.nextPoll(time.time()) - time.time()))
+        finally:
+            client.close()
+            if schedule['finish'] is not None:
+                schedule['finish']()
+
+    async def trackAsync(self):
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.schedules)))
+        try:
+            await asyncio.gather(*[self.runSchedule(schedule) for schedule in self.schedules])
+        finally:
+            self.executor.shutdown(wait=False)
+
+    def track(self):
+        asyncio.run(self.trackAsync())
+
+if __name__ == '__main__':
+
+    from Track_Vessel import Tracker
+    from Predict_Crossing import PredictCrossing
+    from Adaptive_Scheduler import AdaptiveScheduler
+
+    asyncTracker = AsyncTracker()
+
+    # Track one group of vessels
+    tracker = Tracker()
+    tracker.setUserKey('<ADD YOUR KEY HERE>')
+    tracker.addVessel('MS Polarlys', 9107796)
+    tracker.addWindow('Europe/Oslo', '2024-12-04 06:00:00', '2024-12-04 10:10:00')
+    asyncTracker.addTracker(tracker)
+
+    # Or poll more often near the Arctic Circle, less often in port
+    #scheduler = AdaptiveScheduler()
+    #scheduler.setArcticCircleDegMinSec(66., 31., 57.7)
+    #asyncTracker.addTracker(tracker, scheduler)
+
+    # And predict a crossing, concurrently
+    predict = PredictCrossing()
+    predict.setUserKey('<ADD YOUR KEY HERE>')
+    predict.setVessel(9107796) # MS Polarlys
+    predict.setArrivalTime('Europe/Oslo', '2024-12-04 10:00:00')
+    predict.setInputPickleFilename('Track_Vessel_9107796.pkl')
+    asyncTracker.addPredictor(predict)
+
+    # Uncomment to test against Local_API_Server.py
+    #tracker.setBaseURL('http://127.0.0.1:8080/vessels')
+    #predict.setBaseURL('http://127.0.0.1:8080/vessels')
+
+    asyncTracker.track()
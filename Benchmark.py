@@ -0,0 +1,326 @@
+# Benchmark.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code times the stages of the pipeline so that the different ways of running
+# them can be compared, and so that performance regressions are visible.
+#
+# benchmarkCollate compares parsing the Track_Vessel_UTC_*.json files one at a time
+# with parsing them using a pool of worker processes (see Collate.setWorkers).
+# benchmarkForecast times the Monte Carlo crossing forecast (see Crossing_Forecast.py) for a fleet
+# of vessels, to check that a whole fleet can be forecast well within the 60 second poll interval.
+# benchmarkGeodesy compares calling the haversine package once per pair of points with
+# calculating all of the distances of a track in one call (see Geodesy.py).
+# benchmarkScaling generates synthetic AIS data for fleets of increasing size (see Synthetic_AIS.py)
+# and times Collate, ExtractData, ExtractCrossings, GenerateKML and PredictCrossing's route lookup
+# on each, reporting the throughput, the peak memory (measured with tracemalloc in a separate run,
+# as tracing slows the code down) and how the time of each stage scales with the fleet size.
+# writeResults saves all of the results as JSON, so runs can be compared to spot regressions.
+
+from time import perf_counter
+from contextlib import redirect_stdout
+import json
+import math
+import os
+import shutil
+import tempfile
+import tracemalloc
+import numpy as np # pip install numpy
+from Collate import Collate
+from Crossing_Forecast import CrossingForecast
+from Geodesy import trackDistancesNM, vincentyNM
+from Timestamps import epochToUTC
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
+from Synthetic_AIS import SyntheticAIS
+from Extract_Data import ExtractData
+from Extract_Crossings import ExtractCrossings
+from Generate_KML import GenerateKML
+from Predict_Crossing import PredictCrossing
+from Voyage_Segmenter import VoyageSegmenter
+
+class Benchmark():
+    def __init__(self):
+        self.directory = '.'
+        self.repeats = 3
+        self.results = []
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setRepeats(self, repeats):
+        self.repeats = repeats
+
+    # Run func repeats times. Return the result and the fastest time (seconds)
+    def timeIt(self, func):
+        best = None
+        result = None
+        for repeat in range(self.repeats):
+            start = perf_counter()
+            result = func()
+            elapsed = perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return result, best
+
+    # Run func once, tracing the memory allocations. Return the peak memory allocated (bytes)
+    # Only this process is traced, not any worker processes
+    def peakMemory(self, func):
+        tracemalloc.start()
+        try:
+            func()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    # Run func without printing anything
+    def quietly(self, func):
+        def quiet():
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                return func()
+        return quiet
+
+    def addResult(self, benchmark, name, items, seconds, unit, peakBytes=None):
+        result = {
+            'benchmark': benchmark,
+            'name': name,
+            'items': items,
+            'seconds': seconds,
+            'rate': items / seconds if seconds > 0.0 else None,
+            'unit': unit,
+            'peakBytes': peakBytes
+        }
+        self.results.append(result)
+        print("{:<32} : {:>10} {} in {:8.3f}s : {:12.1f} {}/s".format(name, items, unit, seconds, result['rate'], unit) + \
+              ("" if peakBytes is None else " : {:8.1f} MB peak".format(peakBytes / (1024. * 1024.))))
+        return result
+
+    def writeResults(self, filename='Benchmark_Results.json'):
+        with open(filename, 'w') as f:
+            f.write(json.dumps(self.results, indent=1))
+
+    def benchmarkCollate(self, workerCounts=[2, 4, 8]):
+        collate = Collate()
+        collate.setDirectory(self.directory)
+        sortedFiles = collate.findFiles()
+        numFiles = len(sortedFiles)
+
+        print("Collate: parsing {} files".format(numFiles))
+
+        # Serial
+        collate.setWorkers(1)
+        reference, seconds = self.timeIt(lambda: collate.readFiles(sortedFiles))
+        serial = self.addResult('collate', 'Serial', numFiles, seconds, 'files')
+
+        # Worker processes. Use a few chunks per worker to balance the load
+        for workers in workerCounts:
+            collate.setWorkers(workers)
+            collate.setChunkSize(max(1, math.ceil(numFiles / (workers * 4))))
+            vesselData, seconds = self.timeIt(lambda: collate.readFiles(sortedFiles))
+            result = self.addResult('collate', '{} workers'.format(workers), numFiles, seconds, 'files')
+            if vesselData != reference:
+                print("Error: the entries are not identical to the serial result!")
+            elif serial['rate'] is not None and result['rate'] is not None:
+                print("{:<32} : {:.2f}x".format("Speed-up", result['rate'] / serial['rate']))
+
+    def benchmarkForecast(self, sailingFiles, vessels=1000, trajectories=10000, pollInterval=60.0):
+        missing = [sailingFile for sailingFile in sailingFiles if not os.path.isfile(sailingFile)]
+        if len(missing) > 0:
+            print("Sailing file " + missing[0] + " not found. Run Route_Model.py first. Skipping the forecast")
+            return
+        forecast = CrossingForecast()
+        forecast.setTrajectories(trajectories)
+        for sailingFile in sailingFiles:
+            forecast.addSailingFile(sailingFile)
+
+        # Spread the vessels between 1 and 20 NM from the Circle
+        distances = np.random.default_rng(0).uniform(1.0, 20.0, vessels).tolist()
+
+        print("Forecast: {} vessels, {} trajectories each".format(vessels, trajectories))
+
+        def forecastFleet():
+            return [forecast.forecast(distance, 0.0) for distance in distances]
+
+        results, seconds = self.timeIt(forecastFleet)
+        self.addResult('forecast', 'Fleet forecast', vessels, seconds, 'vessels')
+        if any(result is None for result in results):
+            print("Error: some vessels were outside the historical data!")
+        print("{:<32} : {:.1f}%".format("Fraction of the poll interval", 100. * seconds / pollInterval))
+
+    def benchmarkGeodesy(self, filename='Track_Vessel.pkl', points=100000):
+        # Repeat the track in the pickle file (or track store) to make it up to the chosen length
+        store = TrackStore.open(filename)
+        repeats = max(1, math.ceil(points / len(store)))
+        lat = np.tile(np.asarray(store.column('LATITUDE')), repeats)[:points]
+        lon = np.tile(np.asarray(store.column('LONGITUDE')), repeats)[:points]
+        pairs = len(lat) - 1
+
+        print("Geodesy: {} pairs of points".format(pairs))
+
+        reference, seconds = self.timeIt(lambda: trackDistancesNM(lat, lon))
+        vectorized = self.addResult('geodesy', 'Vectorized haversine', pairs, seconds, 'pairs')
+
+        distances, seconds = self.timeIt(lambda: trackDistancesNM(lat, lon, vincentyNM))
+        self.addResult('geodesy', 'Vectorized Vincenty', pairs, seconds, 'pairs')
+
+        try:
+            from haversine import haversine, Unit # pip install haversine
+        except ImportError:
+            print("The haversine package is not installed. Skipping the per-pair comparison")
+            return
+        latitudes = lat.tolist()
+        longitudes = lon.tolist()
+
+        def perPair():
+            return [haversine((latitudes[i], longitudes[i]), (latitudes[i + 1], longitudes[i + 1]), unit=Unit.NAUTICAL_MILES) for i in range(pairs)]
+
+        distances, seconds = self.timeIt(perPair)
+        result = self.addResult('geodesy', 'haversine per pair', pairs, seconds, 'pairs')
+        differences = int(np.count_nonzero(np.array(distances) != reference))
+        print("{:<32} : {}".format("Distances which differ", differences))
+        if vectorized['rate'] is not None and result['rate'] is not None:
+            print("{:<32} : {:.1f}x".format("Speed-up", vectorized['rate'] / result['rate']))
+
+    def benchmarkStage(self, name, func, unit, fleetSize):
+        # Time one stage and measure its peak memory. func returns the number of items it processed
+        items, seconds = self.timeIt(self.quietly(func))
+        peakBytes = self.peakMemory(self.quietly(func))
+        result = self.addResult('scaling', '{} ({} vessels)'.format(name, fleetSize), items, seconds, unit, peakBytes)
+        result['stage'] = name
+        result['vessels'] = fleetSize
+        return result
+
+    def benchmarkScaling(self, fleetSizes=[10, 30, 100], days=1):
+        results = []
+        for fleetSize in fleetSizes:
+            directory = tempfile.mkdtemp(prefix='Synthetic_AIS_')
+            try:
+                synthetic = SyntheticAIS()
+                synthetic.setDirectory(directory)
+                synthetic.setVessels(fleetSize)
+                synthetic.setDays(days)
+                polls = synthetic.generate()
+
+                print("Scaling: {} vessels, {} days, {} polls".format(fleetSize, days, polls))
+
+                storeFilename = os.path.join(directory, 'Track_Vessel.pkl')
+                dataFilename = os.path.join(directory, 'Track_Vessel_Data.pkl')
+                vessel = synthetic.vesselIMO(0)
+                start = synthetic.startDate + ' 00:00:00'
+                end = synthetic.startDate + ' 23:59:59' if days == 1 else \
+                    epochToUTC(synthetic.startEpoch() + (days * 24 * 60 * 60) - 1).strftime('%Y-%m-%d %H:%M:%S')
+
+                # Collate all of the polls
+                collate = Collate()
+                collate.setDirectory(directory)
+                collate.setFilename(storeFilename)
+
+                def collateAll():
+                    collate.collate()
+                    return len(collate.vesselData)
+
+                results.append(self.benchmarkStage('Collate', collateAll, 'entries', fleetSize))
+                entries = collate.vesselData
+
+                # Extract all of the data for one vessel
+                def extractVessel():
+                    extractData = ExtractData()
+                    extractData.setInputPickleFilename(storeFilename)
+                    extractData.setOutputPickleFilename(dataFilename)
+                    extractData.setVessel(vessel)
+                    extractData.setWindow('UTC', start, end)
+                    extractData.extractDataForVessel()
+                    return len(extractData.pickleJar)
+
+                results.append(self.benchmarkStage('ExtractData', extractVessel, 'entries', fleetSize))
+
+                # Find the crossings of all of the vessels
+                def extractCrossings():
+                    crossings = ExtractCrossings()
+                    crossings.setPickleFilename(storeFilename)
+                    crossings.extractCrossings()
+                    return len(entries)
+
+                results.append(self.benchmarkStage('ExtractCrossings', extractCrossings, 'entries', fleetSize))
+
+                # Generate the KML files for one vessel
+                vesselEntries = len(TrackIndex.forStore(TrackStore.open(storeFilename), storeFilename).query(vessel))
+
+                def generateKML():
+                    generate = GenerateKML()
+                    generate.setPickleFilename(storeFilename)
+                    generate.setVessel(vessel)
+                    generate.setWindow('UTC', start, end)
+                    generate.setOutputPrefix(os.path.join(directory, str(vessel)))
+                    generate.generate()
+                    return vesselEntries
+
+                results.append(self.benchmarkStage('GenerateKML', generateKML, 'entries', fleetSize))
+
+                # Locate the entries of one vessel on the route of one of its complete voyages
+                # The route has to cross the Arctic Circle (e.g. Nesna - Ørnes, not Ørnes - Bodø)
+                segmenter = VoyageSegmenter()
+                segmenter.setInputPickleFilename(storeFilename)
+                self.quietly(segmenter.segment)()
+                extractData = ExtractData()
+                store = TrackStore.open(storeFilename)
+                index = TrackIndex.forStore(store, storeFilename)
+                latitudes = np.asarray(store.column('LATITUDE'))
+                for voyage in segmenter.voyages():
+                    voyageLatitudes = latitudes[index.query(voyage['IMO'], voyage['startEpoch'], voyage['endEpoch'])]
+                    if voyageLatitudes.min() <= extractData.ArcticCircleLatitude < voyageLatitudes.max():
+                        break
+                else:
+                    print("No complete voyage crosses the Arctic Circle. Skipping Predict lookup")
+                    continue
+                predictEntries = [ais for ais in entries if ais['IMO'] == voyage['IMO']]
+                routeFilename = os.path.join(directory, 'Track_Vessel_Route.pkl')
+                extractData.setInputPickleFilename(storeFilename)
+                extractData.setOutputPickleFilename(routeFilename)
+                extractData.setVessel(voyage['IMO'])
+                extractData.setWindow('UTC', *segmenter.windows([voyage])[0][1:])
+                self.quietly(extractData.extractDataForVessel)()
+
+                predict = PredictCrossing()
+                predict.setInputPickleFilename(routeFilename)
+                predict.setVerbose(False)
+                predict.setWriteResults(False)
+                predict.setArrivalTime('UTC', end)
+                predict.loadInputPickleFile()
+
+                def lookup():
+                    for ais in predictEntries:
+                        predict.predictAIS(ais)
+                    return len(predictEntries)
+
+                results.append(self.benchmarkStage('Predict lookup', lookup, 'entries', fleetSize))
+            finally:
+                shutil.rmtree(directory)
+
+        # How the time of each stage grows with the fleet size: 1.0 is linear
+        print("Scaling with the fleet size ({} to {} vessels):".format(fleetSizes[0], fleetSizes[-1]))
+        for stage in [result['stage'] for result in results if result['vessels'] == fleetSizes[0]]:
+            times = [result['seconds'] for result in results if result['stage'] == stage]
+            if len(fleetSizes) > 1 and times[0] > 0.0:
+                exponent = math.log(times[-1] / times[0]) / math.log(fleetSizes[-1] / fleetSizes[0])
+                print("{:<32} : time ~ vessels^{:.2f} : {}".format(stage, exponent, \
+                      " ".join("{:.3f}s".format(seconds) for seconds in times)))
+
+if __name__ == '__main__':
+
+    benchmark = Benchmark()
+
+    benchmark.benchmarkCollate()
+
+    benchmark.benchmarkGeodesy()
+
+    # The sailings extracted by Route_Model.py. Run Route_Model.py first to create them
+    benchmark.benchmarkForecast(['Track_Vessel_9107796_' + date + '.pkl' for date in ['2024-10-21', '2024-11-01', '2024-11-23', '2024-12-04']])
+
+    # Synthetic fleets of 10, 30 and 100 vessels
+    benchmark.benchmarkScaling()
+
+    benchmark.writeResults()
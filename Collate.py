@@ -7,58 +7,294 @@
 # This code will collate all Track_Vessel_UTC_*.json files into a single pickle file
 # containing a list of dicts. It will collate all files in the current directory and
 # sub-directories.
+#
+# In incremental mode, a manifest of the files already collated (name, size, mtime)
+# is kept alongside the pickle file. Only new files are parsed and their AIS entries
+# are appended to the pickle file as an additional pickled list. Use loadVesselData
+# to read back all of the lists as a single list of dicts.
+#
+# In columnar mode, the data is written as a memory-mappable TrackStore directory
+# (see Track_Store.py) instead of a pickle file. In incremental mode, the new entries
+# are appended to the column files in place.
+#
+# With setWorkers, the files are parsed by a pool of worker processes. The sorted files are
+# split into contiguous chunks and the results are concatenated in chunk order, so the
+# entries are in exactly the same order as when the files are parsed one at a time.
+#
+# The daily poll archive segments written by Poll_Archive.py (Track_Vessel_UTC_*.polls) are
+# read too. Each record in a segment is treated like a JSON file: it has its own datetime and
+# manifest entry, so the polls from the archive and from JSON files are collated in time order.
+#
+# The time taken to find, parse and write the files is recorded by Instrumentation.py, if enabled.
 
 from datetime import datetime
 import pytz # pip install pytz
 import os
 import json
 import pickle
+from concurrent.futures import ProcessPoolExecutor
+from Track_Store import TrackStore, loadVesselData
+from Poll_Archive import readSegmentIndex, readRecord, segmentSuffix
+from Instrumentation import instrumentation, pathBytes
+
+# Open each file, convert the contents from JSON to dict, and return the AIS entries
+# This is a module-level function so it can be run in a worker process
+def readJSONFiles(filenames):
+    vesselData = []
+    for filename in filenames:
+        with open(filename, 'r') as f:
+            jsonData = json.loads(f.read())
+            for ais in jsonData: # Each file could contain multiple AIS entries
+                #print(ais)
+                vesselData.append(ais['AIS'])
+    return vesselData
+
+# Read the AIS entries of each poll: (filename, offset) pairs, where offset is None for a JSON file
+# or the offset of the record in a poll archive segment
+# This is a module-level function so it can be run in a worker process
+def readPolls(polls):
+    vesselData = []
+    segment = None
+    segmentFilename = None
+    try:
+        for filename, offset in polls:
+            if offset is None:
+                vesselData.extend(readJSONFiles([filename]))
+                continue
+            # Keep the segment open while its records are read
+            if filename != segmentFilename:
+                if segment is not None:
+                    segment.close()
+                segment = open(filename, 'rb')
+                segmentFilename = filename
+            for ais in json.loads(readRecord(segment, offset)):
+                vesselData.append(ais['AIS'])
+    finally:
+        if segment is not None:
+            segment.close()
+    return vesselData
 
 class Collate():
     def __init__(self):
         self.vesselData = []
+        self.filesRead = 0 # The number of files (or archived polls) parsed by the last collate
         self.filename = 'Track_Vessel.pkl'
+        self.manifestFilename = None
+        self.incremental = False
+        self.columnar = False
+        self.directory = '.'
+        self.workers = 1
+        self.chunkSize = 250 # Files per chunk when using worker processes
 
     def setFilename(self, filename):
         self.filename = filename
 
-    def collate(self):
-        # Find all Track_Vessel_UTC_*.json files in the current directory
+    def setManifestFilename(self, filename):
+        self.manifestFilename = filename
+
+    def setIncremental(self, incremental):
+        self.incremental = incremental
+
+    def setColumnar(self, columnar):
+        self.columnar = columnar
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setWorkers(self, workers):
+        self.workers = workers
+
+    def setChunkSize(self, chunkSize):
+        self.chunkSize = chunkSize
+
+    def getManifestFilename(self):
+        if self.manifestFilename is None:
+            return self.filename.split('.')[0] + '_Manifest.json'
+        return self.manifestFilename
+
+    def findFiles(self):
+        # Find all Track_Vessel_UTC_*.json files in the directory (default: the current directory)
+        # and the polls in any Track_Vessel_UTC_*.polls segments
+        with instrumentation.stage('Collate.findFiles') as stage:
+            sortedFiles = self.searchDirectory()
+            stage.count(records=len(sortedFiles))
+        return sortedFiles
+
+    def searchDirectory(self):
         filePrefix = 'Track_Vessel_UTC_'
         prefixLen = len(filePrefix)
         fileSuffix = '.json'
         suffixLen = len(fileSuffix)
         foundFiles = []
-        for root, dirs, files in os.walk("."):
+        for root, dirs, files in os.walk(self.directory):
             if len(files) > 0:
                 for afile in files:
                     if afile[-suffixLen:] == fileSuffix and afile[:prefixLen] == filePrefix:
                         fileInfo = {
                             'datetime': None,
-                            'filename': ''
+                            'filename': '',
+                            'offset': None
                         }
                         fileInfo['datetime'] = datetime.strptime(afile, filePrefix + "%Y-%m-%d_%H-%M-%S" + fileSuffix)
                         fileInfo['filename'] = os.path.join(root, afile)
                         foundFiles.append(fileInfo)
+                    elif afile[-len(segmentSuffix):] == segmentSuffix and afile[:prefixLen] == filePrefix:
+                        filename = os.path.join(root, afile)
+                        index, end = readSegmentIndex(filename)
+                        for epoch, offset, length in index:
+                            fileInfo = {
+                                'datetime': datetime.fromtimestamp(epoch, pytz.UTC).replace(tzinfo=None), # UTC, like the JSON filenames
+                                'filename': filename,
+                                'offset': offset,
+                                'size': length
+                            }
+                            foundFiles.append(fileInfo)
 
         # Now sort the list into ascending time order
-        sortedFiles = sorted(foundFiles, key=lambda d: d['datetime'])
+        return sorted(foundFiles, key=lambda d: d['datetime'])
 
-        # Now open each file, convert the contents from JSON to dict, and add to the list
-        self.vesselData = []
+    def readFiles(self, sortedFiles):
+        with instrumentation.stage('Collate.readFiles') as stage:
+            vesselData = self.parseFiles(sortedFiles)
+            stage.count(records=len(vesselData))
+            if instrumentation.enabled:
+                stage.count(bytesRead=sum(file['size'] if file.get('offset') is not None else os.path.getsize(file['filename']) \
+                                          for file in sortedFiles))
+        return vesselData
+
+    def parseFiles(self, sortedFiles):
+        polls = [(file['filename'], file.get('offset')) for file in sortedFiles]
+        if self.workers <= 1 or len(polls) <= self.chunkSize:
+            return readPolls(polls)
+
+        # Parse contiguous chunks of the sorted files in parallel
+        # map returns the results in chunk order, preserving the ascending time order
+        chunks = [polls[i:i + self.chunkSize] for i in range(0, len(polls), self.chunkSize)]
+        vesselData = []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for chunkData in executor.map(readPolls, chunks):
+                vesselData.extend(chunkData)
+        return vesselData
+
+    def readResult(self, fileInfo):
+        # Return the JSON text of one file (or archived poll) found by findFiles
+        if fileInfo.get('offset') is None:
+            with open(fileInfo['filename'], 'r') as f:
+                return f.read()
+        with open(fileInfo['filename'], 'rb') as f:
+            return readRecord(f, fileInfo['offset'])
+
+    def manifestKey(self, fileInfo):
+        if fileInfo.get('offset') is None:
+            return fileInfo['filename']
+        return fileInfo['filename'] + '@' + str(fileInfo['offset'])
+
+    def fileStat(self, fileInfo):
+        # Archived polls are never changed once written (the segments are append-only)
+        if fileInfo.get('offset') is not None:
+            return {
+                'size': fileInfo['size'],
+                'mtime': fileInfo['datetime'].strftime("%Y-%m-%d %H:%M:%S")
+            }
+        stat = os.stat(fileInfo['filename'])
+        return {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime
+        }
+
+    def loadManifest(self):
+        manifestFilename = self.getManifestFilename()
+        if not os.path.isfile(manifestFilename) or not os.path.exists(self.filename):
+            return None
+        with open(manifestFilename, 'r') as f:
+            return json.loads(f.read())
+
+    def writeManifest(self, sortedFiles):
+        manifest = {
+            'latest': None,
+            'files': {}
+        }
         for file in sortedFiles:
-            with open(file['filename'], 'r') as f:
-                jsonData = json.loads(f.read())
-                for ais in jsonData: # Each file could contain multiple AIS entries
-                    #print(ais)
-                    self.vesselData.append(ais['AIS'])
-
-        # Now write the list to a pickle file
-        with open(self.filename, 'wb') as f:
-            pickle.dump(self.vesselData, f)
+            manifest['files'][self.manifestKey(file)] = self.fileStat(file)
+        if len(sortedFiles) > 0:
+            manifest['latest'] = sortedFiles[-1]['datetime'].strftime("%Y-%m-%d %H:%M:%S")
+        with open(self.getManifestFilename(), 'w') as f:
+            f.write(json.dumps(manifest))
+
+    def writeData(self, append):
+        with instrumentation.stage('Collate.writeData') as stage:
+            if self.columnar:
+                store = TrackStore.fromRecords(self.vesselData)
+                before = pathBytes(self.filename) if (append and instrumentation.enabled) else 0
+                if append:
+                    store.append(self.filename) # Only the new entries are written
+                else:
+                    store.save(self.filename)
+                if instrumentation.enabled:
+                    stage.count(bytesWritten=pathBytes(self.filename) - before)
+            else:
+                with open(self.filename, 'ab' if append else 'wb') as f:
+                    start = f.tell()
+                    pickle.dump(self.vesselData, f)
+                    stage.count(bytesWritten=f.tell() - start)
+            stage.count(records=len(self.vesselData))
+
+    def collate(self):
+        sortedFiles = self.findFiles()
+
+        if self.incremental:
+            manifest = self.loadManifest()
+            if manifest is not None:
+                newFiles = []
+                rebuild = False
+                for file in sortedFiles:
+                    if self.manifestKey(file) in manifest['files'].keys():
+                        # A file which has changed since it was collated needs a full rebuild
+                        if self.fileStat(file) != manifest['files'][self.manifestKey(file)]:
+                            rebuild = True
+                    else:
+                        newFiles.append(file)
+
+                # New files must all be newer than the latest collated file,
+                # otherwise appending them would break the ascending time order
+                if len(newFiles) > 0 and manifest['latest'] is not None:
+                    latest = datetime.strptime(manifest['latest'], "%Y-%m-%d %H:%M:%S")
+                    if newFiles[0]['datetime'] < latest:
+                        rebuild = True
+
+                if not rebuild:
+                    # Append only the entries from the new files
+                    self.vesselData = self.readFiles(newFiles)
+                    self.filesRead = len(newFiles)
+                    if len(self.vesselData) > 0:
+                        self.writeData(append=True)
+                    self.writeManifest(sortedFiles)
+                    print("Collated {} new files ({} entries)".format(len(newFiles), len(self.vesselData)))
+                    return
+
+                print("Collated files have changed. Rebuilding " + self.filename)
+
+        self.vesselData = self.readFiles(sortedFiles)
+        self.filesRead = len(sortedFiles)
+
+        # Now write the list to a pickle file (or columnar store)
+        self.writeData(append=False)
+
+        if self.incremental:
+            self.writeManifest(sortedFiles)
             
 if __name__ == '__main__':
 
     collate = Collate()
 
+    # Uncomment to only parse files which have not been collated before
+    #collate.setIncremental(True)
+
+    # Uncomment to write a memory-mappable columnar store instead of a pickle file
+    #collate.setFilename('Track_Vessel.trk')
+    #collate.setColumnar(True)
+
+    # Uncomment to parse the files using four worker processes
+    #collate.setWorkers(4)
+
     collate.collate()
@@ -0,0 +1,194 @@
+# Crossing_Alert.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code detects Arctic Circle crossings as the polls arrive, instead of running Collate.py
+# and Extract_Crossings.py over the whole history afterwards.
+#
+# The last AIS entry of each vessel is kept. When a new entry is on the other side of a circle
+# (LATITUDE > the Circle is North, as in Extract_Crossings.py) and no more than maxGap later,
+# a crossing event is sent straight away to each sink. The time and Longitude are interpolated
+# by Latitude, and by speed, exactly as ExtractCrossings does, so the events match its crossings.
+# Entries which are not newer than the vessel's last entry (e.g. a repeated poll) are ignored.
+#
+# The sinks are:
+#   StdoutSink : prints the crossing, in the same format as Extract_Crossings.py
+#   JSONLinesSink : appends each event to a file, one JSON object per line
+#   SocketSink : sends each event as a JSON UDP datagram (e.g. to a local dashboard)
+# A sink is any object with emit(event) and close() methods.
+#
+# Add CrossingAlert.processResult to a Tracker (Track_Vessel.py) with addListener,
+# so it sees every poll, including when the Tracker is run by Async_Tracker.py.
+
+import json
+import socket
+import time
+from Geodesy import haversineNM
+from Extract_Crossings import ExtractCrossings
+from Timestamps import parseTimestamp
+
+class StdoutSink():
+    def __init__(self, tz='UTC'):
+        self.printer = ExtractCrossings()
+        self.printer.setTimeZone(tz)
+
+    def emit(self, event):
+        self.printer.printCrossing(event)
+        print("-----------------------------------------------------------------")
+
+    def close(self):
+        pass
+
+class JSONLinesSink():
+    def __init__(self, filename):
+        self.file = open(filename, 'a')
+
+    def emit(self, event):
+        self.file.write(json.dumps(event) + "\n")
+        self.file.flush() # So a reader sees the event straight away
+
+    def close(self):
+        self.file.close()
+
+class SocketSink():
+    def __init__(self, host='127.0.0.1', port=8081):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, event):
+        try:
+            self.socket.sendto(json.dumps(event).encode('utf-8'), self.address)
+        except OSError as e:
+            print("Socket sink error! ({})".format(e))
+
+    def close(self):
+        self.socket.close()
+
+class CrossingAlert():
+    def __init__(self):
+        self.crossingCalculator = ExtractCrossings() # For the crossing time by speed
+        self.latitudes = []
+        self.setArcticCircleDegMinSec(66., 33., 0.) # Historical value: 66 degrees 33 minutes
+        self.maxGap = 6 * 60 * 60 # Ignore pairs of entries more than 6 hours apart (e.g. separate sailings)
+        self.sinks = []
+        self.vessels = {} # IMO : the vessel's last AIS entry
+        self.events = []
+
+    def setArcticCircleLatitude(self, lat):
+        self.latitudes = [lat]
+
+    def setArcticCircleDegMinSec(self, deg, min, sec):
+        self.setArcticCircleLatitude(self.crossingCalculator.dms2decdeg(deg, min, sec))
+
+    def addArcticCircleLatitude(self, lat):
+        # Detect crossings of several latitudes (e.g. the historical and true values)
+        self.latitudes.append(lat)
+
+    def setMaxGap(self, seconds):
+        self.maxGap = seconds
+
+    def setSpeedProfile(self, profile):
+        self.crossingCalculator.setSpeedProfile(profile)
+
+    def addSink(self, sink):
+        self.sinks.append(sink)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def crossingEvent(self, previous, entry, circle):
+        # previous and entry are (epoch, LATITUDE, LONGITUDE, SPEED) on opposite sides of circle
+        firstEpoch, firstLat, firstLon, firstSpeed = previous
+        secondEpoch, secondLat, secondLon, secondSpeed = entry
+        northbound = secondLat > circle
+
+        # Calculate the fractional distance to the Circle from the first entry - by Latitude alone
+        fraction = (circle - firstLat) / (secondLat - firstLat)
+        distance = float(haversineNM(firstLat, firstLon, secondLat, secondLon))
+        south, north = (previous, entry) if northbound else (entry, previous)
+
+        return {
+            'circleLatitude': float(circle),
+            'northbound': bool(northbound),
+            'southLatitude': float(south[1]),
+            'southEpoch': int(south[0]),
+            'northLatitude': float(north[1]),
+            'northEpoch': int(north[0]),
+            'crossingLongitude': float(firstLon + ((secondLon - firstLon) * fraction)),
+            'crossingEpochByLat': float(firstEpoch + ((secondEpoch - firstEpoch) * fraction)),
+            'crossingEpochBySpeed': self.crossingCalculator.crossingTimeBySpeed(firstEpoch, secondEpoch, \
+                                                                                float(firstSpeed), float(secondSpeed), fraction * distance, distance)
+        }
+
+    def processAIS(self, ais):
+        # Update the vessel with one AIS entry. Return the crossing events (usually none)
+        if ais.get('LATITUDE') is None or ais.get('LONGITUDE') is None:
+            return []
+        IMO = ais['IMO']
+        entry = (parseTimestamp(ais['TIMESTAMP']), ais['LATITUDE'], ais['LONGITUDE'], ais['SPEED'] if ais.get('SPEED') is not None else 0.0)
+        previous = self.vessels.get(IMO)
+        if previous is not None and entry[0] <= previous[0]:
+            return [] # Not a new entry
+        self.vessels[IMO] = entry
+        if previous is None or entry[0] - previous[0] > self.maxGap:
+            return []
+
+        events = []
+        for circle in self.latitudes:
+            if (previous[1] > circle) != (entry[1] > circle): # Entries on the Circle count as South
+                event = {
+                    'IMO': IMO,
+                    'NAME': ais.get('NAME')
+                }
+                event.update(self.crossingEvent(previous, entry, circle))
+                event['detectedEpoch'] = time.time()
+                events.append(event)
+
+        # Send the events in time order
+        events.sort(key=lambda e: e['crossingEpochByLat'])
+        for event in events:
+            for sink in self.sinks:
+                sink.emit(event)
+        self.events.extend(events)
+        return events
+
+    def processResult(self, result):
+        # result is the JSON text of a VESSELS API request (see Track_Vessel.py). Return the crossing events
+        if result is None or 'AIS' not in result:
+            return []
+        events = []
+        for ais in json.loads(result):
+            events.extend(self.processAIS(ais['AIS']))
+        return events
+
+if __name__ == '__main__':
+
+    from Track_Vessel import Tracker
+
+    alert = CrossingAlert()
+
+    # Alongside the Polar Circle Globe on Vikingen Island
+    alert.setArcticCircleDegMinSec(66., 31., 57.7)
+
+    alert.addSink(StdoutSink('Europe/Oslo'))
+    alert.addSink(JSONLinesSink('Crossing_Alerts.jsonl'))
+
+    # Uncomment to send the events to a local socket too
+    #alert.addSink(SocketSink('127.0.0.1', 8081))
+
+    tracker = Tracker()
+    tracker.setUserKey('<ADD YOUR KEY HERE>')
+    tracker.addVessel('MS Polarlys', 9107796)
+    tracker.addWindow('Europe/Oslo', '2024-12-04 06:00:00', '2024-12-04 10:10:00')
+    tracker.addListener(alert.processResult)
+
+    # Uncomment to test against Local_API_Server.py
+    #tracker.setBaseURL('http://127.0.0.1:8080/vessels')
+
+    try:
+        tracker.track()
+    finally:
+        alert.close()
@@ -0,0 +1,137 @@
+# Crossing_Forecast.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code forecasts when a vessel will cross the Arctic Circle as a range of times,
+# by simulating thousands of possible trajectories from the vessel's current position.
+#
+# The historical speeds (SPEED_BY_DISTANCE from the Extract_Data.py pickle files) are
+# interpolated onto segments of the route, every segmentLength Nautical Miles, aligned by the
+# distance to the Circle (CIRCLE_NM). Each trajectory picks the speed for each segment at
+# random from the sailings which have data for it, so the trajectories cover the spread of
+# speeds seen in the past. The speed of a vessel changes slowly, so a trajectory keeps the same
+# sailing for blockLength Nautical Miles at a time (otherwise the spread would average away).
+# All of the trajectories are simulated at once with NumPy.
+# forecast returns the requested quantiles of the crossing time.
+
+import pickle
+import numpy as np # pip install numpy
+from Timestamps import epochToUTC
+
+class CrossingForecast():
+    def __init__(self):
+        self.segmentLength = 0.25 # Nautical Miles
+        self.blockLength = 2.0 # Nautical Miles
+        self.minSpeed = 0.5 # Knots. Slower speeds are treated as this, so the time stays finite
+        self.trajectories = 10000
+        self.quantiles = [0.1, 0.5, 0.9]
+        self.random = np.random.default_rng(0)
+        self.sailings = [] # The speeds (Knots) of each sailing for each segment. NaN if unknown
+        self.first = 0 # The segment number of the first column. Segment n starts n * segmentLength NM past the Circle
+        self.segmentTimes = np.zeros((0, 0), dtype=np.float64) # The time (seconds) to travel each segment, packed
+        self.counts = np.zeros(0, dtype=np.int64) # The number of sailings with data for each segment
+
+    def setSegmentLength(self, nm):
+        self.segmentLength = nm
+
+    def setBlockLength(self, nm):
+        self.blockLength = nm
+
+    def setMinSpeed(self, knots):
+        self.minSpeed = knots
+
+    def setTrajectories(self, trajectories):
+        self.trajectories = trajectories
+
+    def setQuantiles(self, quantiles):
+        self.quantiles = quantiles
+
+    def setSeed(self, seed):
+        self.random = np.random.default_rng(seed)
+
+    def addSailing(self, pickleJar):
+        # Add the speeds from a sailing (an Extract_Data.py pickleJar)
+        along = [] # NM past the Circle
+        speeds = []
+        for entry in pickleJar.values():
+            if entry['SPEED_BY_DISTANCE'] is not None:
+                along.append(-entry['CIRCLE_NM'])
+                speeds.append(entry['SPEED_BY_DISTANCE'])
+        if len(along) < 2:
+            return
+        along = np.maximum.accumulate(np.array(along, dtype=np.float64))
+        speeds = np.array(speeds, dtype=np.float64)
+        first = int(np.ceil(along[0] / self.segmentLength))
+        last = int(np.floor(along[-1] / self.segmentLength)) - 1 # The last whole segment
+        if last < first:
+            return
+        # The speed at the middle of each segment
+        midpoints = (np.arange(first, last + 1) + 0.5) * self.segmentLength
+        self.sailings.append((first, np.interp(midpoints, along, speeds)))
+        self.pack()
+
+    def addSailingFile(self, filename):
+        with open(filename, 'rb') as f:
+            self.addSailing(pickle.load(f))
+
+    def pack(self):
+        # Arrange the segment times so the sailings with data for each segment come first in its column.
+        # Then a random sailing for segment n is row floor(uniform * counts[n])
+        self.first = min(first for first, speeds in self.sailings)
+        last = max(first + len(speeds) for first, speeds in self.sailings)
+        table = np.full((len(self.sailings), last - self.first), np.nan)
+        for row, (first, speeds) in enumerate(self.sailings):
+            table[row, first - self.first:first - self.first + len(speeds)] = speeds
+        times = 3600. * self.segmentLength / np.maximum(table, self.minSpeed)
+        known = ~np.isnan(table)
+        order = np.argsort(~known, axis=0, kind='stable')
+        self.segmentTimes = np.take_along_axis(times, order, axis=0)
+        self.counts = known.sum(axis=0)
+
+    def simulate(self, circleNM):
+        # Return the simulated times (seconds) to travel circleNM to the Circle, one per trajectory.
+        # None if the vessel is beyond the Circle or outside the historical data
+        if circleNM <= 0.0 or len(self.sailings) == 0:
+            return None
+        along = -circleNM
+        segment = int(np.floor(along / self.segmentLength))
+        columns = np.arange(segment, 0) - self.first
+        if len(columns) == 0 or columns[0] < 0 or columns[-1] >= len(self.counts) or np.any(self.counts[columns] == 0):
+            return None
+        # One random number per block. The sailings keep the same order in each column, so the same
+        # number selects the same sailing for all of the segments in the block (where it has data)
+        blockSegments = max(1, int(round(self.blockLength / self.segmentLength)))
+        blocks = self.random.random((self.trajectories, (len(columns) + blockSegments - 1) // blockSegments))
+        rows = (np.repeat(blocks, blockSegments, axis=1)[:, :len(columns)] * self.counts[columns]).astype(np.int64)
+        times = self.segmentTimes[rows, columns]
+        # The vessel is part way through the first segment
+        times[:, 0] *= ((segment + 1) * self.segmentLength - along) / self.segmentLength
+        return times.sum(axis=1)
+
+    def forecast(self, circleNM, epoch):
+        # Return a dict of quantile : crossing time (epoch seconds) for a vessel at epoch, circleNM from the Circle
+        times = self.simulate(circleNM)
+        if times is None:
+            return None
+        return dict(zip(self.quantiles, (epoch + np.quantile(times, self.quantiles)).tolist()))
+
+if __name__ == '__main__':
+
+    from Route_Index import RouteIndex
+
+    forecast = CrossingForecast()
+
+    # The sailings extracted by Route_Model.py
+    for date in ['2024-10-21', '2024-11-01', '2024-11-23', '2024-12-04']:
+        forecast.addSailingFile('Track_Vessel_9107796_' + date + '.pkl')
+
+    # The MS Polarlys at 2024-12-04 06:20:29 (UTC). It crossed at 06:58:41 (UTC)
+    route = RouteIndex.load('Track_Vessel_9107796.pkl')
+    location = route.locate(66.38128, 12.97174)
+    result = forecast.forecast(location['CIRCLE_NM'], 1733293229)
+
+    print("Distance to Arctic Circle (NM)  : {:.1f}".format(location['CIRCLE_NM']))
+    for quantile in result.keys():
+        print("Crossing Time ({:2.0f}%)             : {} (UTC)".format(quantile * 100, epochToUTC(result[quantile]).strftime('%Y-%m-%d %H:%M:%S')))
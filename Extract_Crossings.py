@@ -6,18 +6,37 @@
 #
 # This code will open the pickle file created by Collate.py and
 # calculate the time of any Arctic Circle crossings
+#
+# The crossings for all vessels, and for several Arctic Circle latitudes, are found in one
+# pass: the entries are sorted by vessel and time (see Track_Index.py) and a crossing is any
+# pair of consecutive entries for the same vessel where LATITUDE changes from <= the Circle
+# to > the Circle (northbound) or from > the Circle to <= the Circle (southbound).
+# Pairs of entries which are more than maxGap apart (e.g. separate sailings) are ignored.
+#
+# With setCache, the crossings are cached (see Artifact_Cache.py), keyed on the latitudes, maxGap,
+# the speed profile and the entries used, so they are only found again when the data changes.
 
-from datetime import datetime, timedelta
-import pickle
-import pytz
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
 import math
-from haversine import haversine, Unit
+import pytz
+import numpy as np # pip install numpy
+from Geodesy import haversineNM
+from Speed_Profile import LinearSpeedProfile, PiecewiseSpeedProfile
+from Timestamps import epochToUTC
+from Artifact_Cache import recordsHash
+from Instrumentation import instrumentation
 
 class ExtractCrossings():
     def __init__(self):
         self.pickleFile = 'Track_Vessel.pkl'
         self.setArcticCircleDegMinSec(66., 33., 0.) # Historical value: 66 degrees 33 minutes
         self.timezone = 'UTC'
+        self.maxGap = 6 * 60 * 60 # Ignore pairs of entries more than 6 hours apart (e.g. separate sailings)
+        self.speedProfile = LinearSpeedProfile
+        self.vessels = {}
+        self.crossings = []
+        self.cache = None # An ArtifactCache (see Artifact_Cache.py). None : no caching
 
     def setPickleFilename(self, filename):
         self.pickleFile = filename
@@ -34,122 +53,195 @@ class ExtractCrossings():
         self.ArcticCircleLatitude = lat
         self.ArcticCircleDeg, self.ArcticCircleMin, self.ArcticCircleSec = self.decdeg2dms(self.ArcticCircleLatitude)
 
+    # Convert deg/min/sec to degrees
+    def dms2decdeg(self, deg, min, sec):
+        return deg + (min / 60.) + (sec / 3600.)
+
     def setArcticCircleDegMinSec(self, deg, min, sec):
         self.ArcticCircleDeg = deg
         self.ArcticCircleMin = min
         self.ArcticCircleSec = sec
-        self.ArcticCircleLatitude = self.ArcticCircleDeg + (self.ArcticCircleMin / 60.) + (self.ArcticCircleSec / 3600.)
+        self.ArcticCircleLatitude = self.dms2decdeg(self.ArcticCircleDeg, self.ArcticCircleMin, self.ArcticCircleSec)
 
     def setTimeZone(self, tz):
         self.timezone = tz
 
+    def setMaxGap(self, seconds):
+        self.maxGap = seconds
+
+    # The speed profile class is constructed with the times (epoch seconds) and speeds (Knots)
+    # of the entries either side of the crossing and an intermediate sample between them.
+    # LinearSpeedProfile (the default) ignores the intermediate sample. See Speed_Profile.py
+    def setSpeedProfile(self, profile):
+        self.speedProfile = profile
+
+    def setCache(self, cache):
+        self.cache = cache
+
     def greatCircleDistance(self, lat1, lon1, lat2, lon2):
-        # https://en.wikipedia.org/wiki/Great-circle_distance
-        lat1_radians = math.radians(lat1)
-        lon1_radians = math.radians(lon1)
-        lat2_radians = math.radians(lat2)
-        lon2_radians = math.radians(lon2)
-        delta_lon = lon1_radians - lon2_radians
-        cos_delta_lon = math.cos(delta_lon)
-        sin_lat1 = math.sin(lat1_radians)
-        cos_lat1 = math.cos(lat1_radians)
-        sin_lat2 = math.sin(lat2_radians)
-        cos_lat2 = math.cos(lat2_radians)
-        central_angle = math.acos((sin_lat1 * sin_lat2) + (cos_lat1 * cos_lat2 * cos_delta_lon))
-        earth_radius = 3443.9308 # nautical miles
-        distance = earth_radius * central_angle
-        return distance
-
-    def greatCircleDistanceHaversine(self, lat1, lon1, lat2, lon2):
-        return haversine((lat1, lon1), (lat2, lon2), unit=Unit.NAUTICAL_MILES)
-
-    def extractCrossings(self):
-        # Load the pickle file
-        pkl = None
-        with open(self.pickleFile, 'rb') as f:
-            pkl = pickle.load(f)
-
-        # Search for all vessels
-        vessels = {}
-        for entry in pkl:
-            if str(entry['IMO']) not in vessels.keys():
-                vessels[str(entry['IMO'])] = entry['NAME']
+        # See Geodesy.py. The haversine formula stays accurate for points which are very close together
+        return float(haversineNM(lat1, lon1, lat2, lon2))
+
+    greatCircleDistanceHaversine = greatCircleDistance # Both names are kept for existing callers
+
+    def intermediateSample(self, firstEpoch, secondEpoch, firstSpeed, secondSpeed, totalDistance):
+        # The entries either side of a crossing are consecutive, so there are no reported samples between them.
+        # Return a sample half way between the entries, with the speed which makes the profile cover the
+        # distance between the entries' positions (totalDistance, NM) in the time between them
+        interval = secondEpoch - firstEpoch
+        speed = (7200. * totalDistance / interval) - ((firstSpeed + secondSpeed) / 2.)
+        return firstEpoch + (interval / 2.), max(speed, 0.0)
+
+    def crossingTimeBySpeed(self, firstEpoch, secondEpoch, firstSpeed, secondSpeed, distance, totalDistance=None):
+        # Calculate the time of the crossing - by speed
+        # Solve for the time when distance has been travelled from the first entry,
+        # with the speed changing between the two entries as described by the speed profile.
+        # If totalDistance (the distance between the entries) is given, an intermediate sample is added
+        if secondEpoch <= firstEpoch:
+            return firstEpoch
+        times = [firstEpoch, secondEpoch]
+        speeds = [firstSpeed, secondSpeed]
+        if totalDistance is not None:
+            midEpoch, midSpeed = self.intermediateSample(firstEpoch, secondEpoch, firstSpeed, secondSpeed, totalDistance)
+            times.insert(1, midEpoch)
+            speeds.insert(1, midSpeed)
+        profile = self.speedProfile(times, speeds)
+        timeToCrossing = profile.timeToDistance(distance)
+        if timeToCrossing is None:
+            return float(secondEpoch) # The speeds never cover the distance. Use the second entry
+        return float(firstEpoch + min(timeToCrossing, secondEpoch - firstEpoch))
+
+    def findCrossings(self, latitudes=None):
+        # Find the crossings of each latitude for all vessels. Returns a list of dicts
+        if latitudes is None:
+            latitudes = [self.ArcticCircleLatitude]
+
+        # Load the pickle file (or columnar track store) and its index
+        store = TrackStore.open(self.pickleFile)
+        index = TrackIndex.forStore(store, self.pickleFile)
+
+        with instrumentation.stage('ExtractCrossings.findCrossings') as stage:
+            stage.count(records=len(store))
+            if self.cache is not None:
+                params = {
+                    'latitudes': [float(lat) for lat in latitudes],
+                    'maxGap': self.maxGap,
+                    'speedProfile': self.speedProfile.__name__,
+                    'vessels': index.vessels() # The order the vessels first appear
+                }
+                self.vessels, crossings = self.cache.cached('crossings', params, recordsHash(store, index.order, ['IMO', 'NAME', 'LATITUDE', 'LONGITUDE', 'SPEED', 'EPOCH']), \
+                                                            lambda: self.calculateCrossings(store, index, latitudes))
+                return crossings
+            return self.calculateCrossings(store, index, latitudes)[1]
+
+    def calculateCrossings(self, store, index, latitudes):
+        # Returns the vessels and the crossings
+        # Put the entries in vessel and time order
+        order = index.order
+        IMOs = np.asarray(store.column('IMO'))[order]
+        lat = np.asarray(store.column('LATITUDE'))[order]
+        lon = np.asarray(store.column('LONGITUDE'))[order]
+        speed = np.asarray(store.column('SPEED'))[order]
+        epoch = index.epoch
+
+        # Find every pair of consecutive entries (first, second) for the same vessel, no more
+        # than maxGap apart, where the entries are on opposite sides of a circle
+        circles = np.asarray(latitudes, dtype=np.float64)
+        north = lat[np.newaxis, :] > circles[:, np.newaxis] # Entries on the Circle count as South
+        pairs = (IMOs[1:] == IMOs[:-1]) & ((epoch[1:] - epoch[:-1]) <= self.maxGap)
+        changed = (north[:, 1:] != north[:, :-1]) & pairs[np.newaxis, :]
+        circle, first = np.nonzero(changed)
+        second = first + 1
+        northbound = north[circle, second]
 
+        # Calculate the fractional distance to the Circle from the first entry - by Latitude alone
+        fraction = (circles[circle] - lat[first]) / (lat[second] - lat[first])
+
+        # Calculate the time and Longitude of the crossing - by Latitude alone
+        crossingEpochByLat = epoch[first] + ((epoch[second] - epoch[first]) * fraction)
+        crossingLon = lon[first] + ((lon[second] - lon[first]) * fraction)
+
+        southEntry = np.where(northbound, first, second)
+        northEntry = np.where(northbound, second, first)
+
+        # List all the vessels in the order they first appear
+        self.vessels = {}
+        vesselRank = {}
+        for IMO in index.vessels():
+            start, stop = index.vesselSlice(IMO)
+            self.vessels[str(IMO)] = store.value('NAME', order[start])
+            vesselRank[IMO] = len(vesselRank)
+
+        # Calculate the Great Circle Distance between the two points of every pair, in one call
+        distances = haversineNM(lat[first], lon[first], lat[second], lon[second])
+
+        crossings = []
+        for i in range(len(first)):
+
+            crossing = {
+                'IMO': int(IMOs[first[i]]),
+                'NAME': store.value('NAME', order[first[i]]),
+                'circleLatitude': float(circles[circle[i]]),
+                'northbound': bool(northbound[i]),
+                'southLatitude': float(lat[southEntry[i]]),
+                'southEpoch': int(epoch[southEntry[i]]),
+                'northLatitude': float(lat[northEntry[i]]),
+                'northEpoch': int(epoch[northEntry[i]]),
+                'crossingLongitude': float(crossingLon[i]),
+                'crossingEpochByLat': float(crossingEpochByLat[i]),
+                'crossingEpochBySpeed': self.crossingTimeBySpeed(int(epoch[first[i]]), int(epoch[second[i]]), \
+                                                                 float(speed[first[i]]), float(speed[second[i]]), \
+                                                                 float(fraction[i] * distances[i]), float(distances[i]))
+            }
+            crossings.append(crossing)
+
+        # Sort by vessel, then time, then circle latitude
+        return self.vessels, sorted(crossings, key=lambda c: (vesselRank[c['IMO']], c['crossingEpochByLat'], c['circleLatitude']))
+
+    def printCrossing(self, crossing):
+        if crossing['circleLatitude'] == self.ArcticCircleLatitude:
+            circleDeg, circleMin, circleSec = self.ArcticCircleDeg, self.ArcticCircleMin, self.ArcticCircleSec
+        else:
+            circleDeg, circleMin, circleSec = self.decdeg2dms(crossing['circleLatitude'])
+        crossingDeg, crossingMin, crossingSec = self.decdeg2dms(crossing['crossingLongitude'])
+        timeOfCrossingByLat = epochToUTC(crossing['crossingEpochByLat'])
+        # The time by speed is rounded up to the next whole second, as the original one second steps did
+        timeOfCrossingBySpeed = epochToUTC(math.ceil(crossing['crossingEpochBySpeed']))
+
+        print("-----------------------------------------------------------------")
+        print("Vessel                    : " + str(crossing['IMO']))
+        print("Direction                 : " + ("Northbound" if crossing['northbound'] else "Southbound"))
+        print("Arctic Circle             : {:.5f} ({:02.0f}° {:02.0f}\' {:02.1f}\")" \
+              .format(crossing['circleLatitude'], circleDeg, circleMin, circleSec))
+        print("Latitude (South)          : {:.5f} at {} (UTC)" \
+              .format(crossing['southLatitude'], epochToUTC(crossing['southEpoch']).strftime('%Y-%m-%d %H:%M:%S')))
+        print("Latitude (North)          : {:.5f} at {} (UTC)" \
+              .format(crossing['northLatitude'], epochToUTC(crossing['northEpoch']).strftime('%Y-%m-%d %H:%M:%S')))
+        print("Longitude of crossing     : {:.5f} ({:02.0f}° {:02.0f}\' {:02.1f}\")" \
+              .format(crossing['crossingLongitude'], crossingDeg, crossingMin, crossingSec))
+        print("Crossing time by Latitude : {} ({})" \
+              .format(timeOfCrossingByLat.astimezone(pytz.timezone(self.timezone)).strftime('%Y-%m-%d %H:%M:%S'), self.timezone))
+        print("Crossing time by speed    : {} ({})" \
+              .format(timeOfCrossingBySpeed.astimezone(pytz.timezone(self.timezone)).strftime('%Y-%m-%d %H:%M:%S'), self.timezone))
+
+    def extractCrossings(self, latitudes=None):
+        # Find and print the crossings. latitudes is an optional list of Arctic Circle latitudes
+        self.crossings = self.findCrossings(latitudes)
+
+        with instrumentation.stage('ExtractCrossings.print') as stage:
+            self.printCrossings()
+            stage.count(records=len(self.crossings))
+
+    def printCrossings(self):
         print()
         print("Found vessels:")
-        for vessel in vessels.keys():
-            print(vessel + " : " + vessels[vessel])
-
-        # For each vessel, find entries either side of the Arctic Circle latitude
-        for vessel in vessels.keys():
-            latSouthOfCircle = -90.
-            entrySouthOfCircle = None
-            for entry in pkl:
-                if str(entry['IMO']) == vessel: # Match the vessel
-                    # Set latSouthOfCircle to the highest latitude which is <= the Circle
-                    if entry['LATITUDE'] >= latSouthOfCircle and entry['LATITUDE'] <= self.ArcticCircleLatitude:
-                        latSouthOfCircle = entry['LATITUDE']
-                        entrySouthOfCircle = entry
-                    # Check latSouthOfCircle and been set and the latitude of this entry is > the Circle
-                    if latSouthOfCircle > -90. and entry['LATITUDE'] > self.ArcticCircleLatitude:
-
-                        # Gather the data we need to calculate the crossing
-                        southLat = entrySouthOfCircle['LATITUDE']
-                        southLon = entrySouthOfCircle['LONGITUDE']
-                        southSpeed = entrySouthOfCircle['SPEED']
-                        southDT = pytz.timezone('UTC').localize(datetime.strptime(entrySouthOfCircle['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-                        northLat = entry['LATITUDE']
-                        northLon = entry['LONGITUDE']
-                        northSpeed = entry['SPEED']
-                        northDT = pytz.timezone('UTC').localize(datetime.strptime(entry['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-
-                        # Calculate the fractional distance to the Circle - by Latitude alone
-                        deltaLat = northLat - southLat
-                        deltaCircle = self.ArcticCircleLatitude - southLat
-                        fraction = deltaCircle / deltaLat
-
-                        # Calculate the time of the crossing - by Latitude alone
-                        timeOfCrossingByLat = southDT + ((northDT - southDT) * fraction)
-
-                        # Calculate the Longitude of the crossing - by Latitude alone
-                        crossingLon = southLon + ((northLon - southLon) * fraction)
-                        crossingDeg, crossingMin, crossingSec = self.decdeg2dms(crossingLon)
-
-                        # Calculate the Great Circle Distance between the two points
-                        distance = self.greatCircleDistanceHaversine(southLat, southLon, northLat, northLon)
-
-                        # Calculate the time of the crossing - by speed
-                        timeDelta = northDT - southDT
-                        deltaSpeedPerSecond = (northSpeed - southSpeed)  / timeDelta.total_seconds()
-                        fractionalDistance = fraction * distance
-
-                        distanceTravelled = 0.
-                        speedNow = southSpeed
-                        timeOfCrossingBySpeed = southDT
-                        
-                        while distanceTravelled < fractionalDistance:
-                            distanceTravelled += speedNow / 3600. # Knots -> Nautical Miles per second
-                            timeOfCrossingBySpeed += timedelta(seconds=1) # Add 1 second
-                            speedNow += deltaSpeedPerSecond
-
-                        print("-----------------------------------------------------------------")
-                        print("Vessel                    : " + str(vessel))
-                        print("Arctic Circle             : {:.5f} ({:02.0f}° {:02.0f}\' {:02.1f}\")" \
-                              .format(self.ArcticCircleLatitude, self.ArcticCircleDeg, self.ArcticCircleMin, self.ArcticCircleSec))
-                        print("Latitude (South)          : {:.5f} at {} (UTC)" \
-                              .format(southLat, southDT.strftime('%Y-%m-%d %H:%M:%S')))
-                        print("Latitude (North)          : {:.5f} at {} (UTC)" \
-                              .format(northLat, northDT.strftime('%Y-%m-%d %H:%M:%S')))
-                        print("Longitude of crossing     : {:.5f} ({:02.0f}° {:02.0f}\' {:02.1f}\")" \
-                              .format(crossingLon, crossingDeg, crossingMin, crossingSec))
-                        print("Crossing time by Latitude : {} ({})" \
-                              .format(timeOfCrossingByLat.replace(tzinfo=pytz.timezone('UTC')) \
-                                      .astimezone(pytz.timezone(self.timezone)).strftime('%Y-%m-%d %H:%M:%S'), self.timezone))
-                        print("Crossing time by speed    : {} ({})" \
-                              .format(timeOfCrossingBySpeed.replace(tzinfo=pytz.timezone('UTC')) \
-                                      .astimezone(pytz.timezone(self.timezone)).strftime('%Y-%m-%d %H:%M:%S'), self.timezone))
-
-                        latSouthOfCircle = -90. # Reset
+        for vessel in self.vessels.keys():
+            print(vessel + " : " + self.vessels[vessel])
+
+        for vessel in self.vessels.keys():
+            for crossing in self.crossings:
+                if str(crossing['IMO']) == vessel:
+                    self.printCrossing(crossing)
 
             print("-----------------------------------------------------------------")
             
@@ -161,6 +253,10 @@ if __name__ == '__main__':
 
     # Alongside the Polar Circle Globe on Vikingen Island
     crossings.setArcticCircleDegMinSec(66., 31., 57.7)
+
+    # Use the intermediate sample, so the speed profile covers the distance between the entries
+    #crossings.setSpeedProfile(PiecewiseSpeedProfile)
+
     crossings.extractCrossings()
 
     # Historical value: 66 degrees 33 minutes
@@ -171,3 +267,6 @@ if __name__ == '__main__':
     # https://en.wikipedia.org/wiki/Arctic_Circle
     #crossings.setArcticCircleDegMinSec(66., 33., 50.2)
     #crossings.extractCrossings()
+
+    # Or find the crossings of all three in one pass
+    #crossings.extractCrossings([crossings.dms2decdeg(66., 31., 57.7), crossings.dms2decdeg(66., 33., 0.), crossings.dms2decdeg(66., 33., 50.2)])
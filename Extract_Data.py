@@ -9,12 +9,23 @@
 # It calculates the total distance travelled (CUMULATIVE_NM)
 # and the distance remaining (REMAINING_NM).
 # The extracted data is saved to a new pickle file.
+#
+# extractVoyages extracts many windows (e.g. the voyages found by Voyage_Segmenter.py) in one
+# batch: the store and its index are opened once and the distances for every window are
+# calculated in one call. Each voyage is saved to its own pickle file.
+#
+# With setCache, the tracks (without CIRCLE_NM) are cached, keyed on the window and its records,
+# so extracting the same window for a different Arctic Circle latitude only calculates CIRCLE_NM.
 
-from datetime import datetime, timedelta
 import pickle
-import pytz
-from haversine import haversine, Unit
-import copy
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
+from Timestamps import localToEpoch, localDatetimes, epochToLocal
+from Geodesy import haversineNM, trackDistancesNM
+from Artifact_Cache import recordsHash
+from Instrumentation import instrumentation
+import numpy as np # pip install numpy
+import os
 
 class ExtractData():
     def __init__(self):
@@ -27,6 +38,7 @@ class ExtractData():
         self.start = ''
         self.end = ''
         self.circleDistance = 0.0
+        self.cache = None # An ArtifactCache (see Artifact_Cache.py). None : no caching
 
     def setInputPickleFilename(self, filename):
         self.inputPickleFile = filename
@@ -61,7 +73,7 @@ class ExtractData():
         self.ArcticCircleLatitude = self.ArcticCircleDeg + (self.ArcticCircleMin / 60.) + (self.ArcticCircleSec / 3600.)
 
     def greatCircleDistanceHaversine(self, lat1, lon1, lat2, lon2):
-        return haversine((lat1, lon1), (lat2, lon2), unit=Unit.NAUTICAL_MILES)
+        return float(haversineNM(lat1, lon1, lat2, lon2))
 
     def findCrossing(self):
         # Find entries either side of the Arctic Circle latitude
@@ -94,87 +106,133 @@ class ExtractData():
 
                 return
 
-    def extractDataForVessel(self):
-        # Load the pickle file
-        pkl = None
-        with open(self.inputPickleFile, 'rb') as f:
-            pkl = pickle.load(f)
-
-        self.pickleJar = {}
-
-        previousEntry = None
-        cumulativeNM = 0.0
-
-        start = pytz.timezone(self.TZ).localize(datetime.strptime(self.start, "%Y-%m-%d %H:%M:%S"))
-        end = pytz.timezone(self.TZ).localize(datetime.strptime(self.end, "%Y-%m-%d %H:%M:%S"))
-
-        for entry in pkl:
-            if entry['IMO'] == self.vessel: # Match the vessel
-
-                if previousEntry is not None and entry['TIMESTAMP'] != previousEntry['TIMESTAMP']: # Remove duplicates
-
-                    DT = pytz.timezone('UTC').localize(datetime.strptime(entry['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-                    DTlocal = DT.replace(tzinfo=pytz.timezone('UTC')).astimezone(pytz.timezone(self.TZ))
-
-                    if DTlocal >= start and DTlocal <= end: # If in window
-
-                        modifiedEntry = copy.deepcopy(entry)
-
-                        if previousEntry is not None:
-                            # Calculate the Great Circle Distance between the two points
-                            distance = self.greatCircleDistanceHaversine( \
-                                previousEntry['LATITUDE'], previousEntry['LONGITUDE'], \
-                                entry['LATITUDE'], entry['LONGITUDE'])
-                            cumulativeNM += distance
-                            modifiedEntry['CUMULATIVE_NM'] = cumulativeNM
-                            # Calculate the speed based on distance travelled
-                            previousDT = pytz.timezone('UTC').localize(datetime.strptime(previousEntry['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-                            timeDelta = DT - previousDT
-                            interval = timeDelta.total_seconds()
-                            if interval > 0.0:
-                                modifiedEntry['SPEED_BY_DISTANCE'] = 3600. * distance / interval
-                            else:
-                                modifiedEntry['SPEED_BY_DISTANCE'] = None
-
-                        else:
-                            modifiedEntry['CUMULATIVE_NM'] = 0.0
-                            modifiedEntry['SPEED_BY_DISTANCE'] = None
+    def setCache(self, cache):
+        # Cache the tracks in an ArtifactCache (see Artifact_Cache.py)
+        self.cache = cache
+
+    def extractTracks(self, store, windowOffsets, windows, tz):
+        # Return a pickleJar for each window, with CUMULATIVE_NM, SPEED_BY_DISTANCE and REMAINING_NM (but not CIRCLE_NM)
+        lengths = [len(offsets) for offsets in windowOffsets]
+        firsts = np.cumsum([0] + lengths[:-1]).astype(np.int64) # The first entry of each window
+        offsets = np.concatenate(windowOffsets) if len(windows) > 0 else np.zeros(0, dtype=np.int64)
+        epochs = np.asarray(store.epoch)[offsets]
+
+        # Calculate the Great Circle Distance between each pair of consecutive entries, for all of the windows in one call
+        distances = np.zeros(len(offsets), dtype=np.float64)
+        if len(offsets) > 1:
+            distances[1:] = trackDistancesNM(np.asarray(store.column('LATITUDE'))[offsets], np.asarray(store.column('LONGITUDE'))[offsets])
+
+        # Keep the entries in the windows. Remove duplicates. The first entry of each window is only used for the first distance
+        starts = np.repeat([start for IMO, start, end in windows], lengths)
+        ends = np.repeat([end for IMO, start, end in windows], lengths)
+        keep = np.zeros(len(offsets), dtype=bool)
+        keep[1:] = (epochs[1:] != epochs[:-1]) & (epochs[1:] >= starts[1:]) & (epochs[1:] <= ends[1:])
+        keep[firsts[np.asarray(lengths) > 0]] = False
+
+        # Calculate the speed based on distance travelled
+        intervals = np.zeros(len(offsets), dtype=np.int64)
+        intervals[1:] = epochs[1:] - epochs[:-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            speeds = 3600. * distances / intervals
+
+        # Convert the times to local time in one batch
+        DTs = localDatetimes(epochs, tz)
+
+        pickleJars = []
+        for first, length in zip(firsts.tolist(), lengths):
+            kept = first + np.flatnonzero(keep[first:first + length])
+
+            # The distances are accumulated in order, so the sums are the same as adding them one at a time
+            cumulative = np.cumsum(distances[kept])
+            cumulativeNM = cumulative[-1].item() if len(kept) > 0 else 0.0
+
+            pickleJar = {}
+            for k, cumulativeDistance in zip(kept.tolist(), cumulative.tolist()):
+                # AIS values are immutable. A shallow copy is enough. For a pickle file, record returns the original
+                # dict, so the output pickle is identical to one written from the list of dicts
+                modifiedEntry = dict(store.record(int(offsets[k])))
+                modifiedEntry['CUMULATIVE_NM'] = cumulativeDistance
+                modifiedEntry['SPEED_BY_DISTANCE'] = speeds[k].item() if intervals[k] > 0 else None
+                pickleJar[DTs[k]] = modifiedEntry
+
+            # Now add the remaining distance. The entries are updated in place
+            for modifiedEntry in pickleJar.values():
+                modifiedEntry['REMAINING_NM'] = cumulativeNM - modifiedEntry['CUMULATIVE_NM']
+
+            pickleJars.append(pickleJar)
+
+        return pickleJars
+
+    def extractWindows(self, windows, tz):
+        # Extract the entries for each window: (IMO, start epoch, end epoch). Returns a pickleJar for each,
+        # keyed by local datetimes in tz
+        # Load the pickle file (or columnar track store) and its index
+        store = TrackStore.open(self.inputPickleFile)
+        index = TrackIndex.forStore(store, self.inputPickleFile)
+
+        # Match the vessel and the window. Include the entry before the window for the first distance
+        windowOffsets = [index.query(IMO, start, end, before=1) for IMO, start, end in windows]
+
+        with instrumentation.stage('ExtractData.extractTracks') as stage:
+            if self.cache is None:
+                pickleJars = self.extractTracks(store, windowOffsets, windows, tz)
+            else:
+                # Use the cached tracks. Extract the others in one batch and add them to the cache
+                keys = [self.cache.key('track', {'IMO': int(IMO), 'start': int(start), 'end': int(end), 'tz': tz}, recordsHash(store, offsets)) \
+                        for (IMO, start, end), offsets in zip(windows, windowOffsets)]
+                pickleJars = [self.cache.get(key) for key in keys]
+                missing = [i for i in range(len(windows)) if pickleJars[i] is None]
+                tracks = self.extractTracks(store, [windowOffsets[i] for i in missing], [windows[i] for i in missing], tz)
+                for i, track in zip(missing, tracks):
+                    self.cache.put(keys[i], track)
+                    pickleJars[i] = track
+            stage.count(records=sum(len(pickleJar) for pickleJar in pickleJars))
+
+        for pickleJar in pickleJars:
+            cumulativeNM = pickleJar[next(reversed(pickleJar))]['CUMULATIVE_NM'] if len(pickleJar) > 0 else 0.0
+            print("Total distance travelled (NM): {:.1f}".format(cumulativeNM))
+
+            self.pickleJar = pickleJar
+            self.circleDistance = 0.0
+            with instrumentation.stage('ExtractData.findCrossing'):
+                self.findCrossing()
+
+            # Now add the distance to the Circle. The entries are updated in place
+            for modifiedEntry in self.pickleJar.values():
+                modifiedEntry['CIRCLE_NM'] = self.circleDistance - modifiedEntry['CUMULATIVE_NM']
+
+        return pickleJars
 
-                        self.pickleJar[DTlocal] = modifiedEntry
-
-                previousEntry = copy.deepcopy(entry)
-
-        print("Total distance travelled (NM): {:.1f}".format(cumulativeNM))
-
-        pickleJarCopy = copy.deepcopy(self.pickleJar)
-        self.pickleJar = {}
-
-        for DTlocal in pickleJarCopy.keys():
-            modifiedEntry = copy.deepcopy(pickleJarCopy[DTlocal])
-
-            modifiedEntry['REMAINING_NM'] = cumulativeNM - pickleJarCopy[DTlocal]['CUMULATIVE_NM']
-
-            self.pickleJar[DTlocal] = modifiedEntry
-
-        self.findCrossing() 
-
-        pickleJarCopy = copy.deepcopy(self.pickleJar)
-        self.pickleJar = {}
-
-        for DTlocal in pickleJarCopy.keys():
-            modifiedEntry = copy.deepcopy(pickleJarCopy[DTlocal])
-
-            modifiedEntry['REMAINING_NM'] = cumulativeNM - pickleJarCopy[DTlocal]['CUMULATIVE_NM']
-
-            modifiedEntry['CIRCLE_NM'] = self.circleDistance - pickleJarCopy[DTlocal]['CUMULATIVE_NM']
+    def extractDataForVessel(self):
+        start = localToEpoch(self.TZ, self.start)
+        end = localToEpoch(self.TZ, self.end)
 
-            self.pickleJar[DTlocal] = modifiedEntry
+        self.pickleJar = self.extractWindows([(self.vessel, start, end)], self.TZ)[0]
 
         # Now write the list to a pickle file
         if self.outputPickleFile is None:
-            self.outputPickleFile = self.inputPickleFile.split('.')[0] + '_' + str(self.vessel) + '.' + self.inputPickleFile.split('.')[1]
-        with open(self.outputPickleFile, 'wb') as f:
+            self.outputPickleFile = os.path.splitext(self.inputPickleFile)[0] + '_' + str(self.vessel) + '.pkl'
+        with instrumentation.stage('ExtractData.write') as stage, open(self.outputPickleFile, 'wb') as f:
             pickle.dump(self.pickleJar, f)
+            stage.count(records=len(self.pickleJar), bytesWritten=f.tell())
+
+    def voyageFilename(self, voyage, tz):
+        # e.g. Track_Vessel_9107796_2024-11-23_06-17-42.pkl for a voyage starting at 06:17:42 local time
+        # The voyages of a vessel never start in the same second, so the filenames are unique
+        return os.path.splitext(self.inputPickleFile)[0] + '_' + str(voyage['IMO']) + '_' + \
+            epochToLocal(voyage['startEpoch'], tz).strftime('%Y-%m-%d_%H-%M-%S') + '.pkl'
+
+    def extractVoyages(self, voyages, tz='UTC'):
+        # Extract and save each voyage (see Voyage_Segmenter.py) in one batch. Returns the filenames
+        pickleJars = self.extractWindows([(voyage['IMO'], voyage['startEpoch'], voyage['endEpoch']) for voyage in voyages], tz)
+        filenames = []
+        for voyage, pickleJar in zip(voyages, pickleJars):
+            filename = self.voyageFilename(voyage, tz)
+            with instrumentation.stage('ExtractData.write') as stage, open(filename, 'wb') as f:
+                pickle.dump(pickleJar, f)
+                stage.count(records=len(pickleJar), bytesWritten=f.tell())
+            filenames.append(filename)
+        return filenames
             
 
 if __name__ == '__main__':
@@ -6,11 +6,23 @@
 #
 # This code will open the pickle file created by Collate.py and convert the vessel
 # position data into a KML file for Google Earth
+#
+# The Points and LineString files are written in a single pass, as a stream (see KML_Writer.py),
+# optionally as compressed KMZ and simplified with Douglas-Peucker (see Simplify.py).
+# The points either side of the Arctic Circle are always kept.
+# generateFleet writes all of the vessels to one pair of files, with a folder for each vessel.
+#
+# With setCache, the files written by generate are cached (see Artifact_Cache.py), keyed on the
+# settings and the entries in the window, and copied from the cache when nothing has changed.
 
-from datetime import datetime
-import pickle
-import simplekml # pip install simplekml
-import pytz
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
+from Timestamps import localToEpoch
+from KML_Writer import KMLWriter
+from Simplify import TrackSimplifier, crossingIndexes
+from Artifact_Cache import recordsHash
+from Instrumentation import instrumentation, pathBytes
+import numpy as np # pip install numpy
 
 class GenerateKML():
     def __init__(self):
@@ -19,6 +31,13 @@ class GenerateKML():
         self.tz = ''
         self.start = ''
         self.end = ''
+        self.kmz = False
+        self.simplifyTolerance = 0.0 # Nautical Miles. 0 : keep every point
+        self.simplifier = TrackSimplifier() # Caches the simplified tracks
+        self.ArcticCircleLatitude = 66. + (33. / 60.) # Historical value: 66 degrees 33 minutes
+        self.chunkSize = 10000 # Entries written at a time
+        self.outputPrefix = None # None : name the files after the vessel (or fleet)
+        self.cache = None # An ArtifactCache (see Artifact_Cache.py). None : no caching
 
     def setPickleFilename(self, filename):
         self.pickleFile = filename
@@ -31,34 +50,152 @@ class GenerateKML():
         self.start = start
         self.end = end
 
+    def setKMZ(self, kmz):
+        # Write compressed .kmz files instead of .kml
+        self.kmz = kmz
+
+    def setSimplifyTolerance(self, nm):
+        # Simplify the tracks with Douglas-Peucker (see Simplify.py), keeping them within nm of the original
+        self.simplifyTolerance = nm
+
+    def setArcticCircleLatitude(self, lat):
+        # The points either side of a crossing of this latitude are kept when the track is simplified
+        self.ArcticCircleLatitude = lat
+
+    def setArcticCircleDegMinSec(self, deg, min, sec):
+        self.ArcticCircleLatitude = deg + (min / 60.) + (sec / 3600.)
+
+    def setChunkSize(self, chunkSize):
+        self.chunkSize = chunkSize
+
+    def setCache(self, cache):
+        self.cache = cache
+
+    def setOutputPrefix(self, prefix):
+        # e.g. 'Pipeline/9107796/9107796_2024-11-23_06-15' writes Pipeline/9107796/9107796_2024-11-23_06-15_Points.kml
+        self.outputPrefix = prefix
+
+    def outputFilename(self, name, kind):
+        if self.outputPrefix is not None:
+            name = self.outputPrefix
+        return str(name) + "_" + kind + (".kmz" if self.kmz else ".kml")
+
+    def selectEntries(self, store, index, IMO, latitudes, longitudes):
+        # Return the offsets of the vessel's entries in the time window (all of its entries if there is no window)
+        start = None
+        end = None
+        if self.tz != '':
+            start = localToEpoch(self.tz, self.start)
+            end = localToEpoch(self.tz, self.end)
+        offsets = index.query(IMO, start, end)
+        if self.simplifyTolerance > 0.0 and len(offsets) > 2:
+            lats = latitudes[offsets]
+            keep = crossingIndexes(lats, self.ArcticCircleLatitude) # Keep the points either side of the Circle
+            offsets = offsets[self.simplifier.simplifyTrack(lats, longitudes[offsets], self.simplifyTolerance, keep)]
+        return offsets
+
+    def writeEntries(self, store, offsets, latitudes, longitudes, points, lineString):
+        # Write the Points and the LineString coordinates together, a chunk at a time
+        for i in range(0, len(offsets), self.chunkSize):
+            chunk = offsets[i:i + self.chunkSize]
+            lons = longitudes[chunk].tolist()
+            lats = latitudes[chunk].tolist()
+            points.writePoints([store.value('TIMESTAMP', offset) for offset in chunk.tolist()], lons, lats)
+            lineString.addCoordinates(lons, lats)
+
     def generate(self):
-        # Load the pickle file
-        pkl = None
-        with open(self.pickleFile, 'rb') as f:
-            pkl = pickle.load(f)
+        if self.cache is None:
+            self.writeFiles()
+            return
+
+        # Copy the files from the cache if the settings and the entries in the window are unchanged
+        store = TrackStore.open(self.pickleFile)
+        index = TrackIndex.forStore(store, self.pickleFile)
+        window = [None, None]
+        if self.tz != '':
+            window = [localToEpoch(self.tz, self.start), localToEpoch(self.tz, self.end)]
+        params = {
+            'vessel': int(self.vessel),
+            'window': [self.tz, self.start, self.end],
+            'kmz': self.kmz,
+            'simplifyTolerance': self.simplifyTolerance,
+            'ArcticCircleLatitude': self.ArcticCircleLatitude if self.simplifyTolerance > 0.0 else None # Only used when simplifying
+        }
+        key = self.cache.key('kml', params, recordsHash(store, index.query(self.vessel, window[0], window[1]), ['TIMESTAMP', 'LATITUDE', 'LONGITUDE']))
+        filenames = [self.outputFilename(self.vessel, "Points"), self.outputFilename(self.vessel, "LineString")]
+        files = self.cache.get(key)
+        if files is None:
+            self.writeFiles(store, index)
+            files = []
+            for filename in filenames:
+                with open(filename, 'rb') as f:
+                    files.append(f.read())
+            self.cache.put(key, files)
+            return
+        for filename, contents in zip(filenames, files):
+            with open(filename, 'wb') as f:
+                f.write(contents)
+
+    def writeFiles(self, store=None, index=None):
+        # Load the pickle file (or columnar track store)
+        if store is None:
+            store = TrackStore.open(self.pickleFile)
+            index = TrackIndex.forStore(store, self.pickleFile)
+        latitudes = np.asarray(store.column('LATITUDE'))
+        longitudes = np.asarray(store.column('LONGITUDE'))
 
         # Search for entries which match the vessel and time window
-        kml = simplekml.Kml()
-        coords = [] # Store all the coords for the Line String
-        start = pytz.timezone(self.tz).localize(datetime.strptime(self.start, "%Y-%m-%d %H:%M:%S"))
-        end = pytz.timezone(self.tz).localize(datetime.strptime(self.end, "%Y-%m-%d %H:%M:%S"))
-        for entry in pkl:
-            if entry['IMO'] == self.vessel:
-                entryTime = pytz.timezone('UTC').localize(datetime.strptime(entry['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-                if entryTime >= start and entryTime <= end:
-                    kml.newpoint(name=entry['TIMESTAMP'], coords=[(entry['LONGITUDE'], entry['LATITUDE'])])
-                    coords.append((entry['LONGITUDE'], entry['LATITUDE']))
-
-        # Save the Points KML file
-        filename = str(self.vessel) + "_Points.kml"
-        kml.save(filename)
-
-        # Create the LineString KML file
-        kml = simplekml.Kml()
-        name = "IMO " + str(self.vessel) + " " + self.tz + " " + self.start + " " + self.end
-        kml.newlinestring(name=name , coords=coords)
-        filename = str(self.vessel) + "_LineString.kml"
-        kml.save(filename)
+        with instrumentation.stage('GenerateKML.selectEntries') as stage:
+            offsets = self.selectEntries(store, index, self.vessel, latitudes, longitudes)
+            stage.count(records=len(offsets))
+
+        # Write the Points and LineString KML files in one pass.
+        # Number the LineString file's elements after the Points, as simplekml would
+        # (simplekml also gives each file a hidden root element, which uses an id)
+        with instrumentation.stage('GenerateKML.write') as stage:
+            points = KMLWriter(self.outputFilename(self.vessel, "Points"))
+            lineString = KMLWriter(self.outputFilename(self.vessel, "LineString"), firstId=(2 * len(offsets)) + 3)
+            points.open()
+            lineString.open()
+            name = "IMO " + str(self.vessel) + " " + self.tz + " " + self.start + " " + self.end
+            lineString.startLineString(name)
+            self.writeEntries(store, offsets, latitudes, longitudes, points, lineString)
+            lineString.endLineString()
+            points.close()
+            lineString.close()
+            stage.count(records=len(offsets))
+            if instrumentation.enabled:
+                stage.count(bytesWritten=pathBytes(self.outputFilename(self.vessel, "Points")) + \
+                            pathBytes(self.outputFilename(self.vessel, "LineString")))
+
+    def generateFleet(self, name='Fleet', vessels=None):
+        # Write the Points and LineStrings for all vessels (or the listed IMOs) to one pair of files,
+        # with a folder for each vessel
+        store = TrackStore.open(self.pickleFile)
+        index = TrackIndex.forStore(store, self.pickleFile)
+        latitudes = np.asarray(store.column('LATITUDE'))
+        longitudes = np.asarray(store.column('LONGITUDE'))
+        if vessels is None:
+            vessels = index.vessels()
+
+        points = KMLWriter(self.outputFilename(name, "Points"))
+        lineString = KMLWriter(self.outputFilename(name, "LineString"))
+        points.open()
+        lineString.open()
+        for IMO in vessels:
+            offsets = self.selectEntries(store, index, IMO, latitudes, longitudes)
+            if len(offsets) == 0:
+                continue
+            folder = "IMO " + str(IMO) + " " + str(store.value('NAME', int(offsets[0])))
+            points.startFolder(folder)
+            lineString.startFolder(folder)
+            lineString.startLineString(folder + " " + self.tz + " " + self.start + " " + self.end)
+            self.writeEntries(store, offsets, latitudes, longitudes, points, lineString)
+            lineString.endLineString()
+            points.endFolder()
+            lineString.endFolder()
+        points.close()
+        lineString.close()
             
 if __name__ == '__main__':
 
@@ -76,4 +213,9 @@ if __name__ == '__main__':
     #generate.setWindow('Europe/Oslo', '2024-11-23 06:00:00', '2024-11-23 10:10:00')
     generate.setWindow('Europe/Oslo', '2024-12-04 06:00:00', '2024-12-04 10:10:00')
 
-    generate.generate()
\ No newline at end of file
+    generate.generate()
+
+    # Or export all the vessels, simplified to within 0.01 NM, as KMZ
+    #generate.setKMZ(True)
+    #generate.setSimplifyTolerance(0.01)
+    #generate.generateFleet()
\ No newline at end of file
@@ -0,0 +1,78 @@
+# Geodesy.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code calculates Great Circle Distances for all of the modules, using NumPy so that
+# the distances between all of the consecutive entries of a track are calculated in one call.
+#
+# haversineNM uses the haversine formula on a sphere with the mean radius of the Earth. It is the
+# same calculation as the haversine package (haversine(..., unit=Unit.NAUTICAL_MILES)).
+# Unlike the spherical law of cosines, it stays accurate for points which are very close together.
+# vincentyNM uses Vincenty's formula on the WGS-84 ellipsoid, which is more accurate (to better
+# than a millimetre) but slower. It falls back to haversineNM for nearly antipodal points.
+
+import numpy as np # pip install numpy
+
+earthRadiusNM = 6371.0088 * 0.539956803 # The mean radius of the Earth (6371.0088 km) in Nautical Miles
+
+# WGS-84
+ellipsoidMajorNM = 6378137.0 / 1852.
+ellipsoidFlattening = 1. / 298.257223563
+ellipsoidMinorNM = ellipsoidMajorNM * (1. - ellipsoidFlattening)
+
+def haversineNM(lat1, lon1, lat2, lon2):
+    # The Great Circle Distance (NM). The arguments (degrees) can be floats or NumPy arrays
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
+    lat = lat2 - lat1
+    lon = lon2 - lon1
+    d = (np.sin(lat * 0.5) ** 2) + (np.cos(lat1) * np.cos(lat2) * (np.sin(lon * 0.5) ** 2))
+    return earthRadiusNM * (2 * np.arcsin(np.sqrt(d)))
+
+def vincentyNM(lat1, lon1, lat2, lon2, maxIterations=200, tolerance=1e-12):
+    # The distance (NM) on the WGS-84 ellipsoid. The arguments (degrees) can be floats or NumPy arrays
+    # https://en.wikipedia.org/wiki/Vincenty%27s_formulae
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*[np.asarray(x, dtype=np.float64) for x in [lat1, lon1, lat2, lon2]])
+    a, b, f = ellipsoidMajorNM, ellipsoidMinorNM, ellipsoidFlattening
+    U1 = np.arctan((1. - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1. - f) * np.tan(np.radians(lat2)))
+    L = np.radians(lon2 - lon1)
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for iteration in range(maxIterations):
+            sinLam, cosLam = np.sin(lam), np.cos(lam)
+            sinSigma = np.sqrt(((cosU2 * sinLam) ** 2) + (((cosU1 * sinU2) - (sinU1 * cosU2 * cosLam)) ** 2))
+            cosSigma = (sinU1 * sinU2) + (cosU1 * cosU2 * cosLam)
+            sigma = np.arctan2(sinSigma, cosSigma)
+            sinAlpha = np.where(sinSigma == 0., 0., cosU1 * cosU2 * sinLam / sinSigma)
+            cos2Alpha = 1. - (sinAlpha ** 2)
+            cos2SigmaM = np.where(cos2Alpha == 0., 0., cosSigma - (2. * sinU1 * sinU2 / cos2Alpha)) # Equatorial lines
+            C = f / 16. * cos2Alpha * (4. + (f * (4. - (3. * cos2Alpha))))
+            previous = lam
+            lam = L + ((1. - C) * f * sinAlpha * (sigma + (C * sinSigma * (cos2SigmaM + (C * cosSigma * (-1. + (2. * (cos2SigmaM ** 2))))))))
+            converged = np.abs(lam - previous) < tolerance
+            if np.all(converged):
+                break
+
+        u2 = cos2Alpha * ((a * a) - (b * b)) / (b * b)
+        A = 1. + (u2 / 16384. * (4096. + (u2 * (-768. + (u2 * (320. - (175. * u2)))))))
+        B = u2 / 1024. * (256. + (u2 * (-128. + (u2 * (74. - (47. * u2))))))
+        deltaSigma = B * sinSigma * (cos2SigmaM + (B / 4. * ((cosSigma * (-1. + (2. * (cos2SigmaM ** 2)))) - \
+                     (B / 6. * cos2SigmaM * (-3. + (4. * (sinSigma ** 2))) * (-3. + (4. * (cos2SigmaM ** 2)))))))
+        distance = b * A * (sigma - deltaSigma)
+
+    # Vincenty's formula doesn't converge for nearly antipodal points
+    return np.where(converged & np.isfinite(distance), distance, haversineNM(lat1, lon1, lat2, lon2))
+
+def trackDistancesNM(lat, lon, formula=haversineNM):
+    # The distances (NM) between consecutive entries of a track. One shorter than lat and lon
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return formula(lat[:-1], lon[:-1], lat[1:], lon[1:])
@@ -0,0 +1,234 @@
+# Instrumentation.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code records where the time goes in a run: the time spent in each stage of each class,
+# the number of records processed and the bytes read and written. It is shared by Collate,
+# ExtractData, ExtractCrossings, GenerateKML, PlotData, PredictCrossing and Tracker:
+#
+#   with instrumentation.stage('Collate.readFiles') as stage:
+#       vesselData = self.parseFiles(sortedFiles)
+#       stage.count(records=len(vesselData))
+#
+# It is off by default. When it is off, stage returns the same do-nothing object every time,
+# so the cost is one method call per stage (the stages are whole passes, not single entries).
+# Anything which costs extra to measure (e.g. the size of a file) is only measured if enabled.
+#
+# setProfile runs cProfile for the whole run, so the report also lists the functions which
+# took the most time (e.g. json.loads, strptime, pickle.dump, haversineNM).
+# setTraceMemory runs tracemalloc and reports the peak memory allocated.
+# Stages which run in worker processes are only recorded if the worker returns its stages
+# (see Run_Pipeline.py), which are then added with merge.
+#
+# writeReport writes the report as JSON (Instrumentation_Report.json by default).
+
+from datetime import datetime
+from time import perf_counter
+import cProfile
+import json
+import os
+import pstats
+import tracemalloc
+import pytz # pip install pytz
+
+class Stage():
+    # Times one stage. Used by Instrumentation.stage when enabled
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.records = 0
+        self.bytesRead = 0
+        self.bytesWritten = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.instrumentation.addStage(self.name, perf_counter() - self.start, self.records, self.bytesRead, self.bytesWritten)
+        return False
+
+    def count(self, records=0, bytesRead=0, bytesWritten=0):
+        self.records += records
+        self.bytesRead += bytesRead
+        self.bytesWritten += bytesWritten
+
+class NoStage():
+    # Does nothing. Used by Instrumentation.stage when disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+    def count(self, records=0, bytesRead=0, bytesWritten=0):
+        pass
+
+noStage = NoStage()
+
+def pathBytes(path):
+    # The size of a file, or of all of the files in a directory (e.g. a columnar track store)
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return 0
+
+class Instrumentation():
+    def __init__(self):
+        self.enabled = False
+        self.profile = False
+        self.traceMemory = False
+        self.profileFunctions = 20 # The number of functions listed in the report
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.startTime = None
+        self.start = None
+        self.seconds = None
+        self.profiler = None
+        self.peakBytes = None
+        self.functions = []
+
+    def setEnabled(self, enabled):
+        self.enabled = enabled
+
+    def setProfile(self, profile):
+        # Also run cProfile between startRun and stopRun
+        self.profile = profile
+
+    def setTraceMemory(self, traceMemory):
+        # Also run tracemalloc between startRun and stopRun
+        self.traceMemory = traceMemory
+
+    def setProfileFunctions(self, functions):
+        self.profileFunctions = functions
+
+    def stage(self, name):
+        if not self.enabled:
+            return noStage
+        return Stage(self, name)
+
+    def addStage(self, name, seconds, records=0, bytesRead=0, bytesWritten=0, calls=1):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = {'calls': 0, 'seconds': 0.0, 'records': 0, 'bytesRead': 0, 'bytesWritten': 0}
+            self.stages[name] = stage
+        stage['calls'] += calls
+        stage['seconds'] += seconds
+        stage['records'] += records
+        stage['bytesRead'] += bytesRead
+        stage['bytesWritten'] += bytesWritten
+
+    def merge(self, stages):
+        # Add the stages recorded by another process
+        for name, stage in stages.items():
+            self.addStage(name, stage['seconds'], stage['records'], stage['bytesRead'], stage['bytesWritten'], stage['calls'])
+
+    def startRun(self):
+        # Enable the instrumentation and start cProfile and tracemalloc (if selected)
+        self.reset()
+        self.enabled = True
+        self.startTime = datetime.now(pytz.UTC)
+        self.start = perf_counter()
+        if self.traceMemory:
+            tracemalloc.start()
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stopRun(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True) # By time in the function itself
+            self.functions = []
+            for (filename, line, function), (primitiveCalls, calls, ownSeconds, cumulativeSeconds, callers) in functions[:self.profileFunctions]:
+                self.functions.append({
+                    'function': function,
+                    'file': os.path.basename(filename),
+                    'line': line,
+                    'calls': calls,
+                    'seconds': ownSeconds,
+                    'cumulativeSeconds': cumulativeSeconds
+                })
+            self.profiler = None
+        if self.traceMemory and tracemalloc.is_tracing():
+            current, self.peakBytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        if self.start is not None:
+            self.seconds = perf_counter() - self.start
+
+    def report(self):
+        return {
+            'started': None if self.startTime is None else self.startTime.strftime('%Y-%m-%d %H:%M:%S UTC'),
+            'seconds': self.seconds,
+            'peakBytes': self.peakBytes,
+            'stages': self.stages,
+            'functions': self.functions
+        }
+
+    def writeReport(self, filename='Instrumentation_Report.json'):
+        with open(filename, 'w') as f:
+            f.write(json.dumps(self.report(), indent=1))
+
+    def printReport(self):
+        print("{:<32} : {:>6} : {:>9} : {:>9} : {:>10} : {:>10}".format("Stage", "Calls", "Seconds", "Records", "Read (KB)", "Written (KB)"))
+        for name, stage in sorted(self.stages.items(), key=lambda item: item[1]['seconds'], reverse=True):
+            print("{:<32} : {:>6} : {:9.3f} : {:>9} : {:10.1f} : {:10.1f}".format(name, stage['calls'], stage['seconds'], \
+                  stage['records'], stage['bytesRead'] / 1024., stage['bytesWritten'] / 1024.))
+        if len(self.functions) > 0:
+            print("{:<32} : {:>6} : {:>9} : {}".format("Function", "Calls", "Seconds", "File:line"))
+        for function in self.functions:
+            print("{:<32} : {:>6} : {:9.3f} : {}:{}".format(function['function'][:32], function['calls'], function['seconds'], \
+                  function['file'], function['line']))
+        if self.peakBytes is not None:
+            print("{:<32} : {:.1f} MB".format("Peak memory", self.peakBytes / (1024. * 1024.)))
+        if self.seconds is not None:
+            print("{:<32} : {:.3f}s".format("Total", self.seconds))
+
+# The instrumentation shared by all of the classes
+instrumentation = Instrumentation()
+
+if __name__ == '__main__':
+
+    # Use the instrumentation imported by the classes, not a second copy in __main__
+    from Instrumentation import instrumentation
+    from Collate import Collate
+    from Extract_Data import ExtractData
+    from Extract_Crossings import ExtractCrossings
+    from Generate_KML import GenerateKML
+
+    instrumentation.setProfile(True)
+    instrumentation.setTraceMemory(True)
+    instrumentation.startRun()
+
+    collate = Collate()
+    collate.setFilename('Track_Vessel_Instrumented.pkl')
+    collate.collate()
+
+    extractData = ExtractData()
+    extractData.setInputPickleFilename('Track_Vessel_Instrumented.pkl')
+    extractData.setOutputPickleFilename('Track_Vessel_9107796_Instrumented.pkl')
+    extractData.setVessel(9107796) # MS Polarlys
+    extractData.setArcticCircleDegMinSec(66., 31., 57.7)
+    extractData.setWindow('Europe/Oslo', '2024-11-23 06:05:00', '2024-11-23 10:10:00')
+    extractData.extractDataForVessel()
+
+    crossings = ExtractCrossings()
+    crossings.setPickleFilename('Track_Vessel_Instrumented.pkl')
+    crossings.findCrossings()
+
+    generate = GenerateKML()
+    generate.setPickleFilename('Track_Vessel_Instrumented.pkl')
+    generate.setVessel(9107796)
+    generate.setWindow('Europe/Oslo', '2024-11-23 06:05:00', '2024-11-23 10:10:00')
+    generate.setOutputPrefix('9107796_Instrumented')
+    generate.generate()
+
+    instrumentation.stopRun()
+    instrumentation.printReport()
+    instrumentation.writeReport()
@@ -0,0 +1,113 @@
+# KML_Writer.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code writes KML (or compressed KMZ) files for Google Earth as a stream: each Point,
+# Folder and LineString coordinate is written as soon as it is known, so the memory used
+# does not grow with the size of the file. The layout is the same as simplekml's
+# (4 space indentation, an id on each element), so the files look the same in Google Earth.
+#
+# A .kmz file is a zip file containing a single doc.kml. It is compressed as it is written.
+
+from xml.sax.saxutils import escape
+import zipfile
+import io
+
+class KMLWriter():
+    def __init__(self, filename, firstId=1):
+        self.filename = filename
+        self.nextId = firstId # The id of the next element
+        self.depth = 0 # The indentation level
+        self.coordinates = 0 # The number of coordinates written to the current LineString
+        self.zip = None
+        self.file = None
+
+    def newId(self):
+        newId = self.nextId
+        self.nextId += 1
+        return newId
+
+    def write(self, text):
+        self.file.write(text)
+
+    def writeLine(self, text):
+        self.file.write(("    " * self.depth) + text + "\n")
+
+    def open(self):
+        if self.filename.lower().endswith('.kmz'):
+            self.zip = zipfile.ZipFile(self.filename, 'w', compression=zipfile.ZIP_DEFLATED)
+            self.file = io.TextIOWrapper(self.zip.open('doc.kml', 'w'), encoding='utf-8', newline='\n')
+        else:
+            self.file = open(self.filename, 'w', encoding='utf-8', newline='\n')
+        self.writeLine('<?xml version="1.0" encoding="UTF-8"?>')
+        self.writeLine('<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">')
+        self.depth += 1
+        self.writeLine('<Document id="{}">'.format(self.newId()))
+        self.depth += 1
+
+    def startFolder(self, name):
+        self.writeLine('<Folder id="{}">'.format(self.newId()))
+        self.depth += 1
+        self.writeLine('<name>{}</name>'.format(escape(name)))
+
+    def endFolder(self):
+        self.depth -= 1
+        self.writeLine('</Folder>')
+
+    def writePoint(self, name, lon, lat):
+        # simplekml numbers the Point before its Placemark
+        pointId = self.newId()
+        self.writeLine('<Placemark id="{}">'.format(self.newId()))
+        self.depth += 1
+        self.writeLine('<name>{}</name>'.format(escape(name)))
+        self.writeLine('<Point id="{}">'.format(pointId))
+        self.depth += 1
+        self.writeLine('<coordinates>{},{},0.0</coordinates>'.format(lon, lat))
+        self.depth -= 1
+        self.writeLine('</Point>')
+        self.depth -= 1
+        self.writeLine('</Placemark>')
+
+    def writePoints(self, names, lons, lats):
+        for name, lon, lat in zip(names, lons, lats):
+            self.writePoint(name, lon, lat)
+
+    def startLineString(self, name):
+        lineStringId = self.newId()
+        self.writeLine('<Placemark id="{}">'.format(self.newId()))
+        self.depth += 1
+        self.writeLine('<name>{}</name>'.format(escape(name)))
+        self.writeLine('<LineString id="{}">'.format(lineStringId))
+        self.depth += 1
+        self.write(("    " * self.depth) + '<coordinates>')
+        self.coordinates = 0
+
+    def addCoordinates(self, lons, lats):
+        # Add coordinates to the current LineString. lons and lats are lists of floats
+        text = ' '.join('{},{},0.0'.format(lon, lat) for lon, lat in zip(lons, lats))
+        if len(text) == 0:
+            return
+        if self.coordinates > 0:
+            self.write(' ')
+        self.write(text)
+        self.coordinates += len(lons)
+
+    def endLineString(self):
+        self.write('</coordinates>\n')
+        self.depth -= 1
+        self.writeLine('</LineString>')
+        self.depth -= 1
+        self.writeLine('</Placemark>')
+
+    def close(self):
+        self.depth -= 1
+        self.writeLine('</Document>')
+        self.depth -= 1
+        self.writeLine('</kml>')
+        self.file.close()
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+        self.file = None
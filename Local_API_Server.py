@@ -0,0 +1,134 @@
+# Local_API_Server.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code runs a local stand-in for the VesselFinder VESSELS API, so the trackers can be
+# tested without using API credits. It serves the AIS entries from the archived
+# Track_Vessel_UTC_*.json files: each request returns the next entry for each requested IMO.
+# A response delay and a failure rate can be set to exercise timeouts and retries.
+#
+# The server uses HTTP/1.1 with Content-Length, so clients can reuse their connection.
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from time import sleep
+import threading
+import random
+import json
+from Collate import Collate
+
+class LocalAPIServer():
+    def __init__(self):
+        self.host = '127.0.0.1'
+        self.port = 8080
+        self.directory = '.'
+        self.delay = 0.0
+        self.failureRate = 0.0
+        self.random = random.Random(0)
+        self.entries = {} # IMO : list of AIS entries in time order
+        self.positions = {} # IMO : index of the next entry to serve
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def setHost(self, host):
+        self.host = host
+
+    def setPort(self, port):
+        self.port = port # 0 selects a free port
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setDelay(self, seconds):
+        self.delay = seconds
+
+    def setFailureRate(self, rate):
+        self.failureRate = rate
+
+    def loadArchive(self):
+        collate = Collate()
+        collate.setDirectory(self.directory)
+        self.entries = {}
+        for entry in collate.readFiles(collate.findFiles()):
+            if entry['IMO'] not in self.entries.keys():
+                self.entries[entry['IMO']] = []
+            self.entries[entry['IMO']].append(entry)
+        self.positions = {}
+
+    def response(self, IMOs):
+        # Return the JSON for the next entry of each IMO, or None to indicate a failure
+        with self.lock:
+            self.requests += 1
+            if self.random.random() < self.failureRate:
+                return None
+            result = []
+            for IMO in IMOs:
+                if IMO in self.entries.keys():
+                    position = self.positions.get(IMO, 0)
+                    result.append({'AIS': self.entries[IMO][position % len(self.entries[IMO])]})
+                    self.positions[IMO] = position + 1
+        return json.dumps(result)
+
+    def url(self):
+        return "http://{}:{}/vessels".format(self.host, self.server.server_address[1])
+
+    def start(self):
+        if len(self.entries) == 0:
+            self.loadArchive()
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                IMOs = []
+                for IMO in query.get('imo', [''])[0].split(','):
+                    if IMO.isdigit():
+                        IMOs.append(int(IMO))
+                if api.delay > 0.0:
+                    sleep(api.delay)
+                body = api.response(IMOs)
+                if body is None:
+                    self.send_response(500)
+                    body = '{"error":"Simulated failure"}'
+                else:
+                    self.send_response(200)
+                data = body.encode('utf-8')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass # Keep quiet
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print("Local API server : " + self.url())
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+if __name__ == '__main__':
+
+    server = LocalAPIServer()
+
+    server.start()
+
+    # Point a Tracker or PredictCrossing at the local server with:
+    # tracker.setBaseURL('http://127.0.0.1:8080/vessels')
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
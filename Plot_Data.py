@@ -6,17 +6,61 @@
 #
 # This code will open the pickle file created by
 # Extract_Data.py and plot the data using MatPlotLib.
+#
+# Long series are downsampled to maxPoints before they are plotted (see Simplify.py),
+# keeping the points either side of the Arctic Circle crossing.
+#
+# renderBatch draws comparisons of several sailings straight to image files, without a display
+# (e.g. for a nightly report). Each pickle file is converted to NumPy arrays (one per field) once.
+# One figure is reused for all of the images: its lines are updated rather than drawn again from
+# scratch. With setWorkers, the images are rendered by a pool of worker processes.
 
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import os
 import pickle
 import pytz
-import matplotlib.pyplot as plt
+import numpy as np # pip install numpy
+import matplotlib.pyplot as plt # pip install matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from Simplify import TrackSimplifier, crossingIndexes
+from Track_Store import TrackStore
+from Instrumentation import instrumentation, pathBytes
+
+# Render a list of jobs (see PlotData.renderBatch) with a new PlotData
+# This is a module-level function so it can be run in a worker process
+def renderJobs(settings, jobs):
+    plotData = PlotData()
+    plotData.__dict__.update(settings)
+    for job in jobs:
+        plotData.renderComparison(**job)
+    return len(jobs)
 
 class PlotData():
     def __init__(self):
         self.pickleFile = None
         self.plotTZ = 'UTC'
         self.pickleJar = {}
+        self.columns = {} # The pickleJar as NumPy arrays (see columnsFromPickleJar)
+        self.maxPoints = 2000 # 0 : plot every point
+        self.downsampleMethod = 'lttb' # or 'minmax'
+        self.simplifier = TrackSimplifier() # Caches the downsampled series
+        self.outputDirectory = '.'
+        self.imageFormat = 'png'
+        self.figureSize = (10., 6.) # Inches
+        self.dpi = 100
+        self.workers = 1
+        self.sailings = {} # filename : the sailing's columns (see loadColumns)
+        self.figure = None
+        self.axes = None
+        self.lines = [] # The lines of the figure. Reused between renders
+
+    def setMaxPoints(self, points):
+        self.maxPoints = points
+
+    def setDownsampleMethod(self, method):
+        self.downsampleMethod = method
 
     def setPickleFilename(self, filename):
         self.pickleFile = filename
@@ -24,39 +68,162 @@ class PlotData():
     def setPlotTimeZone(self, tz):
         self.plotTZ = tz
 
+    def setOutputDirectory(self, directory):
+        self.outputDirectory = directory
+
+    def setImageFormat(self, imageFormat):
+        self.imageFormat = imageFormat
+
+    def setFigureSize(self, width, height):
+        self.figureSize = (width, height)
+
+    def setDPI(self, dpi):
+        self.dpi = dpi
+
+    def setWorkers(self, workers):
+        self.workers = workers
+
     def loadPickleFile(self):
         if self.pickleFile is None:
             return
-        
+
         # Load the pickle file
         self.pickleJar = None
-        with open(self.pickleFile, 'rb') as f:
+        with instrumentation.stage('PlotData.load') as stage, open(self.pickleFile, 'rb') as f:
             self.pickleJar = pickle.load(f)
+            stage.count(records=len(self.pickleJar), bytesRead=f.tell())
+        self.columns = self.columnsFromPickleJar(self.pickleJar)
+
+    def columnsFromPickleJar(self, pickleJar):
+        # Convert the entries to one NumPy array per numeric field (None is NaN), plus EPOCH and the datetimes (DT)
+        # The entries are converted to a TrackStore (see Track_Store.py), so each column is built in one pass
+        # and the TIMESTAMPs are parsed in one vectorized call
+        store = TrackStore.fromRecords(list(pickleJar.values()))
+        columns = {
+            'DT': list(pickleJar.keys()),
+            'EPOCH': np.asarray(store.epoch, dtype=np.float64)
+        }
+        for key in store.keys:
+            if store.kinds[key] == 'bool':
+                continue
+            values = store.column(key)
+            if values.dtype != object: # Strings are left out
+                columns[key] = values.astype(np.float64)
+        return columns
+
+    def loadColumns(self, filename):
+        # Load a pickle file created by Extract_Data.py as columns. Each file is only converted once
+        if filename not in self.sailings:
+            with instrumentation.stage('PlotData.load') as stage, open(filename, 'rb') as f:
+                self.sailings[filename] = self.columnsFromPickleJar(pickle.load(f))
+                stage.count(records=len(self.sailings[filename]['DT']), bytesRead=f.tell())
+        return self.sailings[filename]
+
+    def downsample(self, x, y, columns=None):
+        # Return the indexes of the points to plot
+        if self.maxPoints <= 0 or len(y) <= self.maxPoints:
+            return np.arange(len(y))
+        if columns is None:
+            columns = self.columns
+        keep = None
+        if 'CIRCLE_NM' in columns:
+            keep = crossingIndexes(columns['CIRCLE_NM']) # The points either side of the Circle
+        return self.simplifier.downsample(x, y, self.maxPoints, self.downsampleMethod, keep)
+
+    def values(self, key):
+        return self.columns[key]
 
     def plotAgainstDT(self, yData):
-        xVals = []
-        yVals = []
-        for DT in self.pickleJar.keys():
-            xVals.append(DT)
-            yVals.append(self.pickleJar[DT][yData])
-        
-        plt.plot(xVals, yVals)
+        DTs = self.columns['DT']
+        yVals = self.values(yData)
+        keep = self.downsample(self.columns['EPOCH'], yVals)
+
+        plt.plot([DTs[i] for i in keep], yVals[keep])
         plt.ylabel(yData)
         plt.tick_params(axis='x', labelrotation=90)
-        plt.show()        
+        plt.show()
 
     def plotYAgainstX(self, yData, xData):
-        xVals = []
-        yVals = []
-        for DT in self.pickleJar.keys():
-            xVals.append(self.pickleJar[DT][xData])
-            yVals.append(self.pickleJar[DT][yData])
-        
-        plt.plot(xVals, yVals)
+        xVals = self.values(xData)
+        yVals = self.values(yData)
+        keep = self.downsample(xVals, yVals)
+
+        plt.plot(xVals[keep], yVals[keep])
         plt.xlabel(xData)
         plt.ylabel(yData)
         plt.tick_params(axis='x', labelrotation=90)
-        plt.show()        
+        plt.show()
+
+    def getFigure(self, lines):
+        # Create the figure (without a display) the first time. Add lines as needed
+        if self.figure is None:
+            self.figure = Figure(figsize=self.figureSize, dpi=self.dpi)
+            FigureCanvasAgg(self.figure)
+            self.axes = self.figure.add_subplot(1, 1, 1)
+            self.lines = []
+        while len(self.lines) < lines:
+            line, = self.axes.plot([], [])
+            self.lines.append(line)
+        return self.figure
+
+    def renderComparison(self, yData, sailingFiles, filename, xData=None):
+        # Draw yData for each sailing, against xData (or against the minutes since the start of each sailing)
+        # and save the image to filename (in the output directory)
+        figure = self.getFigure(len(sailingFiles))
+        for line, sailingFile in zip(self.lines, sailingFiles):
+            columns = self.loadColumns(sailingFile)
+            if xData is None:
+                xVals = (columns['EPOCH'] - columns['EPOCH'][0]) / 60. if len(columns['EPOCH']) > 0 else columns['EPOCH']
+            else:
+                xVals = columns[xData]
+            yVals = columns[yData]
+            keep = self.downsample(xVals, yVals, columns)
+            line.set_data(xVals[keep], yVals[keep])
+            line.set_label(os.path.splitext(os.path.basename(sailingFile))[0])
+            line.set_visible(True)
+        for line in self.lines[len(sailingFiles):]:
+            line.set_data([], [])
+            line.set_label('_unused') # Labels starting with _ are left out of the legend
+            line.set_visible(False)
+
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+        self.axes.set_xlabel("Minutes since the start of the sailing" if xData is None else xData)
+        self.axes.set_ylabel(yData)
+        self.axes.set_title(yData + " : " + str(len(sailingFiles)) + " sailings")
+        self.axes.legend(loc='best', fontsize='small')
+        imageFilename = os.path.join(self.outputDirectory, filename + '.' + self.imageFormat)
+        with instrumentation.stage('PlotData.savefig') as stage:
+            figure.savefig(imageFilename)
+            stage.count(records=1)
+            if instrumentation.enabled:
+                stage.count(bytesWritten=pathBytes(imageFilename))
+
+    def reportJobs(self, sailingFiles, prefix='Comparison'):
+        # The comparisons drawn by the __main__ example, for all of the sailings
+        return [
+            {'yData': 'SPEED', 'sailingFiles': sailingFiles, 'filename': prefix + '_SPEED'},
+            {'yData': 'LATITUDE', 'sailingFiles': sailingFiles, 'filename': prefix + '_LATITUDE'},
+            {'yData': 'REMAINING_NM', 'xData': 'LATITUDE', 'sailingFiles': sailingFiles, 'filename': prefix + '_REMAINING_NM'},
+            {'yData': 'CIRCLE_NM', 'xData': 'LATITUDE', 'sailingFiles': sailingFiles, 'filename': prefix + '_CIRCLE_NM'}
+        ]
+
+    def renderBatch(self, jobs):
+        # Render each job: a dict of the renderComparison arguments. Returns the number of images
+        if not os.path.isdir(self.outputDirectory):
+            os.makedirs(self.outputDirectory)
+        if self.workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                self.renderComparison(**job)
+            return len(jobs)
+
+        # Give each worker process a share of the jobs, and the settings
+        settings = {}
+        for name in ['plotTZ', 'maxPoints', 'downsampleMethod', 'outputDirectory', 'imageFormat', 'figureSize', 'dpi']:
+            settings[name] = getattr(self, name)
+        shares = [jobs[i::self.workers] for i in range(min(self.workers, len(jobs)))]
+        with ProcessPoolExecutor(max_workers=len(shares)) as executor:
+            return sum(executor.map(renderJobs, [settings] * len(shares), shares))
 
 if __name__ == '__main__':
 
@@ -76,3 +243,8 @@ if __name__ == '__main__':
 
     plotData.plotYAgainstX('CIRCLE_NM', 'LATITUDE')
 
+    # Or compare all of the sailings extracted by Route_Model.py, saving the plots as PNG files
+    #plotData.setOutputDirectory('Plots')
+    #plotData.setWorkers(4)
+    #sailingFiles = ['Track_Vessel_9107796_' + date + '.pkl' for date in ['2024-10-21', '2024-11-01', '2024-11-23', '2024-12-04']]
+    #plotData.renderBatch(plotData.reportJobs(sailingFiles))
@@ -0,0 +1,211 @@
+# Poll_Archive.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code stores the results of the VESSELS API requests in one compressed archive file per day
+# (Track_Vessel_UTC_YYYY-MM-DD.polls), instead of one Track_Vessel_UTC_*.json file per poll.
+# For a fleet, one file per poll soon becomes millions of small files, which makes os.walk
+# (Collate.findFiles) slow and wastes inodes.
+#
+# Each segment file is append-only:
+#   The file magic (8 bytes)
+#   One record per poll: the poll time (int64 epoch seconds, UTC), the payload length (uint32),
+#     the CRC-32 of the payload (uint32) and the payload: the JSON text of the result, compressed with zlib
+#   A footer index: the poll time, offset and payload length of each record,
+#     then the index offset, the number of records and the index magic
+# Appending a record overwrites the footer and writes a new one. The record is written and
+# flushed to disk before the new footer, so a segment always ends with a complete index, or with
+# complete records followed by an incomplete record or footer (e.g. the tracker was stopped while
+# writing). Then the records are found by scanning the file. The scan stops at the first record
+# whose CRC does not match, so the remains of an old footer are never read as a record.
+# All values are little-endian.
+#
+# Collate.py reads the segments natively (each record is treated like a JSON file).
+# exportJSON converts a segment back to Track_Vessel_UTC_*.json files, and migrate moves
+# existing Track_Vessel_UTC_* directories into the archive.
+
+from datetime import datetime
+import calendar
+import struct
+import zlib
+import os
+import json
+import pytz # pip install pytz
+
+segmentMagic = b'AISPOLL2'
+indexMagic = b'AISINDEX'
+recordHeader = struct.Struct('<qII') # Poll time, payload length, payload CRC-32
+indexEntry = struct.Struct('<qQI') # Poll time, record offset, payload length
+indexTrailer = struct.Struct('<QQ8s') # Index offset, number of records, index magic
+segmentPrefix = 'Track_Vessel_UTC_'
+segmentSuffix = '.polls'
+
+def pollEpoch(dt):
+    # dt is a timezone-aware datetime, or a naive datetime in UTC (as in the Track_Vessel_UTC_*.json filenames)
+    return calendar.timegm(dt.utctimetuple())
+
+def readSegmentIndex(filename):
+    # Return the index of a segment (a list of (poll time, offset, payload length)) and the end of the records
+    with open(filename, 'rb') as f:
+        if f.read(len(segmentMagic)) != segmentMagic:
+            raise ValueError(filename + " is not a poll archive segment")
+        size = f.seek(0, os.SEEK_END)
+
+        # Use the footer index if it is complete
+        if size >= len(segmentMagic) + indexTrailer.size:
+            f.seek(size - indexTrailer.size)
+            indexOffset, records, magic = indexTrailer.unpack(f.read(indexTrailer.size))
+            if magic == indexMagic and indexOffset + (records * indexEntry.size) + indexTrailer.size == size:
+                f.seek(indexOffset)
+                data = f.read(records * indexEntry.size)
+                return [indexEntry.unpack_from(data, i * indexEntry.size) for i in range(records)], indexOffset
+
+        # Otherwise scan the records, stopping at the first incomplete or invalid record
+        index = []
+        offset = len(segmentMagic)
+        while offset + recordHeader.size <= size:
+            f.seek(offset)
+            epoch, length, crc = recordHeader.unpack(f.read(recordHeader.size))
+            if offset + recordHeader.size + length > size:
+                break # Incomplete
+            if zlib.crc32(f.read(length)) != crc:
+                break # Not a record (e.g. part of an old footer)
+            index.append((epoch, offset, length))
+            offset += recordHeader.size + length
+        return index, offset
+
+def readRecord(f, offset):
+    # Return the JSON text of the record at offset in the open segment file f
+    f.seek(offset)
+    epoch, length, crc = recordHeader.unpack(f.read(recordHeader.size))
+    payload = f.read(length)
+    if zlib.crc32(payload) != crc:
+        raise ValueError("Poll archive record at offset {} is corrupt".format(offset))
+    return zlib.decompress(payload).decode('utf-8')
+
+def readSegment(filename):
+    # Return a list of (poll time, JSON text) for every record in a segment
+    index, end = readSegmentIndex(filename)
+    with open(filename, 'rb') as f:
+        return [(epoch, readRecord(f, offset)) for epoch, offset, length in index]
+
+class PollArchive():
+    def __init__(self):
+        self.directory = '.'
+        self.compressionLevel = 6 # zlib: 1 (fastest) ... 9 (smallest)
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setCompressionLevel(self, level):
+        self.compressionLevel = level
+
+    def segmentFilename(self, dt):
+        # One segment per UTC day
+        return os.path.join(self.directory, datetime.fromtimestamp(pollEpoch(dt), pytz.UTC).strftime(segmentPrefix + "%Y-%m-%d" + segmentSuffix))
+
+    def append(self, result, dt=None):
+        # Append the result of a VESSELS API request, polled at dt (default: now). Return the segment filename
+        if dt is None:
+            dt = datetime.now(pytz.UTC)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        filename = self.segmentFilename(dt)
+        if os.path.isfile(filename):
+            index, end = readSegmentIndex(filename)
+            mode = 'r+b'
+        else:
+            index, end = [], len(segmentMagic)
+            mode = 'w+b'
+
+        payload = zlib.compress(result.encode('utf-8'), self.compressionLevel)
+        with open(filename, mode) as f:
+            if mode == 'w+b':
+                f.write(segmentMagic)
+            # Overwrite the old footer with the new record and flush it to disk. Until the new footer
+            # is complete, the records (including the new one) are found by scanning the segment
+            f.seek(end)
+            f.write(recordHeader.pack(pollEpoch(dt), len(payload), zlib.crc32(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            index.append((pollEpoch(dt), end, len(payload)))
+            indexOffset = f.tell()
+            f.write(b''.join(indexEntry.pack(*entry) for entry in index))
+            f.write(indexTrailer.pack(indexOffset, len(index), indexMagic))
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        return filename
+
+    def exportJSON(self, segmentFilename, directory='.'):
+        # Convert a segment back to Track_Vessel_UTC_*.json files. Return the filenames
+        # As in Track_Vessel.writeResult, polls made in the same second are combined into one file
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        filenames = []
+        for epoch, result in readSegment(segmentFilename):
+            filename = os.path.join(directory, datetime.fromtimestamp(epoch, pytz.UTC).strftime(segmentPrefix + "%Y-%m-%d_%H-%M-%S.json"))
+            if filename in filenames:
+                with open(filename, 'r') as f:
+                    jsonData = json.loads(f.read())
+                jsonData.extend(json.loads(result))
+                result = json.dumps(jsonData)
+            else:
+                filenames.append(filename)
+            with open(filename, 'w') as f:
+                f.write(result)
+        return filenames
+
+    def migrate(self, sourceDirectory, removeFiles=False):
+        # Append the Track_Vessel_UTC_*.json files in sourceDirectory (and its sub-directories)
+        # to the archive, in time order. Return the number of files migrated
+        # With removeFiles, each file is removed once its record has been read back from the archive
+        # and checked, and then any directories left empty are removed too
+        from Collate import Collate # Collate imports this module
+        collate = Collate()
+        collate.setDirectory(sourceDirectory)
+        sortedFiles = [file for file in collate.findFiles() if file['offset'] is None] # Not already archived
+        results = []
+        records = [] # The segment and record number of each file
+        lastRecord = {}
+        for file in sortedFiles:
+            with open(file['filename'], 'r') as f:
+                results.append(f.read())
+            segmentFilename = self.append(results[-1], file['datetime'])
+            if segmentFilename in lastRecord:
+                lastRecord[segmentFilename] += 1
+            else:
+                lastRecord[segmentFilename] = len(readSegmentIndex(segmentFilename)[0]) - 1
+            records.append((segmentFilename, lastRecord[segmentFilename]))
+        if removeFiles:
+            segments = {}
+            for file, result, (segmentFilename, record) in zip(sortedFiles, results, records):
+                if segmentFilename not in segments:
+                    segments[segmentFilename] = readSegment(segmentFilename)
+                epoch, archived = segments[segmentFilename][record]
+                if archived != result or epoch != pollEpoch(file['datetime']):
+                    raise ValueError(file['filename'] + " was not archived correctly. It has not been removed")
+            for file in sortedFiles:
+                os.remove(file['filename'])
+            for root, dirs, files in os.walk(sourceDirectory, topdown=False):
+                if len(os.listdir(root)) == 0:
+                    os.rmdir(root)
+        print("Migrated {} files from {} to {}".format(len(sortedFiles), sourceDirectory, self.directory))
+        return len(sortedFiles)
+
+if __name__ == '__main__':
+
+    archive = PollArchive()
+    archive.setDirectory('Poll_Archive')
+
+    # Move the existing Track_Vessel_UTC_* directories into the archive
+    # The JSON files are removed once they have been checked, otherwise Collate.py would find the same polls twice
+    for directory in sorted(os.listdir('.')):
+        if os.path.isdir(directory) and directory.startswith(segmentPrefix):
+            archive.migrate(directory, removeFiles=True)
+
+    # Uncomment to convert a segment back to JSON files
+    #archive.exportJSON(os.path.join('Poll_Archive', 'Track_Vessel_UTC_2024-12-04.polls'), 'Track_Vessel_UTC_2024-12-04')
@@ -14,14 +14,26 @@ import urllib.request
 from time import sleep
 import pickle
 import json
+from Route_Index import RouteIndex
+from Route_Model import RouteModel
+from Track_Vessel import writeResult
+from Timestamps import parseTimestamp, epochToUTC, epochToLocal, localToDatetime
+from Instrumentation import instrumentation
 
 class PredictCrossing():
     def __init__(self):
         self.arrivalTime = None
         self.userkey = ''
         self.inputPickleFile = None
+        self.routeModelFile = None
         self.pickleJar = {}
+        self.routeIndex = None
+        self.forecast = None
+        self.verbose = True
+        self.writeResults = True
+        self.archive = None
         self.vessel = 0
+        self.baseURL = "https://api.vesselfinder.com/vessels"
 
     def setArrivalTime(self, tz, arrival):
         arrivalTime = {
@@ -36,83 +48,161 @@ class PredictCrossing():
     def setInputPickleFilename(self, filename):
         self.inputPickleFile = filename
 
+    def setRouteModelFilename(self, filename):
+        # Use a route model built from several sailings (see Route_Model.py) instead of the pickle file
+        self.routeModelFile = filename
+
+    def setForecast(self, forecast):
+        # Also print the range of crossing times from a CrossingForecast (see Crossing_Forecast.py)
+        self.forecast = forecast
+
+    def setVerbose(self, verbose):
+        self.verbose = verbose
+
+    def setWriteResults(self, write):
+        # Write each result to a Track_Vessel_UTC_*.json file (see Track_Vessel.py)
+        self.writeResults = write
+
+    def setArchive(self, archive):
+        # Append each result to a PollArchive (see Poll_Archive.py) instead of a JSON file
+        self.archive = archive
+
     def setVessel(self, IMO):
         self.vessel = IMO
 
+    def setBaseURL(self, url):
+        self.baseURL = url
+
+    def hasRoute(self):
+        return self.inputPickleFile is not None or self.routeModelFile is not None
+
+    def loadInputPickleFile(self):
+        # Load the route model, or the pickle file
+        with instrumentation.stage('PredictCrossing.loadRoute') as stage:
+            if self.routeModelFile is not None:
+                self.pickleJar = RouteModel.load(self.routeModelFile).route()
+            else:
+                with open(self.inputPickleFile, 'rb') as f:
+                    self.pickleJar = pickle.load(f)
+                    stage.count(bytesRead=f.tell())
+            # Index the route so the vessel's position along it can be found quickly
+            self.routeIndex = RouteIndex.fromPickleJar(self.pickleJar)
+            stage.count(records=len(self.pickleJar))
+
+    def requestURL(self):
+        # Construct the URL for the VESSELS API request
+        request = self.baseURL + "?userkey="
+        request += self.userkey
+        request += "&imo="
+        request += str(self.vessel)
+        return request
+
+    def arrivalExpired(self):
+        return datetime.now(pytz.UTC) > localToDatetime(self.arrivalTime['tz'], self.arrivalTime['arrival'])
+
+    def predictAIS(self, ais):
+        # Predict the crossing from one AIS entry. Returns a dict, or None if the vessel can't be located
+        DTarrival = localToDatetime(self.arrivalTime['tz'], self.arrivalTime['arrival'])
+        DTnow = epochToUTC(parseTimestamp(ais['TIMESTAMP']))
+
+        timeToArrivalDelta = DTarrival - DTnow
+        if self.verbose:
+            daysToArrival, rem = divmod(timeToArrivalDelta.total_seconds(), 60 * 60 * 24)
+            hoursToArrival, rem = divmod(rem, 60 * 60)
+            minutesToArrival, secondsToArrival = divmod(rem, 60)                    
+            print("Time to arrival                 : {:.0f} Days, {:02.0f}:{:02.0f}:{:02.0f}".format(daysToArrival, hoursToArrival, minutesToArrival, secondsToArrival))
+
+        # Find the closest position on the route, by Latitude and Longitude
+        location = self.routeIndex.locate(ais['LATITUDE'], ais['LONGITUDE'])
+
+        if location is None:
+            return None
+
+        distanceToDestination = location['REMAINING_NM']
+        distanceToCircle = location['CIRCLE_NM']
+        if self.verbose:
+            print("Distance to destination (NM)    : {:.1f}".format(distanceToDestination))
+            print("Distance to Arctic Circle (NM)  : {:.1f}".format(distanceToCircle))
+
+        # The prediction is only possible before the arrival time and before the destination
+        speedToDestination = None
+        crossingTime = None
+        if timeToArrivalDelta.total_seconds() > 0.0 and distanceToDestination > 0.0:
+            speedToDestination = distanceToDestination / (timeToArrivalDelta.total_seconds() / 3600.0)
+
+            timeToCircle = distanceToCircle / speedToDestination
+            crossingTime = DTnow + timedelta(hours = timeToCircle)
+            if self.verbose:
+                print("Speed to arrive on time (Knots) : {:.1f}".format(speedToDestination))
+                print("Crossing Time                   : {}".format(crossingTime.replace(tzinfo=pytz.timezone('UTC')) \
+                                  .astimezone(pytz.timezone(self.arrivalTime['tz'])).strftime('%Y-%m-%d %H:%M:%S'), self.arrivalTime['tz']))
+
+        prediction = {
+            'IMO': ais['IMO'],
+            'epoch': DTnow.timestamp(),
+            'REMAINING_NM': distanceToDestination,
+            'CIRCLE_NM': distanceToCircle,
+            'speedToDestination': speedToDestination,
+            'crossingEpoch': None if crossingTime is None else crossingTime.timestamp(),
+            'quantiles': None
+        }
+
+        if self.forecast is not None:
+            prediction['quantiles'] = self.forecast.forecast(distanceToCircle, DTnow.timestamp())
+            if self.verbose and prediction['quantiles'] is not None:
+                for quantile in prediction['quantiles'].keys():
+                    print("Crossing Time ({:2.0f}%)             : {}".format(quantile * 100, \
+                          epochToLocal(prediction['quantiles'][quantile], self.arrivalTime['tz']).strftime('%Y-%m-%d %H:%M:%S')))
+        if self.verbose:
+            print()
+
+        return prediction
+
+    def processResult(self, result):
+        # Returns a list of the predictions
+        predictions = []
+        if result is not None and 'AIS' in result:
+            # Write result to file
+            if self.writeResults:
+                writeResult(result, self.archive)
+
+            # Calculate the time until arrival
+            jsonData = json.loads(result)
+            for ais in jsonData: # Each file could contain multiple AIS entries
+                #print(ais)
+                if int(ais['AIS']['IMO']) != int(self.vessel): # e.g. a poll of several vessels
+                    continue
+                with instrumentation.stage('PredictCrossing.predictAIS') as stage:
+                    prediction = self.predictAIS(ais['AIS'])
+                    stage.count(records=1)
+                if prediction is None:
+                    continue # The vessel can't be located. Try the next entry
+                predictions.append(prediction)
+        return predictions
+
     def predict(self):
         if self.arrivalTime is None:
             return
         
-        if self.inputPickleFile is None:
+        if not self.hasRoute():
             return
         
-        # Load the pickle file
-        with open(self.inputPickleFile, 'rb') as f:
-            self.pickleJar = pickle.load(f)
+        self.loadInputPickleFile()
         
         while True:
 
-            # Construct the URL for the VESSELS API request
-            request = "https://api.vesselfinder.com/vessels?userkey="
-            request += self.userkey
-            request += "&imo="
-            request += str(self.vessel)
+            request = self.requestURL()
             print("Request : " + request)
 
             result = None
             try:
-                result = urllib.request.urlopen(request).read().decode("utf-8")
+                with instrumentation.stage('PredictCrossing.request') as stage:
+                    result = urllib.request.urlopen(request).read().decode("utf-8")
+                    stage.count(records=1, bytesRead=len(result))
             except:
                 print("URL request error!")
 
-            if result is not None and 'AIS' in result:
-                # Write result to file
-                dt = datetime.now(pytz.UTC) # Use UTC for the file name
-                filename = dt.strftime("Track_Vessel_UTC_%Y-%m-%d_%H-%M-%S.json")
-                with open(filename, 'w') as f:
-                    f.write(result)
-                print("Wrote JSON to " + filename + " :")
-                print(result)
-
-                # Calculate the time until arrival
-                jsonData = json.loads(result)
-                for ais in jsonData: # Each file could contain multiple AIS entries
-                    #print(ais)
-                    DTnow = pytz.timezone('UTC').localize(datetime.strptime(ais['AIS']['TIMESTAMP'], "%Y-%m-%d %H:%M:%S UTC"))
-                    DTarrival = pytz.timezone(self.arrivalTime['tz']).localize(datetime.strptime(self.arrivalTime['arrival'], "%Y-%m-%d %H:%M:%S"))
-
-                    timeToArrivalDelta = DTarrival - DTnow
-                    daysToArrival, rem = divmod(timeToArrivalDelta.total_seconds(), 60 * 60 * 24)
-                    hoursToArrival, rem = divmod(rem, 60 * 60)
-                    minutesToArrival, secondsToArrival = divmod(rem, 60)                    
-                    print("Time to arrival                 : {:.0f} Days, {:02.0f}:{:02.0f}:{:02.0f}".format(daysToArrival, hoursToArrival, minutesToArrival, secondsToArrival))
-
-                    # Find the entry in pickleJar with the closest Latitude
-                    deltaLat = 90.0
-                    closestEntry = None
-                    for DT in self.pickleJar.keys():
-                        if abs(self.pickleJar[DT]['LATITUDE'] - ais['AIS']['LATITUDE']) < deltaLat:
-                            deltaLat = abs(self.pickleJar[DT]['LATITUDE'] - ais['AIS']['LATITUDE'])
-                            closestEntry = DT
-
-                    if closestEntry is None:
-                        break
-
-                    distanceToDestination = self.pickleJar[closestEntry]['REMAINING_NM']
-                    print("Distance to destination (NM)    : {:.1f}".format(distanceToDestination))
-                    distanceToCircle = self.pickleJar[closestEntry]['CIRCLE_NM']
-                    print("Distance to Arctic Circle (NM)  : {:.1f}".format(distanceToCircle))
-
-                    speedToDestination = distanceToDestination / (timeToArrivalDelta.total_seconds() / 3600.0)
-                    print("Speed to arrive on time (Knots) : {:.1f}".format(speedToDestination))
-
-                    timeToCircle = distanceToCircle / speedToDestination
-                    crossingTime = DTnow + timedelta(hours = timeToCircle)
-                    print("Crossing Time                   : {}".format(crossingTime.replace(tzinfo=pytz.timezone('UTC')) \
-                                      .astimezone(pytz.timezone(self.arrivalTime['tz'])).strftime('%Y-%m-%d %H:%M:%S'), self.arrivalTime['tz']))
-                    print()
-
-
+            self.processResult(result)
 
             # Repeat every 60 seconds until arrival time has expired
             sleep(60)
@@ -133,4 +223,14 @@ if __name__ == '__main__':
 
     predict.setInputPickleFilename('Track_Vessel_9107796.pkl')
 
+    # Or use the route model built from all of the previous sailings by Route_Model.py
+    #predict.setRouteModelFilename('Route_Model_9107796.npz')
+
+    # Uncomment to also print a range of crossing times, based on the speeds of the previous sailings
+    #from Crossing_Forecast import CrossingForecast
+    #forecast = CrossingForecast()
+    #for date in ['2024-10-21', '2024-11-01', '2024-11-23']:
+    #    forecast.addSailingFile('Track_Vessel_9107796_' + date + '.pkl')
+    #predict.setForecast(forecast)
+
     predict.predict()
@@ -0,0 +1,171 @@
+# Replay.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code replays the archived Track_Vessel_UTC_*.json files through PredictCrossing
+# (see Predict_Crossing.py), to measure how accurate and how quick the predictions are
+# without waiting for a live sailing.
+#
+# Only the entries for the predictor's vessel are replayed, so the polls can contain other vessels.
+# The files are replayed in time order as fast as possible, or with setTimeWarp at a multiple
+# of real time (e.g. 60 replays one minute of polls per second). Each prediction made before
+# a crossing is compared with the crossing time found by ExtractCrossings (see Extract_Crossings.py).
+# The report shows the prediction error, grouped by how long before the crossing the prediction
+# was made, and the time taken to process each poll.
+
+from time import perf_counter, sleep
+import json
+import math
+import numpy as np # pip install numpy
+from Collate import Collate
+
+class Replay():
+    def __init__(self):
+        self.directory = '.'
+        self.predictor = None
+        self.timeWarp = 0.0 # 0 : as fast as possible
+        self.crossings = []
+        self.maxLeadTime = 6 * 60 * 60 # Only compare predictions made up to 6 hours before a crossing
+        self.leadTimeBins = [15, 30, 60, 120] # Minutes
+        self.predictions = []
+        self.latencies = [] # Seconds per poll
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setPredictor(self, predictor):
+        self.predictor = predictor
+
+    def setTimeWarp(self, warp):
+        self.timeWarp = warp
+
+    def setCrossings(self, crossings):
+        # The crossings found by ExtractCrossings.findCrossings, for the same Arctic Circle latitude as the predictor
+        self.crossings = crossings
+
+    def setMaxLeadTime(self, seconds):
+        self.maxLeadTime = seconds
+
+    def replay(self):
+        collate = Collate()
+        collate.setDirectory(self.directory)
+        sortedFiles = collate.findFiles()
+
+        # Load the route but don't write the results again
+        self.predictor.loadInputPickleFile()
+        self.predictor.setWriteResults(False)
+
+        self.predictions = []
+        self.latencies = []
+        previousPoll = None
+        for fileInfo in sortedFiles:
+            result = collate.readResult(fileInfo) # A JSON file or an archived poll (see Poll_Archive.py)
+
+            # Wait for the (warped) interval between the polls
+            if self.timeWarp > 0.0 and previousPoll is not None:
+                sleep(max(0.0, (fileInfo['datetime'] - previousPoll).total_seconds() / self.timeWarp))
+            previousPoll = fileInfo['datetime']
+
+            # Only replay the predictor's vessel. A poll can contain several vessels (e.g. a fleet archive)
+            entries = [ais for ais in json.loads(result) if int(ais['AIS']['IMO']) == int(self.predictor.vessel)]
+            if len(entries) == 0:
+                continue
+            result = json.dumps(entries)
+
+            start = perf_counter()
+            predictions = self.predictor.processResult(result)
+            self.latencies.append(perf_counter() - start)
+            self.predictions.extend(predictions)
+
+        return self.predictions
+
+    def actualCrossing(self, prediction):
+        # Return the first crossing by the vessel after the prediction, within maxLeadTime. None if there isn't one
+        for crossing in self.crossings:
+            if crossing['IMO'] == prediction['IMO'] and \
+                prediction['epoch'] <= crossing['crossingEpochByLat'] <= prediction['epoch'] + self.maxLeadTime:
+                return crossing['crossingEpochByLat']
+        return None
+
+    def errors(self):
+        # Return (lead time, error, inside the forecast range) for each prediction made before a crossing. Seconds
+        errors = []
+        for prediction in self.predictions:
+            if prediction['crossingEpoch'] is None or prediction['CIRCLE_NM'] <= 0.0:
+                continue
+            actual = self.actualCrossing(prediction)
+            if actual is None:
+                continue
+            inside = None
+            if prediction['quantiles'] is not None:
+                quantiles = list(prediction['quantiles'].values())
+                inside = min(quantiles) <= actual <= max(quantiles)
+            errors.append((actual - prediction['epoch'], prediction['crossingEpoch'] - actual, inside))
+        return errors
+
+    def printErrors(self, name, errors):
+        if len(errors) == 0:
+            print("{:<20} : no predictions".format(name))
+            return
+        error = np.array([e[1] for e in errors])
+        line = "{:<20} : {:5} predictions : mean {:7.1f}s : mean abs {:6.1f}s : RMS {:6.1f}s : max abs {:6.1f}s".format( \
+            name, len(errors), error.mean(), np.abs(error).mean(), math.sqrt((error * error).mean()), np.abs(error).max())
+        inside = [e[2] for e in errors if e[2] is not None]
+        if len(inside) > 0:
+            line += " : {:3.0f}% inside range".format(100. * sum(inside) / len(inside))
+        print(line)
+
+    def printReport(self):
+        errors = self.errors()
+
+        print("Prediction error (predicted - actual crossing time):")
+        self.printErrors("All", errors)
+        lower = 0
+        for upper in self.leadTimeBins + [None]:
+            if upper is None:
+                name = "{}+ minutes".format(lower)
+                binned = [e for e in errors if e[0] >= lower * 60]
+            else:
+                name = "{}-{} minutes".format(lower, upper)
+                binned = [e for e in errors if lower * 60 <= e[0] < upper * 60]
+            self.printErrors(name, binned)
+            lower = upper
+
+        print()
+        if len(self.latencies) == 0:
+            print("No polls were replayed")
+            return
+        latencies = np.array(self.latencies) * 1000.
+        print("Polls replayed       : {}".format(len(latencies)))
+        print("Latency per poll (ms): mean {:.3f} : 50% {:.3f} : 95% {:.3f} : 99% {:.3f} : max {:.3f}".format( \
+            latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 95), np.percentile(latencies, 99), latencies.max()))
+        print("Throughput           : {:.0f} polls/s".format(len(latencies) / (latencies.sum() / 1000.)))
+
+if __name__ == '__main__':
+
+    from Predict_Crossing import PredictCrossing
+    from Extract_Crossings import ExtractCrossings
+
+    # Predict the 2024-12-04 sailing using the route from the 2024-11-23 sailing
+    predict = PredictCrossing()
+    predict.setVessel(9107796) # MS Polarlys
+    predict.setArrivalTime('Europe/Oslo', '2024-12-04 10:00:00')
+    predict.setInputPickleFilename('Track_Vessel_9107796.pkl')
+    predict.setVerbose(False)
+
+    # The actual crossings, alongside the Polar Circle Globe on Vikingen Island
+    crossings = ExtractCrossings()
+    crossings.setArcticCircleDegMinSec(66., 31., 57.7)
+
+    replay = Replay()
+    replay.setDirectory('Track_Vessel_UTC_2024-12-04_05-14-17')
+    replay.setPredictor(predict)
+    replay.setCrossings(crossings.findCrossings())
+
+    # Uncomment to replay at 60 times real time
+    #replay.setTimeWarp(60.)
+
+    replay.replay()
+    replay.printReport()
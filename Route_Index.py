@@ -0,0 +1,161 @@
+# Route_Index.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code indexes a reference route (the pickle file created by Extract_Data.py) so the
+# position of a vessel along the route can be found in O(log n), using both Latitude and Longitude.
+#
+# Each point of the route is projected onto the unit sphere (x, y, z). The straight-line
+# (chord) distance between two projected points increases with their Great Circle Distance,
+# so the nearest point in 3D is the nearest point on the Earth. The points are held in a
+# k-d tree: a balanced tree stored implicitly in a single array (the median of each range
+# is the node, the two halves either side are its children).
+#
+# nearest returns the closest route point. locate then projects the position onto the route
+# segments either side of that point and interpolates CUMULATIVE_NM, REMAINING_NM and CIRCLE_NM.
+
+import pickle
+import math
+import numpy as np # pip install numpy
+from Geodesy import earthRadiusNM
+
+def sphereCoordinates(lat, lon):
+    # Return the (x, y, z) of a position on the unit sphere. lat and lon can be NumPy arrays
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)
+
+class RouteIndex():
+    def __init__(self):
+        self.keys = [] # The pickleJar keys (local datetimes), in route order
+        self.points = [] # (x, y, z) of each route point, in route order
+        self.values = {} # CUMULATIVE_NM, REMAINING_NM and CIRCLE_NM of each route point
+        self.tree = [] # The route point indexes, arranged as an implicit k-d tree
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def fromPickleJar(cls, pickleJar):
+        route = cls()
+        route.keys = list(pickleJar.keys())
+        entries = list(pickleJar.values())
+        x, y, z = sphereCoordinates(np.array([entry['LATITUDE'] for entry in entries], dtype=np.float64),
+                                    np.array([entry['LONGITUDE'] for entry in entries], dtype=np.float64))
+        route.points = list(zip(x.tolist(), y.tolist(), z.tolist()))
+        for key in ['CUMULATIVE_NM', 'REMAINING_NM', 'CIRCLE_NM']:
+            route.values[key] = [entry[key] for entry in entries]
+        route.build(np.stack((x, y, z), axis=1))
+        return route
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            return cls.fromPickleJar(pickle.load(f))
+
+    def build(self, coordinates):
+        # Arrange the point indexes so the median of each range (split on x, y, z in turn) is its node
+        tree = np.arange(len(coordinates))
+        ranges = [(0, len(tree), 0)]
+        while len(ranges) > 0:
+            lo, hi, axis = ranges.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            part = tree[lo:hi]
+            tree[lo:hi] = part[np.argpartition(coordinates[part, axis], mid - lo)]
+            ranges.append((lo, mid, (axis + 1) % 3))
+            ranges.append((mid + 1, hi, (axis + 1) % 3))
+        self.tree = tree.tolist()
+
+    def nearest(self, lat, lon):
+        # Return the index (in route order) of the route point closest to lat, lon
+        if len(self.tree) == 0:
+            return None
+        query = [float(c) for c in sphereCoordinates(lat, lon)]
+        best = None
+        bestDistance = math.inf
+        ranges = [(0, len(self.tree), 0, 0.0)]
+        while len(ranges) > 0:
+            lo, hi, axis, planeDistance = ranges.pop()
+            if lo >= hi or planeDistance >= bestDistance: # This range can't contain anything closer
+                continue
+            mid = (lo + hi) // 2
+            point = self.points[self.tree[mid]]
+            dx = query[0] - point[0]
+            dy = query[1] - point[1]
+            dz = query[2] - point[2]
+            distance = (dx * dx) + (dy * dy) + (dz * dz)
+            if distance < bestDistance:
+                bestDistance = distance
+                best = self.tree[mid]
+            delta = query[axis] - point[axis]
+            if delta < 0.0:
+                near, far = (lo, mid), (mid + 1, hi)
+            else:
+                near, far = (mid + 1, hi), (lo, mid)
+            # Search the near side first (popped first), the far side only if the splitting plane is closer than the best
+            ranges.append((far[0], far[1], (axis + 1) % 3, delta * delta))
+            ranges.append((near[0], near[1], (axis + 1) % 3, 0.0))
+        return best
+
+    def projectOntoSegment(self, query, first, second):
+        # Return the fraction along the segment (0 ... 1) closest to query, and the squared chord distance
+        a = self.points[first]
+        b = self.points[second]
+        ab = [b[i] - a[i] for i in range(3)]
+        aq = [query[i] - a[i] for i in range(3)]
+        length = sum(c * c for c in ab)
+        fraction = 0.0
+        if length > 0.0:
+            fraction = min(1.0, max(0.0, sum(ab[i] * aq[i] for i in range(3)) / length))
+        offset = [aq[i] - (fraction * ab[i]) for i in range(3)]
+        return fraction, sum(c * c for c in offset)
+
+    def locate(self, lat, lon):
+        # Return the position on the route closest to lat, lon as a dict:
+        # the closest route point (index and key), the interpolated CUMULATIVE_NM, REMAINING_NM
+        # and CIRCLE_NM, and the distance from the route (NM). None if the route is empty
+        closest = self.nearest(lat, lon)
+        if closest is None:
+            return None
+        query = [float(c) for c in sphereCoordinates(lat, lon)]
+
+        # The position is on one of the two segments either side of the closest point
+        first, second, fraction = closest, closest, 0.0
+        bestDistance = math.inf
+        for segment in [(closest - 1, closest), (closest, closest + 1)]:
+            if segment[0] < 0 or segment[1] >= len(self.points):
+                continue
+            segmentFraction, distance = self.projectOntoSegment(query, segment[0], segment[1])
+            if distance < bestDistance:
+                bestDistance = distance
+                first, second, fraction = segment[0], segment[1], segmentFraction
+        if bestDistance == math.inf: # A route with a single point
+            point = self.points[closest]
+            bestDistance = sum((query[i] - point[i]) ** 2 for i in range(3))
+
+        location = {
+            'index': closest,
+            'key': self.keys[closest],
+            'offRouteNM': math.sqrt(bestDistance) * earthRadiusNM
+        }
+        for key in self.values.keys():
+            values = self.values[key]
+            location[key] = values[first] + (fraction * (values[second] - values[first]))
+        return location
+
+if __name__ == '__main__':
+
+    route = RouteIndex.load('Track_Vessel_9107796.pkl')
+
+    print("Route points: {}".format(len(route)))
+
+    # Where the vessel crossed the Arctic Circle (66 degrees 31 minutes 57.7 seconds)
+    location = route.locate(66.532694, 12.977)
+    print("Closest route point             : {}".format(location['key']))
+    print("Distance from route (NM)        : {:.2f}".format(location['offRouteNM']))
+    print("Distance to destination (NM)    : {:.1f}".format(location['REMAINING_NM']))
+    print("Distance to Arctic Circle (NM)  : {:.1f}".format(location['CIRCLE_NM']))
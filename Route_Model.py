@@ -0,0 +1,218 @@
+# Route_Model.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code builds a reference route from several historical sailings (the pickle files
+# created by Extract_Data.py), for use by Predict_Crossing.py.
+#
+# The sailings are aligned by their distance along the track from the Arctic Circle (CIRCLE_NM).
+# The model is a grid of stations, every stationSpacing Nautical Miles from the Circle. Each
+# sailing is interpolated at the stations it covers and added to running sums at each station
+# (Latitude, Longitude) and for each segment between two stations (the time taken, as a speed,
+# and its square for the variance). So a new sailing can be added to a saved model without
+# processing the others again. The sailings already in the model are skipped.
+#
+# route() returns the averaged route in the same format as the Extract_Data.py pickle file
+# (plus SAILINGS, SPEED_MEAN and SPEED_STD for the segment following each station).
+
+import os
+import pickle
+import numpy as np # pip install numpy
+
+class RouteModel():
+    version = 1
+
+    def __init__(self):
+        self.stationSpacing = 0.25 # Nautical Miles
+        self.first = 0 # The grid number of the first station. Station n is n * stationSpacing NM past the Circle
+        self.sailings = [] # The names of the sailings in the model
+        self.stationCount = np.zeros(0, dtype=np.int64) # The number of sailings covering each station
+        self.latitudeSum = np.zeros(0, dtype=np.float64)
+        self.longitudeSum = np.zeros(0, dtype=np.float64)
+        self.segmentCount = np.zeros(0, dtype=np.int64) # The number of sailings with a speed for each segment
+        self.speedSum = np.zeros(0, dtype=np.float64)
+        self.speedSquaredSum = np.zeros(0, dtype=np.float64)
+        self.destinationSum = 0.0 # The sum of the distances from the Circle to the destination
+
+    def __len__(self):
+        return len(self.stationCount)
+
+    def setStationSpacing(self, nm):
+        if len(self.sailings) > 0:
+            raise ValueError("The station spacing can't be changed once sailings have been added")
+        self.stationSpacing = nm
+
+    def extend(self, first, last):
+        # Grow the arrays so they cover grid numbers first ... last
+        first = min(first, self.first) if len(self) > 0 else first
+        last = max(last, self.first + len(self) - 1) if len(self) > 0 else last
+        before = self.first - first if len(self) > 0 else 0
+        after = (last - first + 1) - len(self) - before
+        if before == 0 and after == 0:
+            return
+        for name in ['stationCount', 'latitudeSum', 'longitudeSum', 'segmentCount', 'speedSum', 'speedSquaredSum']:
+            values = getattr(self, name)
+            setattr(self, name, np.concatenate((np.zeros(before, dtype=values.dtype), values, np.zeros(after, dtype=values.dtype))))
+        self.first = first
+
+    def addSailing(self, name, pickleJar):
+        # Add a sailing (an Extract_Data.py pickleJar). Return False if it is empty or already in the model
+        if name in self.sailings:
+            return False
+
+        entries = list(pickleJar.values())
+        if len(entries) == 0:
+            return False
+        along = -np.array([entry['CIRCLE_NM'] for entry in entries], dtype=np.float64) # NM past the Circle
+        epoch = np.array([DT.timestamp() for DT in pickleJar.keys()], dtype=np.float64)
+        latitude = np.array([entry['LATITUDE'] for entry in entries], dtype=np.float64)
+        longitude = np.array([entry['LONGITUDE'] for entry in entries], dtype=np.float64)
+
+        # Interpolation needs strictly increasing distances. While the vessel is stopped, the distance
+        # doesn't change: keep the last sample, so the time at a station is when the vessel moves on
+        along = np.maximum.accumulate(along)
+        keep = np.append(along[1:] > along[:-1], True)
+        along, epoch, latitude, longitude = along[keep], epoch[keep], latitude[keep], longitude[keep]
+
+        first = int(np.ceil(along[0] / self.stationSpacing))
+        last = int(np.floor(along[-1] / self.stationSpacing))
+        self.sailings.append(name)
+        self.destinationSum += entries[-1]['REMAINING_NM'] - entries[-1]['CIRCLE_NM']
+        if last < first:
+            return True
+
+        self.extend(first, last)
+        stations = np.arange(first, last + 1) * self.stationSpacing
+        covered = slice(first - self.first, last - self.first + 1)
+        self.stationCount[covered] += 1
+        self.latitudeSum[covered] += np.interp(stations, along, latitude)
+        self.longitudeSum[covered] += np.interp(stations, along, longitude)
+
+        # The speed over each segment. A segment is indexed by the station at its start
+        interval = np.diff(np.interp(stations, along, epoch))
+        moving = interval > 0.0
+        speed = np.zeros(len(interval), dtype=np.float64)
+        speed[moving] = 3600. * self.stationSpacing / interval[moving]
+        segments = slice(first - self.first, last - self.first)
+        self.segmentCount[segments] += moving
+        self.speedSum[segments] += speed
+        self.speedSquaredSum[segments] += speed * speed
+        return True
+
+    def addSailingFile(self, filename):
+        with open(filename, 'rb') as f:
+            pickleJar = pickle.load(f)
+        return self.addSailing(os.path.basename(filename), pickleJar)
+
+    def speedMean(self):
+        # The mean speed (Knots) over the segment following each station. NaN if unknown
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.speedSum / self.segmentCount
+
+    def speedStd(self):
+        # The standard deviation of the speed (Knots) over the segment following each station. NaN if unknown
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.speedSum / self.segmentCount
+            variance = (self.speedSquaredSum / self.segmentCount) - (mean * mean)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    def route(self):
+        # Return the averaged route as a dict of entries, in the same format as the Extract_Data.py pickle file.
+        # The keys are the distances past the Circle (NM) of the stations
+        route = {}
+        if len(self.sailings) == 0:
+            return route
+        destination = self.destinationSum / len(self.sailings)
+        covered = np.flatnonzero(self.stationCount > 0)
+        if len(covered) == 0:
+            return route
+        latitude = self.latitudeSum[covered] / self.stationCount[covered]
+        longitude = self.longitudeSum[covered] / self.stationCount[covered]
+        along = (covered + self.first) * self.stationSpacing
+        speedMean = self.speedMean()[covered]
+        speedStd = self.speedStd()[covered]
+        for i in range(len(covered)):
+            entry = {
+                'LATITUDE': latitude[i].item(),
+                'LONGITUDE': longitude[i].item(),
+                'CUMULATIVE_NM': (along[i] - along[0]).item(),
+                'REMAINING_NM': (destination - along[i]).item(),
+                'CIRCLE_NM': (-along[i]).item(),
+                'SAILINGS': self.stationCount[covered[i]].item(),
+                'SPEED_MEAN': None if np.isnan(speedMean[i]) else speedMean[i].item(),
+                'SPEED_STD': None if np.isnan(speedMean[i]) else speedStd[i].item()
+            }
+            route[along[i].item()] = entry
+        return route
+
+    @classmethod
+    def load(cls, filename):
+        model = cls()
+        with np.load(filename) as data:
+            if data['version'] != cls.version:
+                raise ValueError("Unsupported route model version: " + str(data['version']))
+            model.stationSpacing = data['stationSpacing'].item()
+            model.first = data['first'].item()
+            model.sailings = data['sailings'].tolist()
+            model.destinationSum = data['destinationSum'].item()
+            for name in ['stationCount', 'latitudeSum', 'longitudeSum', 'segmentCount', 'speedSum', 'speedSquaredSum']:
+                setattr(model, name, data[name])
+        return model
+
+    def save(self, filename):
+        with open(filename, 'wb') as f: # Passing a file object stops savez adding .npz to the name
+            np.savez(f, version=self.version, stationSpacing=self.stationSpacing, first=self.first,
+                     sailings=np.array(self.sailings, dtype=str), destinationSum=self.destinationSum,
+                     stationCount=self.stationCount, latitudeSum=self.latitudeSum, longitudeSum=self.longitudeSum,
+                     segmentCount=self.segmentCount, speedSum=self.speedSum, speedSquaredSum=self.speedSquaredSum)
+
+    @classmethod
+    def update(cls, filename, sailingFiles):
+        # Load the model (if it exists), add any new sailings and save it
+        if os.path.isfile(filename):
+            model = cls.load(filename)
+        else:
+            model = cls()
+        added = 0
+        for sailingFile in sailingFiles:
+            if model.addSailingFile(sailingFile):
+                print("Added sailing : " + sailingFile)
+                added += 1
+        if added > 0:
+            model.save(filename)
+        return model
+
+if __name__ == '__main__':
+
+    from Extract_Data import ExtractData
+
+    # Extract the data for each sailing of the MS Polarlys
+    windows = [
+        ['2024-10-21 07:00:00', '2024-10-21 10:00:00'],
+        ['2024-11-01 06:00:00', '2024-11-01 10:10:00'],
+        ['2024-11-23 06:05:00', '2024-11-23 10:10:00'],
+        ['2024-12-04 06:00:00', '2024-12-04 10:10:00']
+    ]
+    sailingFiles = []
+    for start, end in windows:
+        sailingFile = 'Track_Vessel_9107796_' + start[0:10] + '.pkl'
+        if not os.path.isfile(sailingFile):
+            extractData = ExtractData()
+            extractData.setVessel(9107796) # MS Polarlys
+            extractData.setArcticCircleDegMinSec(66., 31., 57.7) # Alongside the Polar Circle Globe on Vikingen Island
+            extractData.setWindow('Europe/Oslo', start, end)
+            extractData.setOutputPickleFilename(sailingFile)
+            extractData.extractDataForVessel()
+        sailingFiles.append(sailingFile)
+
+    model = RouteModel.update('Route_Model_9107796.npz', sailingFiles)
+
+    print("Sailings : {}".format(len(model.sailings)))
+    print("Stations : {}".format(len(model)))
+    route = model.route()
+    for along in list(route.keys())[::20]:
+        entry = route[along]
+        print("{:6.2f} NM past the Circle : {:.5f} {:.5f} : {} sailings : {}".format(along, entry['LATITUDE'], entry['LONGITUDE'], entry['SAILINGS'],
+              "-" if entry['SPEED_MEAN'] is None else "{:.1f} +/- {:.1f} Knots".format(entry['SPEED_MEAN'], entry['SPEED_STD'])))
@@ -0,0 +1,355 @@
+# Run_Pipeline.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code runs the whole pipeline for every vessel and voyage in the archive, from the command line:
+#   Collate.py : the archive (JSON files and poll archive segments) is collated incrementally
+#     into a columnar TrackStore (Track_Vessel.trk) in the output directory
+#   Voyage_Segmenter.py : every vessel's track is split into voyages
+#   Extract_Crossings.py : the crossings of all vessels are found in one pass (Crossings.json)
+#   Extract_Data.py and Generate_KML.py : one job per voyage, run in a pool of worker processes
+#
+# Each voyage is written to its own files: <output>/<IMO>/<IMO>_<local start time>.pkl,
+# _Points.kml and _LineString.kml, so the jobs can run concurrently.
+# A hash of each job's input entries and settings is kept in Pipeline_Manifest.json. A job whose
+# hash has not changed (and whose output files still exist) is skipped, as are the crossings.
+# A throughput summary is printed at the end.
+# With --cache, the tracks and KML files are also kept in an ArtifactCache (see Artifact_Cache.py),
+# shared by the workers, so a rerun with a different Arctic Circle latitude reuses the tracks.
+# With --report, the time, records and bytes of each stage of each class are recorded (see
+# Instrumentation.py), including those in the worker processes, and written to a JSON report.
+# --profile and --trace-memory add the slowest functions (cProfile) and the peak memory (tracemalloc).
+#
+# python Run_Pipeline.py --timezone Europe/Oslo --circle 66 31 57.7 --workers 4
+
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import numpy as np # pip install numpy
+from Collate import Collate
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
+from Voyage_Segmenter import VoyageSegmenter
+from Extract_Data import ExtractData
+from Extract_Crossings import ExtractCrossings
+from Generate_KML import GenerateKML
+from Artifact_Cache import ArtifactCache, recordsHash
+from Instrumentation import instrumentation
+from Timestamps import epochToLocal
+
+pipelineVersion = 1 # Change this to rerun every job (e.g. if the derivations change)
+
+# Hash the settings and the input entries of a job
+def jobHash(settings, store, offsets):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(recordsHash(store, offsets).encode()) # All of the fields, a column at a time
+    return digest.hexdigest()
+
+# Extract the data for one voyage and write its KML files. Skip the job if its inputs haven't changed
+# This is a module-level function so it can be run in a worker process
+def runVoyageJob(job):
+    start = perf_counter()
+    # Record this job's stages separately, so they can be returned from a worker process
+    stages = instrumentation.stages
+    instrumentation.stages = {}
+    if job['instrument']:
+        instrumentation.setEnabled(True)
+    store = TrackStore.open(job['store'])
+    index = TrackIndex.forStore(store, job['store'])
+
+    # The entry before the voyage is included, as it is used for the first distance
+    offsets = index.query(job['IMO'], job['startEpoch'], job['endEpoch'], before=1)
+    digest = jobHash(job['settings'], store, offsets)
+    result = {
+        'name': job['name'],
+        'hash': digest,
+        'entries': len(offsets),
+        'skipped': digest == job['previousHash'] and all(os.path.isfile(output) for output in job['outputs'])
+    }
+    if not result['skipped']:
+        cache = ArtifactCache(job['cache']) if job['cache'] is not None else None
+        extractData = ExtractData()
+        extractData.setCache(cache)
+        extractData.setInputPickleFilename(job['store'])
+        extractData.setArcticCircleLatitude(job['settings']['circleLatitude'])
+        pickleJar = extractData.extractWindows([(job['IMO'], job['startEpoch'], job['endEpoch'])], job['settings']['timezone'])[0]
+        with open(job['dataFile'], 'wb') as f:
+            pickle.dump(pickleJar, f)
+
+        generate = GenerateKML()
+        generate.setPickleFilename(job['store'])
+        generate.setVessel(job['IMO'])
+        generate.setWindow(*job['window'])
+        generate.setArcticCircleLatitude(job['settings']['circleLatitude'])
+        generate.setKMZ(job['settings']['kmz'])
+        generate.setSimplifyTolerance(job['settings']['simplify'])
+        generate.setOutputPrefix(job['kmlPrefix'])
+        generate.setCache(cache)
+        generate.generate()
+    result['seconds'] = perf_counter() - start
+    result['stages'] = instrumentation.stages
+    instrumentation.stages = stages
+    return result
+
+class RunPipeline():
+    def __init__(self):
+        self.directory = '.'
+        self.outputDirectory = 'Pipeline'
+        self.workers = os.cpu_count() or 1
+        self.timezone = 'UTC'
+        self.ArcticCircleLatitude = 66. + (33. / 60.) # Historical value: 66 degrees 33 minutes
+        self.vessels = None # None : all vessels
+        self.allVoyages = False # Include the voyages without a port call at both ends
+        self.kmz = False
+        self.simplifyTolerance = 0.0
+        self.force = False
+        self.cacheDirectory = None # None : no artifact cache
+        self.reportFilename = None # None : no instrumentation
+        self.profile = False
+        self.traceMemory = False
+        self.stages = [] # The throughput of each stage
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setOutputDirectory(self, directory):
+        self.outputDirectory = directory
+
+    def setWorkers(self, workers):
+        self.workers = workers
+
+    def setTimeZone(self, tz):
+        self.timezone = tz
+
+    def setArcticCircleLatitude(self, lat):
+        self.ArcticCircleLatitude = lat
+
+    def setArcticCircleDegMinSec(self, deg, min, sec):
+        self.ArcticCircleLatitude = deg + (min / 60.) + (sec / 3600.)
+
+    def setVessels(self, IMOs):
+        self.vessels = IMOs
+
+    def setAllVoyages(self, allVoyages):
+        self.allVoyages = allVoyages
+
+    def setKMZ(self, kmz):
+        self.kmz = kmz
+
+    def setSimplifyTolerance(self, nm):
+        self.simplifyTolerance = nm
+
+    def setForce(self, force):
+        # Run every job, even if its inputs haven't changed
+        self.force = force
+
+    def setCacheDirectory(self, directory):
+        # Keep the tracks, crossings and KML files in an ArtifactCache in directory
+        self.cacheDirectory = directory
+
+    def setReportFilename(self, filename):
+        # Record the stages of each class (see Instrumentation.py) and write the report to filename
+        self.reportFilename = filename
+
+    def setProfile(self, profile):
+        self.profile = profile
+
+    def setTraceMemory(self, traceMemory):
+        self.traceMemory = traceMemory
+
+    def storeFilename(self):
+        return os.path.join(self.outputDirectory, 'Track_Vessel.trk')
+
+    def manifestFilename(self):
+        return os.path.join(self.outputDirectory, 'Pipeline_Manifest.json')
+
+    def loadManifest(self):
+        if self.force or not os.path.isfile(self.manifestFilename()):
+            return {}
+        with open(self.manifestFilename(), 'r') as f:
+            return json.loads(f.read())
+
+    def writeManifest(self, manifest):
+        with open(self.manifestFilename(), 'w') as f:
+            f.write(json.dumps(manifest, indent=1, sort_keys=True))
+
+    def addStage(self, name, items, skipped, seconds, unit):
+        self.stages.append({'name': name, 'items': items, 'skipped': skipped, 'seconds': seconds, 'unit': unit})
+        if instrumentation.enabled:
+            instrumentation.addStage('RunPipeline.' + name, seconds, items)
+
+    def collate(self):
+        start = perf_counter()
+        collate = Collate()
+        collate.setDirectory(self.directory)
+        collate.setFilename(self.storeFilename())
+        collate.setManifestFilename(os.path.join(self.outputDirectory, 'Track_Vessel_Manifest.json'))
+        collate.setColumnar(True)
+        collate.setIncremental(True)
+        collate.setWorkers(self.workers)
+        sortedFiles = collate.findFiles()
+        collate.collate()
+        self.addStage('Collate', len(sortedFiles), len(sortedFiles) - collate.filesRead, perf_counter() - start, 'polls')
+
+    def crossings(self, manifest):
+        # Find the crossings of all vessels in one pass, unless the store or the settings haven't changed
+        # The vessel filter is included, so a filtered run never reuses the crossings of an unfiltered run
+        start = perf_counter()
+        store = TrackStore.open(self.storeFilename())
+        digest = hashlib.blake2b(digest_size=16)
+        vessels = None if self.vessels is None else sorted(self.vessels)
+        digest.update(json.dumps([pipelineVersion, self.ArcticCircleLatitude, vessels]).encode())
+        for key in ['IMO', 'LATITUDE', 'LONGITUDE', 'SPEED']:
+            digest.update(np.ascontiguousarray(store.column(key), dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(store.epoch).tobytes())
+        filename = os.path.join(self.outputDirectory, 'Crossings.json')
+        skipped = manifest.get('Crossings') == digest.hexdigest() and os.path.isfile(filename)
+        if not skipped:
+            extractCrossings = ExtractCrossings()
+            extractCrossings.setPickleFilename(self.storeFilename())
+            extractCrossings.setArcticCircleLatitude(self.ArcticCircleLatitude)
+            if self.cacheDirectory is not None:
+                extractCrossings.setCache(ArtifactCache(self.cacheDirectory))
+            crossings = extractCrossings.findCrossings()
+            if self.vessels is not None:
+                crossings = [crossing for crossing in crossings if crossing['IMO'] in self.vessels]
+            with open(filename, 'w') as f:
+                f.write(json.dumps(crossings, indent=1))
+            manifest['Crossings'] = digest.hexdigest()
+        self.addStage('Crossings', 1, 1 if skipped else 0, perf_counter() - start, 'passes')
+
+    def voyageJobs(self, manifest):
+        # Segment the tracks and make a job for each voyage
+        start = perf_counter()
+        segmenter = VoyageSegmenter()
+        segmenter.setInputPickleFilename(self.storeFilename())
+        segmenter.setTimeZone(self.timezone)
+        segmenter.segment()
+        voyages = segmenter.voyages(complete=not self.allVoyages)
+        if self.vessels is not None:
+            voyages = [voyage for voyage in voyages if voyage['IMO'] in self.vessels]
+
+        settings = {
+            'version': pipelineVersion,
+            'timezone': self.timezone,
+            'circleLatitude': self.ArcticCircleLatitude,
+            'kmz': self.kmz,
+            'simplify': self.simplifyTolerance
+        }
+        jobs = []
+        for voyage, window in zip(voyages, segmenter.windows(voyages)):
+            name = str(voyage['IMO']) + '_' + epochToLocal(voyage['startEpoch'], self.timezone).strftime('%Y-%m-%d_%H-%M-%S')
+            directory = os.path.join(self.outputDirectory, str(voyage['IMO']))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            prefix = os.path.join(directory, name)
+            suffix = ".kmz" if self.kmz else ".kml"
+            job = {
+                'name': name,
+                'store': self.storeFilename(),
+                'IMO': voyage['IMO'],
+                'startEpoch': voyage['startEpoch'],
+                'endEpoch': voyage['endEpoch'],
+                'window': window,
+                'settings': settings,
+                'dataFile': prefix + '.pkl',
+                'kmlPrefix': prefix,
+                'cache': self.cacheDirectory,
+                'instrument': self.reportFilename is not None,
+                'outputs': [prefix + '.pkl', prefix + '_Points' + suffix, prefix + '_LineString' + suffix],
+                'previousHash': manifest.get(name)
+            }
+            jobs.append(job)
+        self.addStage('Segment', len(voyages), 0, perf_counter() - start, 'voyages')
+        return jobs
+
+    def runJobs(self, jobs, manifest):
+        start = perf_counter()
+        if self.workers <= 1 or len(jobs) <= 1:
+            results = [runVoyageJob(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(runVoyageJob, jobs, chunksize=max(1, len(jobs) // (self.workers * 4))))
+        for result in results:
+            manifest[result['name']] = result['hash']
+            if self.reportFilename is not None:
+                instrumentation.merge(result['stages'])
+        skipped = sum(1 for result in results if result['skipped'])
+        self.addStage('Extract + KML', len(jobs), skipped, perf_counter() - start, 'voyages')
+        return results
+
+    def run(self):
+        if self.reportFilename is not None:
+            instrumentation.setProfile(self.profile)
+            instrumentation.setTraceMemory(self.traceMemory)
+            instrumentation.startRun()
+        start = perf_counter()
+        self.stages = []
+        if not os.path.isdir(self.outputDirectory):
+            os.makedirs(self.outputDirectory)
+        self.collate()
+        manifest = self.loadManifest()
+        self.crossings(manifest)
+        results = self.runJobs(self.voyageJobs(manifest), manifest)
+        self.writeManifest(manifest)
+        self.printSummary(results, perf_counter() - start)
+        if self.reportFilename is not None:
+            instrumentation.stopRun()
+            instrumentation.writeReport(self.reportFilename)
+            instrumentation.setEnabled(False)
+            print("Wrote the instrumentation report to " + self.reportFilename)
+
+    def printSummary(self, results, seconds):
+        print()
+        print("Pipeline summary ({} workers):".format(self.workers))
+        for stage in self.stages:
+            rate = stage['items'] / stage['seconds'] if stage['seconds'] > 0.0 else 0.0
+            print("{:<14} : {:>7} {:<8} ({:>7} skipped) in {:8.3f}s : {:10.1f} {}/s".format(stage['name'], stage['items'], stage['unit'], \
+                  stage['skipped'], stage['seconds'], rate, stage['unit']))
+        entries = sum(result['entries'] for result in results if not result['skipped'])
+        print("{:<14} : {:>7} entries extracted".format("Entries", entries))
+        print("{:<14} : {:8.3f}s".format("Total", seconds))
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Run Collate, ExtractData, ExtractCrossings and GenerateKML for every vessel and voyage")
+    parser.add_argument('--directory', default='.', help="The archive directory (Track_Vessel_UTC_* files). Default: .")
+    parser.add_argument('--output', default='Pipeline', help="The output directory. Default: Pipeline")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="The number of worker processes")
+    parser.add_argument('--timezone', default='UTC', help="The local time zone for the outputs, in pytz format. Default: UTC")
+    parser.add_argument('--circle', type=float, nargs=3, metavar=('DEG', 'MIN', 'SEC'), default=[66., 33., 0.],
+                        help="The Arctic Circle latitude. Default: 66 33 0 (the historical value)")
+    parser.add_argument('--vessels', type=int, nargs='+', metavar='IMO', help="Only these vessels. Default: all vessels")
+    parser.add_argument('--all-voyages', action='store_true', help="Include the voyages without a port call at both ends")
+    parser.add_argument('--kmz', action='store_true', help="Write compressed KMZ files")
+    parser.add_argument('--simplify', type=float, default=0.0, metavar='NM', help="Simplify the KML tracks to within NM Nautical Miles")
+    parser.add_argument('--cache', metavar='DIR', help="Keep the tracks, crossings and KML files in an artifact cache in DIR")
+    parser.add_argument('--report', metavar='FILE', help="Record the time, records and bytes of each stage and write a JSON report to FILE")
+    parser.add_argument('--profile', action='store_true', help="With --report, also list the slowest functions (cProfile)")
+    parser.add_argument('--trace-memory', action='store_true', help="With --report, also record the peak memory (tracemalloc)")
+    parser.add_argument('--force', action='store_true', help="Run every job, even if its inputs haven't changed")
+    args = parser.parse_args()
+
+    pipeline = RunPipeline()
+    pipeline.setDirectory(args.directory)
+    pipeline.setOutputDirectory(args.output)
+    pipeline.setWorkers(args.workers)
+    pipeline.setTimeZone(args.timezone)
+    pipeline.setArcticCircleDegMinSec(*args.circle)
+    pipeline.setVessels(args.vessels)
+    pipeline.setAllVoyages(args.all_voyages)
+    pipeline.setKMZ(args.kmz)
+    pipeline.setSimplifyTolerance(args.simplify)
+    pipeline.setForce(args.force)
+    pipeline.setCacheDirectory(args.cache)
+    pipeline.setReportFilename(args.report)
+    pipeline.setProfile(args.profile)
+    pipeline.setTraceMemory(args.trace_memory)
+    pipeline.run()
@@ -0,0 +1,178 @@
+# Simplify.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code simplifies vessel tracks, so that long tracks can be drawn and exported quickly.
+#
+# douglasPeucker keeps the fewest points which stay within tolerance Nautical Miles of the
+# original track (Ramer-Douglas-Peucker). The positions are first projected onto a flat plane
+# in Nautical Miles (x East, y North), which is accurate over the short distances involved.
+#
+# For time series (plots), lttb keeps the points which best preserve the shape of the line
+# (Largest-Triangle-Three-Buckets) and minMax keeps the minimum and maximum of each bucket,
+# so that peaks are never lost.
+#
+# The points either side of an Arctic Circle crossing can be passed as keep: they are always
+# kept, so the crossing calculated from the simplified track is exactly the same.
+#
+# TrackSimplifier caches the results, keyed on the data and the tolerance (or number of points),
+# so a track which is drawn or exported again is not simplified again. The data is identified by
+# a hash of its values, or by a name (e.g. the filename and its modification time) which is quicker.
+
+from collections import OrderedDict
+import hashlib
+import numpy as np # pip install numpy
+
+def projectNM(lat, lon):
+    # Return the (x, y) of each position in Nautical Miles, relative to the first position
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if len(lat) == 0:
+        return lat, lon
+    x = (lon - lon[0]) * 60. * np.cos(np.radians(lat))
+    y = (lat - lat[0]) * 60.
+    return x, y
+
+def douglasPeucker(x, y, tolerance):
+    # Return the indexes (ascending) of the points to keep. The first and last points are always kept
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= 2 or tolerance <= 0.0:
+        return np.arange(len(x))
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    ranges = [(0, len(x) - 1)]
+    while len(ranges) > 0:
+        first, last = ranges.pop()
+        if last - first < 2:
+            continue
+        # The distance of each point between first and last from the line (or point) joining them
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length = np.hypot(dx, dy)
+        if length > 0.0:
+            distances = np.abs((px * dy) - (py * dx)) / length
+        else:
+            distances = np.hypot(px, py)
+        furthest = int(np.argmax(distances))
+        if distances[furthest] > tolerance:
+            split = first + 1 + furthest
+            keep[split] = True
+            ranges.append((first, split))
+            ranges.append((split, last))
+    return np.flatnonzero(keep)
+
+def simplifyTrack(lat, lon, tolerance, keep=None):
+    # Return the indexes of the positions to keep, using douglasPeucker with tolerance in Nautical Miles
+    x, y = projectNM(lat, lon)
+    return withKeep(douglasPeucker(x, y, tolerance), keep)
+
+def lttb(x, y, points):
+    # Return the indexes (ascending) of points points, using Largest-Triangle-Three-Buckets.
+    # The points are bucketed by index, so x doesn't need to be in order
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if points >= len(x) or points < 3:
+        return np.arange(len(x))
+    # The first and last points are kept. The others are split into points - 2 buckets
+    edges = np.linspace(1, len(x) - 1, points - 1).astype(np.int64)
+    indexes = np.empty(points, dtype=np.int64)
+    indexes[0] = 0
+    indexes[-1] = len(x) - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # The average of the next bucket (or the last point)
+        if bucket < points - 3:
+            nextX = x[stop:edges[bucket + 2]].mean()
+            nextY = y[stop:edges[bucket + 2]].mean()
+        else:
+            nextX = x[-1]
+            nextY = y[-1]
+        # Keep the point which makes the largest triangle with the previous point and the next average
+        areas = np.abs(((x[previous] - nextX) * (y[start:stop] - y[previous])) - ((x[previous] - x[start:stop]) * (nextY - y[previous])))
+        previous = start + int(np.argmax(areas))
+        indexes[bucket + 1] = previous
+    return indexes
+
+def minMax(x, y, points):
+    # Return the indexes (ascending) of up to points points: the minimum and maximum y of each bucket
+    y = np.asarray(y, dtype=np.float64)
+    if points >= len(y) or points < 4:
+        return np.arange(len(y))
+    buckets = (points - 2) // 2
+    edges = np.linspace(1, len(y) - 1, buckets + 1).astype(np.int64)
+    indexes = [0, len(y) - 1]
+    for bucket in range(buckets):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if stop > start:
+            indexes.append(start + int(np.nanargmin(y[start:stop])) if not np.all(np.isnan(y[start:stop])) else start)
+            indexes.append(start + int(np.nanargmax(y[start:stop])) if not np.all(np.isnan(y[start:stop])) else start)
+    return np.unique(indexes)
+
+def withKeep(indexes, keep):
+    # Add the indexes in keep (e.g. the points either side of a crossing)
+    if keep is None or len(keep) == 0:
+        return indexes
+    return np.union1d(indexes, np.asarray(keep, dtype=np.int64))
+
+def crossingIndexes(values, threshold=0.0):
+    # Return the indexes of the points either side of each crossing of threshold
+    # (e.g. LATITUDE and the Arctic Circle latitude, or CIRCLE_NM and 0)
+    above = np.asarray(values, dtype=np.float64) > threshold
+    first = np.flatnonzero(above[1:] != above[:-1])
+    return np.union1d(first, first + 1)
+
+class TrackSimplifier():
+    def __init__(self):
+        self.cacheSize = 64 # The number of results to keep
+        self.cache = OrderedDict() # Least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def setCacheSize(self, size):
+        self.cacheSize = size
+        self.evict()
+
+    def evict(self):
+        while len(self.cache) > self.cacheSize:
+            self.cache.popitem(last=False)
+
+    def fingerprint(self, *arrays):
+        digest = hashlib.blake2b(digest_size=16)
+        for array in arrays:
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            digest.update(str(len(array)).encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def cached(self, key, calculate):
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        self.misses += 1
+        result = calculate()
+        result.setflags(write=False) # The cached result is shared
+        self.cache[key] = result
+        self.evict()
+        return result
+
+    def simplifyTrack(self, lat, lon, tolerance, keep=None, name=None):
+        # Douglas-Peucker (see simplifyTrack). Returns the indexes of the positions to keep
+        keep = [] if keep is None else list(keep)
+        key = ('douglasPeucker', self.fingerprint(lat, lon) if name is None else name, tolerance, tuple(keep))
+        return self.cached(key, lambda: simplifyTrack(lat, lon, tolerance, keep))
+
+    def downsample(self, x, y, points, method='lttb', keep=None, name=None):
+        # 'lttb' or 'minmax' (see lttb and minMax). Returns the indexes of the points to keep
+        keep = [] if keep is None else list(keep)
+        key = (method, self.fingerprint(x, y) if name is None else name, points, tuple(keep))
+        if method == 'minmax':
+            return self.cached(key, lambda: withKeep(minMax(x, y, points), keep))
+        return self.cached(key, lambda: withKeep(lttb(x, y, points), keep))
@@ -0,0 +1,73 @@
+# Speed_Profile.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code models how a vessel's speed changes between AIS samples, so the time taken to
+# travel a given distance can be calculated in closed form.
+#
+# Between two samples the speed changes linearly (constant acceleration), so the distance
+# travelled after t seconds is: (v * t + 0.5 * a * t^2) / 3600 Nautical Miles, with v in
+# Knots and a in Knots per second. timeToDistance solves this for t.
+# PiecewiseSpeedProfile uses every sample, including the intermediate samples between the
+# two entries either side of a crossing (see Extract_Crossings.py); LinearSpeedProfile uses
+# just the first and last.
+# Beyond the last sample, the speed is assumed to stay at the last speed.
+
+from bisect import bisect_right
+import math
+
+class PiecewiseSpeedProfile():
+    def __init__(self, times, speeds):
+        # times are in seconds (ascending), speeds are in Knots
+        self.times = [float(t) for t in times]
+        self.speeds = [float(v) for v in speeds]
+        # The distance travelled (NM) from the first sample to each sample
+        self.distances = [0.0]
+        for i in range(1, len(self.times)):
+            interval = self.times[i] - self.times[i - 1]
+            self.distances.append(self.distances[-1] + ((self.speeds[i - 1] + self.speeds[i]) * interval / 7200.))
+
+    def solveSegment(self, speed, acceleration, distance):
+        # Return the time (seconds) taken to travel distance (NM), starting at speed (Knots)
+        # with constant acceleration (Knots per second). None if the distance is never reached
+        distance *= 3600. # NM -> Knot-seconds
+        if distance <= 0.0:
+            return 0.0
+        if acceleration == 0.0:
+            if speed <= 0.0:
+                return None
+            return distance / speed
+        discriminant = (speed * speed) + (2. * acceleration * distance)
+        if discriminant < 0.0:
+            return None
+        root = math.sqrt(discriminant)
+        if speed + root > 0.0:
+            return 2. * distance / (speed + root) # Avoids cancellation when acceleration is small
+        return (root - speed) / acceleration
+
+    def timeToDistance(self, distance):
+        # Return the time (seconds, relative to the first sample) when distance (NM) has been travelled
+        if len(self.times) == 0:
+            return None
+        if distance <= 0.0:
+            return 0.0
+        segment = bisect_right(self.distances, distance) - 1
+        if segment >= len(self.times) - 1:
+            # Beyond the last sample: continue at the last speed
+            t = self.solveSegment(self.speeds[-1], 0.0, distance - self.distances[-1])
+        else:
+            interval = self.times[segment + 1] - self.times[segment]
+            acceleration = (self.speeds[segment + 1] - self.speeds[segment]) / interval if interval > 0.0 else 0.0
+            t = self.solveSegment(self.speeds[segment], acceleration, distance - self.distances[segment])
+            if t is not None:
+                t = min(t, interval) # Guard against rounding at the end of the segment
+        if t is None:
+            return None
+        return self.times[segment] - self.times[0] + t
+
+class LinearSpeedProfile(PiecewiseSpeedProfile):
+    def __init__(self, times, speeds):
+        # Only the first and last samples are used
+        PiecewiseSpeedProfile.__init__(self, [times[0], times[-1]], [speeds[0], speeds[-1]])
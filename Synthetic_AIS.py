@@ -0,0 +1,253 @@
+# Synthetic_AIS.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code generates synthetic AIS data for a fleet of vessels, in exactly the same format
+# as the Track_Vessel_UTC_*.json files written by Track_Vessel.py (the VesselFinder VESSELS API),
+# so the whole pipeline can be benchmarked at scale (see Benchmark.py).
+#
+# Each vessel sails the coastal route Nesna - Ørnes - Bodø and back, across the Arctic Circle,
+# with a port call at each port. The speed of each leg, the start of the schedule and the
+# interval between AIS reports are different for each vessel. All of the randomness comes from
+# a seeded generator, so the same settings always produce exactly the same files.
+# One poll is written every pollInterval seconds, containing an entry for every vessel: one
+# directory of JSON files per day, or one poll archive segment per day with setArchive (see Poll_Archive.py).
+#
+# The TIMESTAMP of each entry is the time of the vessel's last AIS report, so consecutive
+# polls often repeat the same entry, as they do in the real data.
+
+from datetime import datetime
+import calendar
+import json
+import os
+import numpy as np # pip install numpy
+import pytz # pip install pytz
+from Geodesy import trackDistancesNM
+
+# The route, south to north: (Latitude, Longitude, port name). None : a waypoint
+route = [
+    (66.20024, 13.00777, 'Nesna'),
+    (66.21722, 12.93515, None),
+    (66.30345, 12.93124, None),
+    (66.40003, 12.97476, None),
+    (66.49936, 12.98305, None),
+    (66.56346, 13.08493, None),
+    (66.62737, 13.08645, None),
+    (66.67384, 13.13985, None),
+    (66.71702, 13.18677, None),
+    (66.77193, 13.26184, None),
+    (66.81260, 13.48791, None),
+    (66.86902, 13.70273, 'Ørnes'),
+    (66.93000, 13.62000, None),
+    (67.02000, 13.75000, None),
+    (67.12000, 14.00000, None),
+    (67.22000, 14.25000, None),
+    (67.28500, 14.39200, 'Bodø')
+]
+
+# Northbound vessels are bound for Kirkenes, southbound for Bergen
+destinations = {
+    True: ('NO KKN', 'NOKKN'),
+    False: ('NO BGO', 'NOBGO')
+}
+
+def imoCheckDigit(digits):
+    # The IMO check digit: the sum of the first six digits multiplied by 7, 6, 5, 4, 3, 2
+    return sum(int(digit) * (7 - i) for i, digit in enumerate(str(digits))) % 10
+
+class SyntheticAIS():
+    def __init__(self):
+        self.directory = '.'
+        self.archive = None
+        self.vessels = 10
+        self.days = 1
+        self.startDate = '2024-11-23' # UTC
+        self.pollInterval = 60 # Seconds
+        self.cruiseSpeed = 14.5 # Knots
+        self.portCall = 15 * 60 # Seconds alongside at Nesna and Ørnes
+        self.turnaround = 60 * 60 # Seconds alongside at Bodø and back at Nesna
+        self.seed = 0
+
+        # The route
+        self.lat = np.array([point[0] for point in route])
+        self.lon = np.array([point[1] for point in route])
+        self.distance = np.concatenate(([0.0], np.cumsum(trackDistancesNM(self.lat, self.lon)))) # Along the route (NM)
+        self.ports = [i for i, point in enumerate(route) if point[2] is not None]
+
+        # The bearing of each leg of the route (degrees)
+        lat1, lat2 = np.radians(self.lat[:-1]), np.radians(self.lat[1:])
+        dlon = np.radians(self.lon[1:] - self.lon[:-1])
+        self.bearing = np.degrees(np.arctan2(np.sin(dlon) * np.cos(lat2), \
+                       (np.cos(lat1) * np.sin(lat2)) - (np.sin(lat1) * np.cos(lat2) * np.cos(dlon)))) % 360.
+
+    def setDirectory(self, directory):
+        self.directory = directory
+
+    def setArchive(self, archive):
+        # Append the polls to a PollArchive (see Poll_Archive.py) instead of writing JSON files
+        self.archive = archive
+
+    def setVessels(self, vessels):
+        self.vessels = vessels
+
+    def setDays(self, days):
+        self.days = days
+
+    def setStartDate(self, date):
+        # The first day, in UTC: YYYY-MM-DD
+        self.startDate = date
+
+    def setPollInterval(self, seconds):
+        self.pollInterval = seconds
+
+    def setCruiseSpeed(self, knots):
+        self.cruiseSpeed = knots
+
+    def setSeed(self, seed):
+        self.seed = seed
+
+    def startEpoch(self):
+        return calendar.timegm(datetime.strptime(self.startDate, '%Y-%m-%d').timetuple())
+
+    def pollEpochs(self):
+        return self.startEpoch() + (np.arange((self.days * 24 * 60 * 60) // self.pollInterval, dtype=np.int64) * self.pollInterval)
+
+    def vesselIMO(self, vessel):
+        digits = 910000 + vessel
+        return (digits * 10) + imoCheckDigit(digits)
+
+    def schedule(self, rng, start, end):
+        # The knots of the vessel's timeline: epochs and distances along the route (piecewise linear)
+        # and, for each piece, the speed, the direction and the time of arrival at the end of the route
+        portDistances = [self.distance[port] for port in self.ports]
+        legs = [(portDistances[i], portDistances[i + 1]) for i in range(len(portDistances) - 1)]
+        legs = legs + [(second, first) for first, second in reversed(legs)] # Northbound then southbound
+
+        # Start part of the way through a round trip, so the vessels are spread along the route
+        epoch = float(start) - rng.uniform(0.0, 2 * (portDistances[-1] / self.cruiseSpeed) * 3600.)
+        epochs = [epoch]
+        distances = [legs[0][0]]
+        speeds = []
+        northbound = []
+        while epoch < end:
+            for first, second in legs:
+                # Alongside. The turnaround is at each end of the route
+                dwell = self.turnaround if first in (portDistances[0], portDistances[-1]) else self.portCall
+                epoch += dwell
+                epochs.append(epoch)
+                distances.append(first)
+                speeds.append(0.0)
+                northbound.append(second > first)
+
+                # Under way
+                speed = self.cruiseSpeed * rng.uniform(0.93, 1.05)
+                epoch += abs(second - first) / speed * 3600.
+                epochs.append(epoch)
+                distances.append(second)
+                speeds.append(speed)
+                northbound.append(second > first)
+
+        # The time of the next arrival at either end of the route, for each piece
+        epochs = np.array(epochs)
+        distances = np.array(distances)
+        speeds = np.array(speeds)
+        arrived = np.zeros(len(epochs), dtype=bool)
+        arrived[1:] = (speeds > 0.0) & np.isin(distances[1:], [portDistances[0], portDistances[-1]])
+        ends = np.flatnonzero(arrived)
+        arrivals = epochs[ends[np.minimum(np.searchsorted(ends, np.arange(1, len(epochs)), 'left'), len(ends) - 1)]]
+        return epochs, distances, speeds, np.array(northbound), arrivals
+
+    def vesselEntries(self, vessel, polls):
+        # The AIS entries of one vessel for each poll
+        rng = np.random.default_rng([self.seed, vessel])
+        epochs, distances, speeds, northbound, arrivals = self.schedule(rng, polls[0], polls[-1])
+
+        # The time of the last AIS report before each poll. The data is at least 10 seconds old
+        interval = int(rng.integers(60, 180))
+        phase = int(rng.integers(0, interval))
+        reports = phase + (((polls - 10 - phase) // interval) * interval)
+
+        # The position, speed and course at each report
+        piece = np.clip(np.searchsorted(epochs, reports, 'right') - 1, 0, len(speeds) - 1)
+        distance = np.interp(reports, epochs, distances)
+        lat = np.interp(distance, self.distance, self.lat)
+        lon = np.interp(distance, self.distance, self.lon)
+        leg = np.clip(np.searchsorted(self.distance, distance, 'right') - 1, 0, len(self.bearing) - 1)
+        course = np.where(northbound[piece], self.bearing[leg], (self.bearing[leg] + 180.) % 360.)
+        moving = speeds[piece] > 0.0
+        speed = np.where(moving, np.maximum(speeds[piece] + rng.normal(0.0, 0.3, len(polls)), 0.0), 0.0)
+        heading = np.round(course + rng.normal(0.0, 2.0, len(polls))).astype(np.int64) % 360
+
+        IMO = self.vesselIMO(vessel)
+        entries = []
+        for i in range(len(polls)):
+            destination, locode = destinations[bool(northbound[piece[i]])]
+            eta = datetime.fromtimestamp(int(arrivals[piece[i]]) // 60 * 60, pytz.UTC)
+            entry = {"AIS": {
+                "MMSI": 257900000 + vessel,
+                "TIMESTAMP": datetime.fromtimestamp(int(reports[i]), pytz.UTC).strftime('%Y-%m-%d %H:%M:%S UTC'),
+                "LATITUDE": round(float(lat[i]), 5),
+                "LONGITUDE": round(float(lon[i]), 5),
+                "COURSE": round(float(course[i]), 1),
+                "SPEED": round(float(speed[i]), 1),
+                "HEADING": int(heading[i]),
+                "NAVSTAT": 0 if moving[i] else 5, # Under way using engine, or moored
+                "IMO": IMO,
+                "NAME": "SYNTHETIC {:04d}".format(vessel),
+                "CALLSIGN": "LS{:04d}".format(vessel),
+                "TYPE": 60,
+                "A": 33,
+                "B": 90,
+                "C": 15,
+                "D": 3,
+                "DRAUGHT": 5.1,
+                "DESTINATION": destination,
+                "LOCODE": locode,
+                "ETA_AIS": eta.strftime('%m-%d %H:%M'),
+                "ETA": eta.strftime('%Y-%m-%d %H:%M:%S'),
+                "SRC": "TER",
+                "ZONE": "North East Atlantic Ocean",
+                "ECA": False,
+                "DISTANCE_REMAINING": None,
+                "ETA_PREDICTED": None
+            }}
+            entries.append(json.dumps(entry, separators=(',', ':')))
+        return entries
+
+    def generate(self):
+        # Write the polls. Returns the number of polls written
+        polls = self.pollEpochs()
+        fleet = [self.vesselEntries(vessel, polls) for vessel in range(self.vessels)]
+
+        for i in range(len(polls)):
+            result = '[' + ','.join(entries[i] for entries in fleet) + ']'
+            dt = datetime.fromtimestamp(int(polls[i]), pytz.UTC)
+            if self.archive is not None:
+                self.archive.append(result, dt)
+                continue
+            # One directory per day, like the directories written by Track_Vessel.py
+            directory = os.path.join(self.directory, dt.strftime('Track_Vessel_UTC_%Y-%m-%d_00-00-00'))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(os.path.join(directory, dt.strftime('Track_Vessel_UTC_%Y-%m-%d_%H-%M-%S.json')), 'w') as f:
+                f.write(result)
+
+        return len(polls)
+
+if __name__ == '__main__':
+
+    synthetic = SyntheticAIS()
+    synthetic.setDirectory('Synthetic_AIS')
+    synthetic.setVessels(10)
+    synthetic.setDays(1)
+    polls = synthetic.generate()
+    print("Wrote {} polls of {} vessels to {}".format(polls, synthetic.vessels, synthetic.directory))
+
+    # Or write them to a poll archive
+    #from Poll_Archive import PollArchive
+    #archive = PollArchive()
+    #archive.setDirectory('Synthetic_AIS')
+    #synthetic.setArchive(archive)
+    #synthetic.generate()
@@ -0,0 +1,71 @@
+# Timestamps.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code converts the AIS 'TIMESTAMP' strings ("%Y-%m-%d %H:%M:%S UTC") to integer
+# epoch seconds, so they only need to be parsed once.
+#
+# parseTimestamps converts an array of timestamps in one vectorized NumPy call.
+# parseTimestamp converts a single timestamp and is memoized, because the same timestamp
+# is often seen many times (duplicate AIS entries, or the same entry in several files).
+# Conversion to local time is only needed for output and is done in a batch by localDatetimes.
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+import calendar
+import pytz # pip install pytz
+import numpy as np # pip install numpy
+
+timestampFormat = "%Y-%m-%d %H:%M:%S UTC"
+windowFormat = "%Y-%m-%d %H:%M:%S"
+epochStart = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+@lru_cache(maxsize=65536)
+def parseTimestamp(timestamp):
+    # Slicing is much quicker than strptime. Fall back to strptime for anything unexpected
+    # Raises ValueError if the timestamp is not a string in timestampFormat (e.g. None)
+    if not isinstance(timestamp, str):
+        raise ValueError("Invalid AIS TIMESTAMP: " + repr(timestamp))
+    if len(timestamp) == 23 and timestamp[19:] == ' UTC':
+        try:
+            return calendar.timegm((int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]), \
+                                    int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19])))
+        except ValueError:
+            pass
+    return calendar.timegm(datetime.strptime(timestamp, timestampFormat).timetuple())
+
+def parseTimestamps(timestamps):
+    # If every timestamp is a 23 character string ending in " UTC", truncating to 19 characters
+    # removes the " UTC" and NumPy parses the rest directly. Anything else (e.g. None, or a
+    # different suffix) is parsed one at a time by parseTimestamp, which raises ValueError if it is invalid
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+    text = np.asarray(timestamps)
+    if text.dtype.kind == 'U' and np.all(np.char.str_len(text) == 23) and np.all(np.char.endswith(text, ' UTC')):
+        try:
+            return text.astype('U19').astype('datetime64[s]').astype(np.int64)
+        except ValueError:
+            pass
+    return np.array([parseTimestamp(timestamp) for timestamp in timestamps], dtype=np.int64)
+
+@lru_cache(maxsize=1024)
+def localToDatetime(tz, text):
+    # Convert a local time ("%Y-%m-%d %H:%M:%S", tz in pytz format) to a timezone-aware datetime
+    return pytz.timezone(tz).localize(datetime.strptime(text, windowFormat))
+
+def localToEpoch(tz, text):
+    return int(localToDatetime(tz, text).timestamp())
+
+def epochToUTC(epoch):
+    # epoch can be fractional. The result is rounded to the nearest microsecond
+    return epochStart + timedelta(seconds=epoch)
+
+def epochToLocal(epoch, tz):
+    return epochToUTC(epoch).astimezone(pytz.timezone(tz))
+
+def localDatetimes(epochs, tz):
+    # Convert epoch seconds to timezone-aware local datetimes, in a single batch
+    timezone = pytz.timezone(tz)
+    return [datetime.fromtimestamp(epoch, timezone) for epoch in np.asarray(epochs).tolist()]
@@ -0,0 +1,117 @@
+# Track_Index.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code builds an index for a TrackStore (see Track_Store.py) so that the entries for
+# one vessel and one time window can be found without scanning every entry.
+# The entry offsets are sorted by IMO and then by EPOCH (the sort is stable, so entries with
+# the same timestamp stay in collation order). Each vessel is a contiguous slice of the
+# sorted offsets and a time window is found with a binary search.
+#
+# The index is saved alongside the store (index.npz inside a columnar store, or
+# <name>_Index.npz next to a pickle file) and is rebuilt automatically if the store changes.
+
+import os
+import numpy as np # pip install numpy
+from Instrumentation import instrumentation
+
+class TrackIndex():
+    version = 1
+
+    def __init__(self):
+        self.IMOs = np.zeros(0, dtype=np.int64) # The unique IMOs, sorted
+        self.starts = np.zeros(0, dtype=np.int64) # The start of each IMO's slice of order
+        self.stops = np.zeros(0, dtype=np.int64) # The end of each IMO's slice of order
+        self.firstSeen = np.zeros(0, dtype=np.int64) # The offset of the first entry for each IMO
+        self.order = np.zeros(0, dtype=np.int64) # The entry offsets, sorted by IMO then EPOCH
+        self.epoch = np.zeros(0, dtype=np.int64) # The EPOCH of each entry in order
+        self.fingerprint = np.zeros(0, dtype=np.int64) # Identifies the store the index was built for
+
+    @classmethod
+    def build(cls, store):
+        index = cls()
+        IMOs = np.asarray(store.column('IMO')).astype(np.int64)
+        epoch = np.asarray(store.epoch)
+        index.order = np.lexsort((epoch, IMOs)).astype(np.int64)
+        sortedIMOs = IMOs[index.order]
+        index.epoch = epoch[index.order]
+        index.IMOs, index.starts = np.unique(sortedIMOs, return_index=True)
+        index.starts = index.starts.astype(np.int64)
+        index.stops = np.append(index.starts[1:], len(sortedIMOs)).astype(np.int64)
+        index.firstSeen = np.array([index.order[start:stop].min() for start, stop in zip(index.starts, index.stops)], dtype=np.int64)
+        return index
+
+    @classmethod
+    def indexFilename(cls, storePath):
+        if os.path.isdir(storePath):
+            return os.path.join(storePath, 'index.npz')
+        return os.path.splitext(storePath)[0] + '_Index.npz'
+
+    @classmethod
+    def storeFingerprint(cls, store, storePath):
+        if os.path.isdir(storePath):
+            stat = os.stat(os.path.join(storePath, 'schema.json'))
+        else:
+            stat = os.stat(storePath)
+        return np.array([cls.version, len(store), stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @classmethod
+    def forStore(cls, store, storePath):
+        # Load the saved index for this store. Build and save it if it is missing or out of date
+        with instrumentation.stage('TrackIndex.forStore'):
+            fingerprint = cls.storeFingerprint(store, storePath)
+            filename = cls.indexFilename(storePath)
+            if os.path.isfile(filename):
+                index = cls.load(filename)
+                if np.array_equal(index.fingerprint, fingerprint):
+                    return index
+            index = cls.build(store)
+            index.fingerprint = fingerprint
+            index.save(filename)
+            return index
+
+    @classmethod
+    def load(cls, filename):
+        index = cls()
+        with np.load(filename) as data:
+            for name in ['IMOs', 'starts', 'stops', 'firstSeen', 'order', 'epoch', 'fingerprint']:
+                setattr(index, name, data[name])
+        return index
+
+    def save(self, filename):
+        # Write to a temporary file first, then replace the index. A reader (e.g. another worker
+        # process) never sees a partly written index
+        tmpFilename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpFilename, 'wb') as f: # Passing a file object stops savez adding .npz to the name
+            np.savez(f, IMOs=self.IMOs, starts=self.starts, stops=self.stops, firstSeen=self.firstSeen,
+                     order=self.order, epoch=self.epoch, fingerprint=self.fingerprint)
+        os.replace(tmpFilename, filename)
+
+    def vessels(self):
+        # Return the IMOs in the order they first appear in the store
+        return [int(IMO) for IMO in self.IMOs[np.argsort(self.firstSeen)]]
+
+    def vesselSlice(self, IMO):
+        # Return the (start, stop) of the vessel's slice of order, or None if the vessel is not in the store
+        i = np.searchsorted(self.IMOs, IMO)
+        if i >= len(self.IMOs) or self.IMOs[i] != IMO:
+            return None
+        return int(self.starts[i]), int(self.stops[i])
+
+    def query(self, IMO, startEpoch=None, endEpoch=None, before=0):
+        # Return the offsets of the vessel's entries with startEpoch <= EPOCH <= endEpoch, in time order.
+        # before includes that many of the vessel's entries immediately preceding the window
+        vesselSlice = self.vesselSlice(IMO)
+        if vesselSlice is None:
+            return np.zeros(0, dtype=np.int64)
+        start, stop = vesselSlice
+        first = start
+        last = stop
+        if startEpoch is not None:
+            first = start + int(np.searchsorted(self.epoch[start:stop], startEpoch, side='left'))
+        if endEpoch is not None:
+            last = start + int(np.searchsorted(self.epoch[start:stop], endEpoch, side='right'))
+        first = max(start, first - before)
+        return self.order[first:last]
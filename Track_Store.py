@@ -0,0 +1,401 @@
+# Track_Store.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code provides a columnar store for the AIS data collated by Collate.py.
+# Instead of a list of dicts, each AIS field is held as a single typed NumPy array:
+# IMO, LATITUDE, LONGITUDE, SPEED, COURSE, HEADING etc. are stored as int64 / float64,
+# strings like NAME and DESTINATION are interned (a table of unique values plus an
+# int32 code per entry). The TIMESTAMP is also stored as integer epoch seconds (EPOCH).
+#
+# The store is saved as a directory of .npy files (one per field) which are
+# memory-mapped when the store is loaded. record(i) returns a lazy, read-only,
+# dict-like view of entry i. Legacy pickle files written by Collate.py can be opened
+# with TrackStore.open too. Converting a large pickle file each time is slow, so
+# TrackStore.convertPickle can save the converted store next to it (<name>_Store);
+# the converted store is then opened instead of the pickle file.
+
+from collections.abc import Mapping
+import io
+import os
+import json
+import pickle
+import shutil
+import numpy as np # pip install numpy
+from Timestamps import parseTimestamps
+from Instrumentation import instrumentation, pathBytes
+
+# Load a pickle file written by Collate. The file can contain several pickled lists
+# (one per incremental collation). They are concatenated into a single list of dicts.
+def loadVesselData(filename):
+    vesselData = []
+    with open(filename, 'rb') as f:
+        while True:
+            try:
+                vesselData.extend(pickle.load(f))
+            except EOFError:
+                break
+    return vesselData
+
+# Add the values of partTable to table (and lookup), and return partCodes converted to the codes of table
+def internCodes(table, lookup, partTable, partCodes):
+    remap = np.empty(len(partTable) + 1, dtype=np.int32)
+    remap[-1] = -1 # Missing stays missing
+    for i, value in enumerate(partTable):
+        code = lookup.get((type(value), value))
+        if code is None:
+            code = len(table)
+            lookup[(type(value), value)] = code
+            table.append(value)
+        remap[i] = code
+    return remap[partCodes]
+
+# Append values to a .npy file in place. The file is first truncated to length entries (discarding
+# anything left by an interrupted append), then the values are written and the shape in the header
+# is updated. Returns False if the file can not be extended in place
+def appendNpy(filename, length, values):
+    with open(filename, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+        headerLength = f.tell()
+        if fortranOrder or len(shape) != 1 or dtype != values.dtype or dtype.hasobject:
+            return False
+        # numpy pads the header so that the shape can grow without changing its length
+        header = io.BytesIO()
+        writeHeader = np.lib.format.write_array_header_1_0 if version == (1, 0) else np.lib.format.write_array_header_2_0
+        writeHeader(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (length + len(values),)})
+        if len(header.getvalue()) != headerLength:
+            return False
+        f.seek(headerLength + (length * dtype.itemsize))
+        f.truncate()
+        f.write(np.ascontiguousarray(values).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+class TrackRecord(Mapping):
+    # A lazy view of a single entry in a TrackStore. Values are only decoded when accessed.
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.store.value(key, self.index)
+
+    def __iter__(self):
+        for key in self.store.keys:
+            if self.store.hasValue(key, self.index):
+                yield key
+
+    def __len__(self):
+        return sum(1 for key in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class TrackStore():
+    version = 1
+
+    def __init__(self):
+        self.keys = [] # The AIS field names, in entry order
+        self.kinds = {} # The kind of each field: 'float', 'int', 'bool' or 'object' (interned)
+        self.columns = {} # The values (or the interned codes) of each field
+        self.tables = {} # The unique values of each 'object' field. Code -1 indicates a missing field
+        self.epoch = np.zeros(0, dtype=np.int64) # TIMESTAMP as UTC epoch seconds
+        self.length = 0
+        self.records = None # The original list of dicts, if the store was built from one
+
+    def __len__(self):
+        return self.length
+
+    @classmethod
+    def fromRecords(cls, records):
+        store = cls()
+        store.length = len(records)
+        store.records = records
+
+        for record in records:
+            for key in record.keys():
+                if key not in store.kinds:
+                    store.kinds[key] = None
+                    store.keys.append(key)
+
+        missing = object()
+        for key in store.keys:
+            values = [record.get(key, missing) for record in records]
+            types = set(type(value) for value in values)
+            if types == {float}:
+                store.kinds[key] = 'float'
+                store.columns[key] = np.array(values, dtype=np.float64)
+            elif types == {int}:
+                store.kinds[key] = 'int'
+                store.columns[key] = np.array(values, dtype=np.int64)
+            elif types == {bool}:
+                store.kinds[key] = 'bool'
+                store.columns[key] = np.array(values, dtype=np.bool_)
+            else:
+                # Intern the values. Include the type in the lookup so that 0, 0.0 and False stay distinct
+                store.kinds[key] = 'object'
+                table = []
+                lookup = {}
+                codes = np.empty(len(values), dtype=np.int32)
+                for i, value in enumerate(values):
+                    if value is missing:
+                        codes[i] = -1
+                        continue
+                    code = lookup.get((type(value), value))
+                    if code is None:
+                        code = len(table)
+                        lookup[(type(value), value)] = code
+                        table.append(value)
+                    codes[i] = code
+                store.tables[key] = table
+                store.columns[key] = codes
+
+        # Parse each unique TIMESTAMP once, in a single vectorized call
+        # Every entry needs a TIMESTAMP: code -1 (missing) would otherwise select the last timestamp
+        if 'TIMESTAMP' in store.tables:
+            missing = int(np.count_nonzero(store.columns['TIMESTAMP'] < 0))
+            if missing > 0:
+                raise ValueError("{} AIS entries have no TIMESTAMP".format(missing))
+            store.epoch = parseTimestamps(store.tables['TIMESTAMP'])[store.columns['TIMESTAMP']]
+        else:
+            store.epoch = np.zeros(store.length, dtype=np.int64)
+
+        return store
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        store = cls()
+        with open(os.path.join(path, 'schema.json'), 'r') as f:
+            schema = json.loads(f.read())
+        if schema['version'] != cls.version:
+            raise ValueError("Unsupported track store version: " + str(schema['version']))
+        with open(os.path.join(path, 'tables.json'), 'r') as f:
+            store.tables = json.loads(f.read())
+        store.keys = schema['keys']
+        store.kinds = schema['kinds']
+        store.length = schema['length']
+        mmapMode = 'r' if mmap else None
+        # A column file can be longer than the store if an append was interrupted
+        for key in store.keys:
+            store.columns[key] = np.load(os.path.join(path, key + '.npy'), mmap_mode=mmapMode)[:store.length]
+        store.epoch = np.load(os.path.join(path, 'EPOCH.npy'), mmap_mode=mmapMode)[:store.length]
+        return store
+
+    @classmethod
+    def open(cls, path):
+        # Open a columnar store (a directory) or a legacy pickle file written by Collate.py
+        with instrumentation.stage('TrackStore.open') as stage:
+            if os.path.isdir(path):
+                store = cls.load(path)
+            else:
+                store = cls.fromRecords(loadVesselData(path))
+            stage.count(records=len(store))
+            if instrumentation.enabled:
+                stage.count(bytesRead=pathBytes(path))
+        return store
+
+    @classmethod
+    def convertedFilename(cls, picklePath):
+        return os.path.splitext(picklePath)[0] + '_Store'
+
+    @classmethod
+    def convertPickle(cls, path):
+        # Save a pickle file as a store next to it (<name>_Store) and return the store's path.
+        # Nothing is written if the store is up to date. It is converted again if the pickle file changes
+        convertedPath = cls.convertedFilename(path)
+        stat = os.stat(path)
+        source = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        sourceFilename = os.path.join(convertedPath, 'source.json')
+        if os.path.isfile(sourceFilename):
+            with open(sourceFilename, 'r') as f:
+                if json.loads(f.read()) == source:
+                    return convertedPath
+        cls.fromRecords(loadVesselData(path)).save(convertedPath, {'source.json': source})
+        return convertedPath
+
+    @classmethod
+    def concatenate(cls, stores):
+        store = cls()
+        for part in stores:
+            store.length += part.length
+            for key in part.keys:
+                if key not in store.kinds:
+                    store.kinds[key] = part.kinds[key]
+                    store.keys.append(key)
+                elif store.kinds[key] != part.kinds[key]:
+                    store.kinds[key] = 'object'
+            # A field which is missing from any part has to be interned so it can be flagged as missing
+            for key in store.keys:
+                if key not in part.kinds:
+                    store.kinds[key] = 'object'
+
+        for key in store.keys:
+            if store.kinds[key] != 'object':
+                store.columns[key] = np.concatenate([part.columns[key] for part in stores])
+                continue
+            table = []
+            lookup = {}
+            allCodes = []
+            for part in stores:
+                if key not in part.kinds:
+                    allCodes.append(np.full(part.length, -1, dtype=np.int32))
+                    continue
+                partTable, partCodes = part.internedColumn(key)
+                allCodes.append(internCodes(table, lookup, partTable, partCodes))
+            store.tables[key] = table
+            store.columns[key] = np.concatenate(allCodes).astype(np.int32)
+
+        store.epoch = np.concatenate([part.epoch for part in stores])
+        return store
+
+    def save(self, path, extraFiles=None):
+        # Write to a temporary directory first, then swap it into place. The temporary names include
+        # the process id, so processes saving the same store do not remove each other's files.
+        # extraFiles maps a filename to a value written (as JSON) with the store, before the swap
+        tmpPath = path + '.' + str(os.getpid()) + '.tmp'
+        oldPath = path + '.' + str(os.getpid()) + '.old'
+        if os.path.isdir(tmpPath):
+            shutil.rmtree(tmpPath)
+        os.makedirs(tmpPath)
+        for key in self.keys:
+            np.save(os.path.join(tmpPath, key + '.npy'), np.asarray(self.columns[key]))
+        np.save(os.path.join(tmpPath, 'EPOCH.npy'), np.asarray(self.epoch))
+        with open(os.path.join(tmpPath, 'tables.json'), 'w') as f:
+            f.write(json.dumps(self.tables))
+        schema = {
+            'version': self.version,
+            'length': self.length,
+            'keys': self.keys,
+            'kinds': self.kinds
+        }
+        with open(os.path.join(tmpPath, 'schema.json'), 'w') as f:
+            f.write(json.dumps(schema))
+        for filename, value in (extraFiles or {}).items():
+            with open(os.path.join(tmpPath, filename), 'w') as f:
+                f.write(json.dumps(value))
+        if os.path.isdir(path):
+            os.rename(path, oldPath)
+            os.rename(tmpPath, path)
+            shutil.rmtree(oldPath)
+        else:
+            os.rename(tmpPath, path)
+
+    def append(self, path):
+        # Append the entries to the store saved at path, extending each column file in place.
+        # Only the new values, the tables and the schema are written, so an incremental collation
+        # does not rewrite the whole store. The schema is written last: if the append is interrupted,
+        # load ignores the extra values and the next append overwrites them.
+        # Falls back to concatenate and save if a field has changed kind (e.g. int to float)
+        if not os.path.isdir(path):
+            self.save(path)
+            return
+        with open(os.path.join(path, 'schema.json'), 'r') as f:
+            schema = json.loads(f.read())
+        if schema['version'] != self.version:
+            raise ValueError("Unsupported track store version: " + str(schema['version']))
+        kinds = schema['kinds']
+        length = schema['length']
+        for key in self.keys:
+            if key in kinds and kinds[key] != self.kinds[key] and kinds[key] != 'object':
+                return self.rewrite(path)
+        for key in kinds:
+            if key not in self.kinds and kinds[key] != 'object':
+                return self.rewrite(path) # Only an interned field can be flagged as missing
+
+        with open(os.path.join(path, 'tables.json'), 'r') as f:
+            tables = json.loads(f.read())
+        keys = list(schema['keys'])
+        for key in self.keys:
+            if key not in kinds:
+                # A new field. Add a column flagging it as missing from all of the existing entries
+                keys.append(key)
+                kinds[key] = 'object'
+                tables[key] = []
+                np.save(os.path.join(path, key + '.npy'), np.full(length, -1, dtype=np.int32))
+
+        for key in keys:
+            if kinds[key] == 'object':
+                table = tables[key]
+                lookup = {(type(value), value): code for code, value in enumerate(table)}
+                if key in self.kinds:
+                    partTable, partCodes = self.internedColumn(key)
+                    values = internCodes(table, lookup, partTable, partCodes)
+                else:
+                    values = np.full(self.length, -1, dtype=np.int32)
+            else:
+                values = np.asarray(self.columns[key])
+            if not appendNpy(os.path.join(path, key + '.npy'), length, values):
+                return self.rewrite(path)
+        if not appendNpy(os.path.join(path, 'EPOCH.npy'), length, np.asarray(self.epoch, dtype=np.int64)):
+            return self.rewrite(path)
+
+        # The tables only grow, so the existing codes stay valid even if the schema is not written
+        schema['keys'] = keys
+        schema['kinds'] = kinds
+        schema['length'] = length + self.length
+        for filename, contents in (('tables.json', tables), ('schema.json', schema)):
+            tmpFilename = os.path.join(path, filename + '.tmp')
+            with open(tmpFilename, 'w') as f:
+                f.write(json.dumps(contents))
+            os.replace(tmpFilename, os.path.join(path, filename))
+
+    def rewrite(self, path):
+        # Append by concatenating with the saved store and saving the whole store
+        TrackStore.concatenate([TrackStore.load(path, mmap=False), self]).save(path)
+
+    def internedColumn(self, key):
+        # Return the field as a table of unique values and a code per entry
+        if self.kinds[key] == 'object':
+            return self.tables[key], np.asarray(self.columns[key])
+        table, codes = np.unique(np.asarray(self.columns[key]), return_inverse=True)
+        return table.tolist(), codes # Back to Python float / int / bool
+
+    def hasValue(self, key, index):
+        if key not in self.kinds:
+            return False
+        if self.kinds[key] == 'object':
+            return self.columns[key][index] >= 0
+        return True
+
+    def value(self, key, index):
+        if self.records is not None:
+            return self.records[index][key]
+        if not self.hasValue(key, index):
+            raise KeyError(key)
+        if self.kinds[key] == 'object':
+            return self.tables[key][self.columns[key][index]]
+        return self.columns[key][index].item() # Convert to a Python float / int / bool
+
+    def column(self, key):
+        # Return the field as a NumPy array. Interned fields are converted to float
+        # if they are numeric, with None (or missing) as NaN
+        if self.kinds[key] != 'object':
+            return self.columns[key]
+        table = self.tables[key]
+        if all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in table):
+            values = np.array([np.nan if value is None else value for value in table] + [np.nan], dtype=np.float64)
+        else:
+            values = np.array(table + [None], dtype=object)
+        return values[self.columns[key]] # Code -1 selects the trailing NaN / None
+
+    def record(self, index):
+        if self.records is not None:
+            return self.records[index]
+        return TrackRecord(self, index)
+
+    def iterRecords(self, indexes=None):
+        if indexes is None:
+            indexes = range(self.length)
+        for index in indexes:
+            yield self.record(index)
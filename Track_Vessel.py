@@ -5,21 +5,78 @@
 # Licence: MIT
 #
 # This code will track a single vessel, or multiple vessels, for the time windows defined in the code.
-# Each url request is written to a separate file.
+# Each url request is written to a separate file, or appended to a daily poll archive
+# segment (see Poll_Archive.py) with setArchive.
+# With setScheduler (an AdaptiveScheduler, see Adaptive_Scheduler.py), each poll only requests
+# the vessels which are due, and the credits used per crossing are printed at the end.
 
 from datetime import datetime
 import pytz # pip install pytz
 import urllib.request
-from time import sleep
+from time import sleep, time
+import os
+import json
+import traceback
+from Timestamps import localToDatetime
+from Instrumentation import instrumentation
+
+# Write the result of a VESSELS API request to file. Return the filename
+# If several requests complete in the same second (e.g. several trackers running
+# concurrently), their AIS entries are combined into the one file
+# With a PollArchive (see Poll_Archive.py), the result is appended to the archive instead
+def writeResult(result, archive=None):
+    dt = datetime.now(pytz.UTC) # Use UTC for the file name
+    if archive is not None:
+        with instrumentation.stage('writeResult') as stage:
+            filename = archive.append(result, dt)
+            stage.count(records=1, bytesWritten=len(result))
+        print("Archived JSON to " + filename + " :")
+        print(result)
+        return filename
+    filename = dt.strftime("Track_Vessel_UTC_%Y-%m-%d_%H-%M-%S.json")
+    with instrumentation.stage('writeResult') as stage:
+        if os.path.isfile(filename):
+            with open(filename, 'r') as f:
+                jsonData = json.loads(f.read())
+            jsonData.extend(json.loads(result))
+            with open(filename, 'w') as f:
+                f.write(json.dumps(jsonData))
+        else:
+            with open(filename, 'w') as f:
+                f.write(result)
+        stage.count(records=1, bytesWritten=len(result))
+    print("Wrote JSON to " + filename + " :")
+    print(result)
+    return filename
+
+# Combine the results of several VESSELS API requests into one JSON list
+# Return None if none of the requests returned AIS data
+def mergeResults(results):
+    results = [result for result in results if result is not None and 'AIS' in result]
+    if len(results) == 0:
+        return None
+    if len(results) == 1:
+        return results[0]
+    jsonData = []
+    for result in results:
+        jsonData.extend(json.loads(result))
+    return json.dumps(jsonData)
 
 class Tracker():
     def __init__(self):
         self.vessels = {}
         self.windows = []
         self.userkey = ''
+        self.baseURL = "https://api.vesselfinder.com/vessels"
+        self.maxIMOsPerRequest = 50 # The maximum number of IMOs in one VESSELS request
+        self.archive = None # A PollArchive (see Poll_Archive.py). None : one JSON file per poll
+        self.listeners = [] # Called with each result (e.g. CrossingAlert.processResult, see Crossing_Alert.py)
+        self.scheduler = None # An AdaptiveScheduler (see Adaptive_Scheduler.py). None : poll every vessel every time
 
     def addVessel(self, name, IMO):
         self.vessels[name] = IMO
+        if self.scheduler is not None:
+            self.scheduler.addVessel(IMO)
 
     def addWindow(self, tz, start, end):
         window = {
@@ -32,59 +89,114 @@ class Tracker():
     def setUserKey(self, key):
         self.userkey = key
 
+    def setBaseURL(self, url):
+        self.baseURL = url
+
+    def setMaxIMOsPerRequest(self, maxIMOs):
+        self.maxIMOsPerRequest = maxIMOs
+
+    def setArchive(self, archive):
+        self.archive = archive
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def setScheduler(self, scheduler):
+        self.scheduler = scheduler
+        for IMO in self.vessels.values():
+            scheduler.addVessel(IMO)
+
+    def dueVessels(self, now):
+        # Return the IMOs to poll at now (epoch seconds). None : all vessels
+        if self.scheduler is None:
+            return None
+        return self.scheduler.dueVessels(now)
+
+    def updateScheduler(self, result, now):
+        # Update the scheduler with the result of the poll made at now
+        if self.scheduler is not None and result is not None:
+            for ais in json.loads(result):
+                self.scheduler.update(ais['AIS'], now)
+
+    def requestURLs(self, IMOs=None):
+        # Construct the URLs for the VESSELS API requests. Default to all vessels
+        # The IMOs are batched, up to maxIMOsPerRequest per request
+        if IMOs is None:
+            IMOs = list(self.vessels.values())
+        requests = []
+        for i in range(0, len(IMOs), self.maxIMOsPerRequest):
+            request = self.baseURL + "?userkey="
+            request += self.userkey
+            request += "&imo="
+            request += ",".join(str(IMO) for IMO in IMOs[i:i + self.maxIMOsPerRequest]) # Add each IMO
+            requests.append(request)
+        return requests
+
+    def windowStatus(self):
+        # Return (inWindow, futureWindow)
+        inWindow = False
+        futureWindow = False
+
+        for window in self.windows:
+            now = datetime.now(pytz.timezone(window['tz'])) # now in the window timezone
+            print("Now :          " + now.isoformat())
+            start = localToDatetime(window['tz'], window['start'])
+            print("Window start : " + start.isoformat())
+            end = localToDatetime(window['tz'], window['end'])
+            print("Window end :   " + end.isoformat())
+
+            if now >= start and now <= end:
+                inWindow = True
+                print("In window")
+            
+            if now <= end:
+                futureWindow = True
+
+        return inWindow, futureWindow
+
+    def processResult(self, result):
+        if result is not None and 'AIS' in result:
+            writeResult(result, self.archive)
+            with instrumentation.stage('Tracker.listeners'):
+                for listener in self.listeners:
+                    # A failing listener must not stop the tracking, or the other listeners
+                    try:
+                        listener(result)
+                    except Exception:
+                        print("Listener error! ({})".format(getattr(listener, '__qualname__', repr(listener))))
+                        traceback.print_exc()
+
     def track(self):
         while True:
 
-            inWindow = False
-            futureWindow = False
-
-            for window in self.windows:
-                now = datetime.now(pytz.timezone(window['tz'])) # now in the window timezone
-                print("Now :          " + now.isoformat())
-                start = pytz.timezone(window['tz']).localize(datetime.strptime(window['start'], "%Y-%m-%d %H:%M:%S"))
-                print("Window start : " + start.isoformat())
-                end = pytz.timezone(window['tz']).localize(datetime.strptime(window['end'], "%Y-%m-%d %H:%M:%S"))
-                print("Window end :   " + end.isoformat())
-
-                if now >= start and now <= end:
-                    inWindow = True
-                    print("In window")
-                
-                if now <= end:
-                    futureWindow = True
+            inWindow, futureWindow = self.windowStatus()
 
             if not futureWindow:
                 print("All time windows have expired")
                 break
             
             if inWindow:
-                # Construct the URL for the VESSELS API request
-                request = "https://api.vesselfinder.com/vessels?userkey="
-                request += self.userkey
-                request += "&imo="
-                for vessel in self.vessels.keys():
-                    request += str(self.vessels[vessel]) # Add each IMO
-                    if vessel != list(self.vessels.keys())[-1]:
-                        request += ","
-                print("Request : " + request)
-
-                result = None
-                try:
-                    result = urllib.request.urlopen(request).read().decode("utf-8")
-                except:
-                    print("URL request error!")
-
-                if result is not None and 'AIS' in result:
-                    # Write result to file
-                    dt = datetime.now(pytz.UTC) # Use UTC for the file name
-                    filename = dt.strftime("Track_Vessel_UTC_%Y-%m-%d_%H-%M-%S.json")
-                    with open(filename, 'w') as f:
-                        f.write(result)
-                    print("Wrote JSON to " + filename + " :")
-                    print(result)
+                now = time()
+                results = []
+                for request in self.requestURLs(self.dueVessels(now)):
+                    print("Request : " + request)
+
+                    try:
+                        with instrumentation.stage('Tracker.request') as stage:
+                            results.append(urllib.request.urlopen(request).read().decode("utf-8"))
+                            stage.count(records=1, bytesRead=len(results[-1]))
+                    except:
+                        print("URL request error!")
+
+                result = mergeResults(results)
+                self.processResult(result)
+                self.updateScheduler(result, now)
 
             # Repeat every 60 seconds until all windows have expired
             sleep(60)
+
+        if self.scheduler is not None:
+            self.scheduler.printCredits()
             
 if __name__ == '__main__':
 
@@ -104,4 +216,16 @@ if __name__ == '__main__':
     tracker.addWindow('Europe/Oslo', '2024-11-12 06:00:00', '2024-11-12 10:10:00')
     tracker.addWindow('Europe/Oslo', '2024-11-23 06:00:00', '2024-11-23 10:10:00')
 
+    # Uncomment to append the results to daily archive files instead of one JSON file per poll
+    #from Poll_Archive import PollArchive
+    #archive = PollArchive()
+    #archive.setDirectory('Poll_Archive')
+    #tracker.setArchive(archive)
+
+    # Uncomment to poll more often near the Arctic Circle, less often in port
+    #from Adaptive_Scheduler import AdaptiveScheduler
+    #scheduler = AdaptiveScheduler()
+    #scheduler.setArcticCircleDegMinSec(66., 31., 57.7)
+    #tracker.setScheduler(scheduler)
+
     tracker.track()
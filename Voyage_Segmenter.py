@@ -0,0 +1,183 @@
+# Voyage_Segmenter.py
+#
+# By: agent, October 17th 2026
+#
+# Licence: MIT
+#
+# This code splits each vessel's track into voyages and port calls, so the windows for
+# Extract_Data.py and Generate_KML.py don't need to be typed in by hand from the timetable.
+#
+# All of the vessels are segmented in one pass over the entries, sorted by vessel and time
+# (see Track_Index.py):
+#   A new track starts when the vessel changes, or after a gap of more than maxGap
+#   An entry is stopped if NAVSTAT is at anchor (1) or moored (5), or SPEED < stoppedSpeed
+#   Consecutive stopped entries are a port call. Consecutive moving entries are a voyage
+#   A voyage is split into legs when the DESTINATION or LOCODE changes
+#   Runs shorter than minDuration (e.g. slowing down in traffic, or manoeuvring alongside)
+#     are merged into the run before them, except at the start and end of a track
+# Each voyage includes the last entry of the port call before it (the departure) and the first
+# entry of the port call after it (the arrival). A voyage with a port call at both ends is complete.
+#
+# extractVoyages runs the Extract_Data.py derivations for every voyage in one batch.
+# windows converts the segments to (tz, start, end) windows for setWindow / addWindow.
+
+from Track_Store import TrackStore
+from Track_Index import TrackIndex
+from Timestamps import epochToLocal
+import numpy as np # pip install numpy
+
+class VoyageSegmenter():
+    def __init__(self):
+        self.inputPickleFile = 'Track_Vessel.pkl'
+        self.timezone = 'UTC'
+        self.stoppedSpeed = 1.0 # Knots
+        self.stoppedNavstats = [1, 5] # At anchor, moored
+        self.maxGap = 2 * 60 * 60 # Seconds. A longer gap starts a new track
+        self.minDuration = 5 * 60 # Seconds. Shorter runs are merged into the run before them
+        self.segments = []
+
+    def setInputPickleFilename(self, filename):
+        self.inputPickleFile = filename
+
+    def setTimeZone(self, tz):
+        self.timezone = tz
+
+    def setStoppedSpeed(self, knots):
+        self.stoppedSpeed = knots
+
+    def setStoppedNavstats(self, navstats):
+        self.stoppedNavstats = navstats
+
+    def setMaxGap(self, seconds):
+        self.maxGap = seconds
+
+    def setMinDuration(self, seconds):
+        self.minDuration = seconds
+
+    def mergeShortRuns(self, stopped, trackStarts, epoch):
+        # Flip the state of runs shorter than minDuration to the state of the run before them (in the same track)
+        stopped = stopped.copy()
+        changes = np.zeros(len(stopped), dtype=bool)
+        changes[trackStarts] = True
+        changes[1:] |= stopped[1:] != stopped[:-1]
+        starts = np.flatnonzero(changes).tolist()
+        isTrackStart = np.zeros(len(stopped), dtype=bool)
+        isTrackStart[trackStarts] = True
+        for run, start in enumerate(starts):
+            stop = starts[run + 1] if run + 1 < len(starts) else len(stopped)
+            # The first and last runs of a track are cut short by the start and end of the data. Keep them
+            if isTrackStart[start] or stop == len(stopped) or isTrackStart[stop]:
+                continue
+            # The run lasts until the next run starts
+            if epoch[stop] - epoch[start] < self.minDuration:
+                stopped[start:stop] = stopped[start - 1]
+        return stopped
+
+    def segment(self):
+        # Find the voyages and port calls of every vessel. Returns a list of dicts, in vessel and time order
+        store = TrackStore.open(self.inputPickleFile)
+        index = TrackIndex.forStore(store, self.inputPickleFile)
+
+        # Put the entries in vessel and time order. Remove duplicates
+        order = index.order
+        IMOs = np.asarray(store.column('IMO'))[order]
+        epoch = index.epoch
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = (IMOs[1:] != IMOs[:-1]) | (epoch[1:] != epoch[:-1])
+        order, IMOs, epoch = order[unique], IMOs[unique], epoch[unique]
+        if len(order) == 0:
+            self.segments = []
+            return self.segments
+
+        speed = np.asarray(store.column('SPEED'), dtype=np.float64)[order]
+        navstat = np.asarray(store.column('NAVSTAT'), dtype=np.float64)[order]
+        destination = np.asarray(store.column('DESTINATION'), dtype=object)[order]
+        locode = np.asarray(store.column('LOCODE'), dtype=object)[order]
+
+        # Tracks
+        newTrack = np.ones(len(order), dtype=bool)
+        newTrack[1:] = (IMOs[1:] != IMOs[:-1]) | ((epoch[1:] - epoch[:-1]) > self.maxGap)
+        trackStarts = np.flatnonzero(newTrack)
+
+        # Stopped or moving. A missing SPEED counts as moving unless NAVSTAT says otherwise
+        stopped = np.isin(navstat, self.stoppedNavstats) | (speed < self.stoppedSpeed)
+        stopped = self.mergeShortRuns(stopped, trackStarts, epoch)
+
+        # Runs of the same state, split where the destination changes while moving
+        changes = newTrack.copy()
+        changes[1:] |= stopped[1:] != stopped[:-1]
+        changes[1:] |= ~stopped[1:] & ~stopped[:-1] & ((destination[1:] != destination[:-1]) | (locode[1:] != locode[:-1]))
+        starts = np.flatnonzero(changes)
+        stops = np.append(starts[1:], len(order))
+
+        self.segments = []
+        for run, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+            first, last = start, stop - 1
+            segment = {
+                'IMO': int(IMOs[start]),
+                'NAME': store.value('NAME', int(order[start])),
+                'type': 'port call' if stopped[start] else 'voyage',
+                'DESTINATION': destination[last],
+                'LOCODE': locode[last],
+                'complete': False
+            }
+            if not stopped[start]:
+                # Include the departure and arrival entries of the port calls either side (in the same track)
+                departure = start > 0 and not newTrack[start] and stopped[start - 1]
+                arrival = stop < len(order) and not newTrack[stop] and stopped[stop]
+                if departure:
+                    first = start - 1
+                if arrival:
+                    last = stop
+                segment['complete'] = bool(departure and arrival)
+            segment['startEpoch'] = int(epoch[first])
+            segment['endEpoch'] = int(epoch[last])
+            segment['entries'] = last - first + 1
+            self.segments.append(segment)
+        return self.segments
+
+    def voyages(self, complete=True):
+        # The voyages (only the complete ones by default)
+        return [segment for segment in self.segments if segment['type'] == 'voyage' and (segment['complete'] or not complete)]
+
+    def portCalls(self):
+        return [segment for segment in self.segments if segment['type'] == 'port call']
+
+    def windows(self, segments):
+        # Convert segments to (tz, start, end) in the local time format used by setWindow and addWindow
+        return [(self.timezone, epochToLocal(segment['startEpoch'], self.timezone).strftime('%Y-%m-%d %H:%M:%S'), \
+                 epochToLocal(segment['endEpoch'], self.timezone).strftime('%Y-%m-%d %H:%M:%S')) for segment in segments]
+
+    def extractVoyages(self, extractData, voyages=None):
+        # Extract every voyage (default: the complete voyages) with an ExtractData (see Extract_Data.py) in one batch
+        # Returns the pickle filenames
+        if voyages is None:
+            voyages = self.voyages()
+        extractData.setInputPickleFilename(self.inputPickleFile)
+        return extractData.extractVoyages(voyages, self.timezone)
+
+    def printSegments(self):
+        for segment in self.segments:
+            print("{} : {:<9} : {} to {} ({}) : {:4} entries : {}{}".format(segment['IMO'], segment['type'], \
+                  epochToLocal(segment['startEpoch'], self.timezone).strftime('%Y-%m-%d %H:%M:%S'), \
+                  epochToLocal(segment['endEpoch'], self.timezone).strftime('%H:%M:%S'), self.timezone, segment['entries'], \
+                  segment['DESTINATION'], "" if segment['type'] == 'port call' or segment['complete'] else " (incomplete)"))
+
+if __name__ == '__main__':
+
+    from Extract_Data import ExtractData
+
+    segmenter = VoyageSegmenter()
+    segmenter.setTimeZone('Europe/Oslo')
+    segmenter.segment()
+    segmenter.printSegments()
+
+    # Extract every complete voyage, in one batch
+    extractData = ExtractData()
+    extractData.setArcticCircleDegMinSec(66., 31., 57.7) # Alongside the Polar Circle Globe on Vikingen Island
+    for filename in segmenter.extractVoyages(extractData):
+        print("Wrote " + filename)
+
+    # Or use the windows with Generate_KML.py
+    #for tz, start, end in segmenter.windows(segmenter.voyages()):
+    #    generateKML.setWindow(tz, start, end)
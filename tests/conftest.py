@@ -0,0 +1,9 @@
+# conftest.py
+#
+# The modules are in the top level directory of the repository, not in a package
+# Add it to the path so the tests can import them
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
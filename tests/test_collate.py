@@ -0,0 +1,110 @@
+# test_collate.py
+#
+# Incremental collation must produce exactly the same entries as a full collation
+
+import json
+import os
+import shutil
+import pytest
+from Collate import Collate
+from Track_Store import TrackStore, loadVesselData
+
+def writePoll(directory, minute, entries):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filename = os.path.join(directory, 'Track_Vessel_UTC_2024-11-23_05-{:02d}-00.json'.format(minute))
+    with open(filename, 'w') as f:
+        f.write(json.dumps([{'AIS': entry} for entry in entries]))
+
+def pollEntries(minute):
+    entries = []
+    for IMO in (9107796, 9233258):
+        entry = {
+            'IMO': IMO,
+            'TIMESTAMP': '2024-11-23 05:{:02d}:00 UTC'.format(minute),
+            'LATITUDE': 66.0 + (minute / 100.),
+            'LONGITUDE': 13.0,
+            'SPEED': 14.5 if minute % 2 == 0 else 15, # Mixed types are interned
+            'NAME': 'POLARLYS' if IMO == 9107796 else 'VESTERALEN',
+            'DESTINATION': None
+        }
+        if minute >= 6:
+            entry['ETA'] = '2024-11-23 10:00:00' # A field which only appears in later polls
+        entries.append(entry)
+    return entries
+
+def collate(directory, filename, columnar):
+    collate = Collate()
+    collate.setDirectory(directory)
+    collate.setFilename(filename)
+    collate.setColumnar(columnar)
+    collate.setIncremental(True)
+    collate.collate()
+    return collate
+
+def readEntries(filename, columnar):
+    if columnar:
+        store = TrackStore.load(filename)
+        return [dict(store.record(i)) for i in range(len(store))]
+    return loadVesselData(filename)
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_incremental_matches_full(tmp_path, columnar):
+    suffix = '.trk' if columnar else '.pkl'
+    incremental = str(tmp_path / 'Incremental')
+    full = str(tmp_path / 'Full')
+
+    # Collate the polls in three batches, then all of them in one go
+    for batch in ([0, 1, 2], [3, 4, 5], [6, 7]):
+        for minute in batch:
+            writePoll(os.path.join(incremental, 'Day'), minute, pollEntries(minute))
+        collate(incremental, str(tmp_path / ('Incremental' + suffix)), columnar)
+    shutil.copytree(incremental, full)
+    fullCollate = collate(full, str(tmp_path / ('Full' + suffix)), columnar)
+
+    assert fullCollate.filesRead == 8
+    incrementalEntries = readEntries(str(tmp_path / ('Incremental' + suffix)), columnar)
+    fullEntries = readEntries(str(tmp_path / ('Full' + suffix)), columnar)
+    assert len(incrementalEntries) == 16
+    assert incrementalEntries == fullEntries
+
+def test_no_new_files(tmp_path):
+    directory = str(tmp_path / 'Polls')
+    for minute in range(3):
+        writePoll(directory, minute, pollEntries(minute))
+    filename = str(tmp_path / 'Track_Vessel.trk')
+    collate(directory, filename, True)
+    assert collate(directory, filename, True).filesRead == 0
+    assert len(TrackStore.load(filename)) == 6
+
+def test_older_file_rebuilds(tmp_path):
+    directory = str(tmp_path / 'Polls')
+    for minute in (2, 3):
+        writePoll(directory, minute, pollEntries(minute))
+    filename = str(tmp_path / 'Track_Vessel.pkl')
+    collate(directory, filename, False)
+
+    # A file older than the latest collated file can not be appended
+    writePoll(directory, 1, pollEntries(1))
+    assert collate(directory, filename, False).filesRead == 3
+    assert [entry['TIMESTAMP'][11:16] for entry in loadVesselData(filename)] == \
+           ['05:01', '05:01', '05:02', '05:02', '05:03', '05:03']
+
+def test_convert_pickle(tmp_path):
+    directory = str(tmp_path / 'Polls')
+    for minute in range(3):
+        writePoll(directory, minute, pollEntries(minute))
+    filename = str(tmp_path / 'Track_Vessel.pkl')
+    collate(directory, filename, False)
+
+    # Opening the pickle file does not write anything next to it
+    files = sorted(os.listdir(str(tmp_path)))
+    assert len(TrackStore.open(filename)) == 6
+    assert sorted(os.listdir(str(tmp_path))) == files
+
+    convertedPath = TrackStore.convertPickle(filename)
+    assert sorted(os.listdir(str(tmp_path))) == sorted(files + ['Track_Vessel_Store'])
+    assert readEntries(convertedPath, True) == loadVesselData(filename)
+    modified = os.stat(os.path.join(convertedPath, 'schema.json')).st_mtime_ns
+    assert TrackStore.convertPickle(filename) == convertedPath
+    assert os.stat(os.path.join(convertedPath, 'schema.json')).st_mtime_ns == modified
@@ -0,0 +1,94 @@
+# test_extract_crossings.py
+#
+# The crossings found in the collated data in this repo must match the output of the
+# original Extract_Crossings.py (which stepped along the track one second at a time)
+
+from datetime import datetime
+import calendar
+import math
+import os
+import shutil
+import pytest
+from Extract_Crossings import ExtractCrossings
+from Speed_Profile import LinearSpeedProfile, PiecewiseSpeedProfile
+
+repoDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def utcEpoch(timestamp):
+    return calendar.timegm(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').timetuple())
+
+# The output of the original Extract_Crossings.py for 66° 31' 57.7" (times in UTC):
+# south latitude, south time, north latitude, north time, crossing longitude, crossing time by latitude and by speed
+baseline = [
+    (66.53196, '2024-10-21 05:49:08', 66.53555, '2024-10-21 05:50:08', 12.97704, '2024-10-21 05:49:20', '2024-10-21 05:49:21'),
+    (66.53177, '2024-11-01 06:43:26', 66.53526, '2024-11-01 06:44:26', 12.97726, '2024-11-01 06:43:41', '2024-11-01 06:43:42'),
+    (66.53213, '2024-11-23 06:52:38', 66.53674, '2024-11-23 06:53:57', 12.97701, '2024-11-23 06:52:47', '2024-11-23 06:52:48'),
+    (66.52948, '2024-12-04 06:57:48', 66.53414, '2024-12-04 06:59:06', 12.97690, '2024-12-04 06:58:41', '2024-12-04 06:58:42')
+]
+
+@pytest.fixture
+def crossings(tmp_path):
+    # Work on a copy, so the index is not written into the repo
+    filename = str(tmp_path / 'Track_Vessel.pkl')
+    shutil.copy(os.path.join(repoDirectory, 'Track_Vessel.pkl'), filename)
+    crossings = ExtractCrossings()
+    crossings.setPickleFilename(filename)
+    crossings.setArcticCircleDegMinSec(66., 31., 57.7)
+    return crossings
+
+@pytest.mark.parametrize('speedProfile', [LinearSpeedProfile, PiecewiseSpeedProfile])
+def test_matches_baseline(crossings, speedProfile):
+    crossings.setSpeedProfile(speedProfile)
+    found = crossings.findCrossings()
+    assert crossings.vessels == {'9107796': 'POLARLYS'}
+
+    # The original code only found northbound crossings
+    northbound = [crossing for crossing in found if crossing['northbound']]
+    assert len(northbound) == len(baseline)
+    for crossing, expected in zip(northbound, baseline):
+        southLat, southTime, northLat, northTime, lon, byLat, bySpeed = expected
+        assert crossing['IMO'] == 9107796
+        assert crossing['southLatitude'] == southLat
+        assert crossing['southEpoch'] == utcEpoch(southTime)
+        assert crossing['northLatitude'] == northLat
+        assert crossing['northEpoch'] == utcEpoch(northTime)
+        assert round(crossing['crossingLongitude'], 5) == lon
+        assert int(crossing['crossingEpochByLat']) == utcEpoch(byLat)
+        # The original code rounded the time by speed up to the next whole second (as printCrossing does)
+        assert math.ceil(crossing['crossingEpochBySpeed']) == utcEpoch(bySpeed)
+
+def test_several_latitudes(crossings):
+    # Finding several latitudes in one pass gives the same crossings as one at a time
+    latitudes = [crossings.dms2decdeg(66., 31., 57.7), crossings.dms2decdeg(66., 33., 0.)]
+    together = crossings.findCrossings(latitudes)
+    separately = []
+    for latitude in latitudes:
+        separately.extend(crossings.findCrossings([latitude]))
+    key = lambda c: (c['crossingEpochByLat'], c['circleLatitude'])
+    assert sorted(together, key=key) == sorted(separately, key=key)
+
+def test_max_gap(crossings):
+    # The northbound pairs are one or two minutes apart
+    crossings.setMaxGap(30)
+    assert [crossing for crossing in crossings.findCrossings() if crossing['northbound']] == []
+
+def test_piecewise_profile():
+    # The speed rises from 10 to 20 Knots over the first minute, then falls back to 10 Knots
+    profile = PiecewiseSpeedProfile([0., 60., 120.], [10., 20., 10.])
+    assert profile.distances == [0.0, 0.25, 0.5]
+    assert profile.timeToDistance(0.25) == pytest.approx(60.)
+    assert profile.timeToDistance(0.5) == pytest.approx(120.)
+    assert profile.timeToDistance(((10. * 30.) + (0.5 * (10. / 60.) * 30. * 30.)) / 3600.) == pytest.approx(30.) # v*t + 0.5*a*t^2
+    assert profile.timeToDistance(0.5 + (10. * 60. / 3600.)) == pytest.approx(180.) # Continues at the last speed
+
+    # The linear profile only uses the first and last samples
+    assert LinearSpeedProfile([0., 60., 120.], [10., 20., 10.]).timeToDistance(10. * 120. / 3600.) == pytest.approx(120.)
+
+def test_intermediate_sample(crossings):
+    # The reported speeds (10 Knots) only cover 1/3 NM in two minutes. With the intermediate sample,
+    # the piecewise profile covers the distance between the entries (0.5 NM) by the second entry
+    crossings.setSpeedProfile(PiecewiseSpeedProfile)
+    assert crossings.crossingTimeBySpeed(1000, 1120, 10., 10., 0.5, 0.5) == pytest.approx(1120.)
+    assert crossings.crossingTimeBySpeed(1000, 1120, 10., 10., 0.25, 0.5) == pytest.approx(1060.)
+    crossings.setSpeedProfile(LinearSpeedProfile)
+    assert crossings.crossingTimeBySpeed(1000, 1120, 10., 10., 0.25, 0.5) == pytest.approx(1090.)
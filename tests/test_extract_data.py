@@ -0,0 +1,27 @@
+# test_extract_data.py
+#
+# The track extracted from the collated data in this repo must be byte for byte the same
+# as the one written by the original Extract_Data.py (Track_Vessel_9107796.pkl)
+
+import os
+import shutil
+from Extract_Data import ExtractData
+
+repoDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_matches_committed_track(tmp_path):
+    # Work on a copy, so the index and the output are not written into the repo
+    filename = str(tmp_path / 'Track_Vessel.pkl')
+    shutil.copy(os.path.join(repoDirectory, 'Track_Vessel.pkl'), filename)
+    extractData = ExtractData()
+    extractData.setInputPickleFilename(filename)
+    extractData.setVessel(9107796)
+    extractData.setArcticCircleDegMinSec(66., 31., 57.7)
+    extractData.setWindow('Europe/Oslo', '2024-11-23 06:05:00', '2024-11-23 10:10:00')
+    extractData.extractDataForVessel()
+
+    with open(str(tmp_path / 'Track_Vessel_9107796.pkl'), 'rb') as f:
+        extracted = f.read()
+    with open(os.path.join(repoDirectory, 'Track_Vessel_9107796.pkl'), 'rb') as f:
+        committed = f.read()
+    assert extracted == committed
@@ -0,0 +1,91 @@
+# test_poll_archive.py
+#
+# Poll archive segments: round trip, recovery from an interrupted append, and migration
+
+from datetime import datetime, timedelta
+import json
+import os
+import pytz
+from Poll_Archive import PollArchive, readSegment, readSegmentIndex, indexTrailer, recordHeader, pollEpoch
+from Collate import Collate
+
+start = datetime(2024, 11, 23, 6, 0, 0, tzinfo=pytz.UTC)
+
+def poll(i):
+    return json.dumps([{'AIS': {'IMO': 9107796, 'TIMESTAMP': (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S UTC'), \
+                                'LATITUDE': 66.0 + (i / 100.), 'LONGITUDE': 13.0, 'SPEED': 14.5}}])
+
+def archiveWith(directory, polls):
+    archive = PollArchive()
+    archive.setDirectory(str(directory))
+    for i in polls:
+        filename = archive.append(poll(i), start + timedelta(minutes=i))
+    return archive, filename
+
+def test_round_trip(tmp_path):
+    archive, filename = archiveWith(tmp_path, range(5))
+    assert readSegment(filename) == [(pollEpoch(start + timedelta(minutes=i)), poll(i)) for i in range(5)]
+
+    # Export to JSON files and archive them again
+    filenames = archive.exportJSON(filename, str(tmp_path / 'Exported'))
+    assert len(filenames) == 5
+    with open(filenames[2], 'r') as f:
+        assert f.read() == poll(2)
+    copy = PollArchive()
+    copy.setDirectory(str(tmp_path / 'Copy'))
+    assert copy.migrate(str(tmp_path / 'Exported')) == 5
+    assert readSegment(copy.segmentFilename(start)) == readSegment(filename)
+
+def test_truncated_footer(tmp_path):
+    archive, filename = archiveWith(tmp_path, range(3))
+    size = os.path.getsize(filename)
+
+    # Stop part way through writing the trailer. The old footer must not be read as a record
+    with open(filename, 'r+b') as f:
+        f.truncate(size - indexTrailer.size + 10)
+    index, end = readSegmentIndex(filename)
+    assert [epoch for epoch, offset, length in index] == [pollEpoch(start + timedelta(minutes=i)) for i in range(3)]
+
+    # The next append recovers the segment
+    archive.append(poll(3), start + timedelta(minutes=3))
+    assert [result for epoch, result in readSegment(filename)] == [poll(i) for i in range(4)]
+
+def test_truncated_record(tmp_path):
+    archive, filename = archiveWith(tmp_path, range(3))
+    index, end = readSegmentIndex(filename)
+
+    # Stop part way through writing the last record
+    with open(filename, 'r+b') as f:
+        f.truncate(index[-1][1] + recordHeader.size + 5)
+    assert [result for epoch, result in readSegment(filename)] == [poll(i) for i in range(2)]
+
+    archive.append(poll(3), start + timedelta(minutes=3))
+    assert [result for epoch, result in readSegment(filename)] == [poll(0), poll(1), poll(3)]
+
+def test_corrupt_record(tmp_path):
+    archive, filename = archiveWith(tmp_path, range(3))
+    index, end = readSegmentIndex(filename)
+
+    # Damage the second record and the footer. The scan stops at the damaged record
+    with open(filename, 'r+b') as f:
+        f.seek(index[1][1] + recordHeader.size)
+        f.write(b'\x00\x00\x00\x00')
+        f.truncate(end + 1)
+    assert [result for epoch, result in readSegment(filename)] == [poll(0)]
+
+def test_migrate_removes_files(tmp_path):
+    source = tmp_path / 'Track_Vessel_UTC_2024-11-23_06-00-00'
+    os.makedirs(str(source))
+    for i in range(4):
+        with open(str(source / (start + timedelta(minutes=i)).strftime('Track_Vessel_UTC_%Y-%m-%d_%H-%M-%S.json')), 'w') as f:
+            f.write(poll(i))
+
+    archive = PollArchive()
+    archive.setDirectory(str(tmp_path / 'Poll_Archive'))
+    assert archive.migrate(str(source), removeFiles=True) == 4
+    assert not os.path.exists(str(source))
+
+    # Collate finds each poll once
+    collate = Collate()
+    collate.setDirectory(str(tmp_path))
+    assert len(collate.findFiles()) == 4
@@ -0,0 +1,82 @@
+# test_run_pipeline.py
+#
+# Run_Pipeline skips the jobs whose inputs haven't changed, and runs them again when they do
+
+import json
+import os
+import pytest
+from Run_Pipeline import RunPipeline
+from Synthetic_AIS import SyntheticAIS
+
+def pipelineFor(tmp_path, vessels=None, simplify=0.0):
+    pipeline = RunPipeline()
+    pipeline.setDirectory(str(tmp_path / 'Archive'))
+    pipeline.setOutputDirectory(str(tmp_path / 'Pipeline'))
+    pipeline.setWorkers(1)
+    pipeline.setVessels(vessels)
+    pipeline.setSimplifyTolerance(simplify)
+    return pipeline
+
+def run(pipeline):
+    pipeline.run()
+    return {stage['name']: (stage['items'], stage['skipped']) for stage in pipeline.stages}
+
+def readCrossings(tmp_path):
+    with open(str(tmp_path / 'Pipeline' / 'Crossings.json'), 'r') as f:
+        return json.loads(f.read())
+
+@pytest.fixture
+def archive(tmp_path):
+    synthetic = SyntheticAIS()
+    synthetic.setDirectory(str(tmp_path / 'Archive'))
+    synthetic.setVessels(2)
+    synthetic.setDays(1)
+    synthetic.setPollInterval(300)
+    synthetic.generate()
+    return synthetic
+
+def test_skip_unchanged(tmp_path, archive):
+    first = run(pipelineFor(tmp_path))
+    voyages, skipped = first['Extract + KML']
+    assert voyages > 0 and skipped == 0
+    assert first['Crossings'] == (1, 0)
+
+    # Nothing has changed
+    second = run(pipelineFor(tmp_path))
+    assert second['Collate'][1] == second['Collate'][0]
+    assert second['Crossings'] == (1, 1)
+    assert second['Extract + KML'] == (voyages, voyages)
+
+    # A missing output runs its job again
+    pipeline = pipelineFor(tmp_path)
+    manifest = pipeline.loadManifest()
+    name = sorted(key for key in manifest.keys() if key != 'Crossings')[0]
+    os.remove(os.path.join(str(tmp_path / 'Pipeline'), name.split('_')[0], name + '_Points.kml'))
+    assert run(pipeline)['Extract + KML'] == (voyages, voyages - 1)
+
+    # Changed settings run every job again
+    assert run(pipelineFor(tmp_path, simplify=0.01))['Extract + KML'] == (voyages, 0)
+
+def test_new_polls(tmp_path, archive):
+    first = run(pipelineFor(tmp_path))
+    voyages = first['Extract + KML'][0]
+
+    # Another day of polls. The voyages which were already complete are skipped
+    archive.setStartDate('2024-11-24')
+    archive.generate()
+    second = run(pipelineFor(tmp_path))
+    assert second['Crossings'] == (1, 0)
+    assert second['Extract + KML'][0] > voyages
+    assert second['Extract + KML'][1] > 0
+
+def test_vessel_filter(tmp_path, archive):
+    run(pipelineFor(tmp_path))
+    allCrossings = readCrossings(tmp_path)
+    IMOs = sorted(set(crossing['IMO'] for crossing in allCrossings))
+    assert len(IMOs) == 2
+
+    # A filtered run must not reuse the unfiltered crossings, or the other way round
+    assert run(pipelineFor(tmp_path, vessels=[IMOs[0]]))['Crossings'] == (1, 0)
+    assert set(crossing['IMO'] for crossing in readCrossings(tmp_path)) == {IMOs[0]}
+    assert run(pipelineFor(tmp_path))['Crossings'] == (1, 0)
+    assert readCrossings(tmp_path) == allCrossings